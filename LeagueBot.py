@@ -3,11 +3,29 @@ from dotenv import load_dotenv
 import discord
 from discord.ext import commands
 from discord import app_commands
-from db import init_db, add_tracked_player, get_tracked_players, remove_tracked_player, is_tiltcheck_enabled, toggle_tiltcheck, get_tiltcheck_cooldown, update_tiltcheck_cooldown, get_winstreak_cooldown, update_winstreak_cooldown, is_wincheck_enabled, toggle_wincheck, set_notification_channel, get_notification_channel, link_discord_riot, get_riot_id_for_discord, get_all_mapped_players, get_discord_id_for_riot, unlink_discord_riot, clear_tracked_players
-from riot_api import (get_account_by_riot_id, get_summoner_rank, get_flex_rank, get_match_history, 
+from db import init_db, add_tracked_player, remove_tracked_player, link_discord_riot, get_riot_id_for_discord, get_all_mapped_players, get_mapped_players_in_rank_range, get_discord_id_for_riot, unlink_discord_riot, clear_guild_players, save_debug_report, get_debug_report
+from riot_api import (get_account_by_riot_id, get_summoner_rank, 
                      get_detailed_match_history, get_champion_mastery, get_specific_champion_mastery, 
-                     get_last_played_games, get_role_summary, ensure_match_data_table, 
-                     ensure_puuid_table, cleanup, prefetch_puuids, clear_corrupted_puuid_cache, clear_expired_puuid_cache, clear_expired_match_data_cache, clear_corrupted_match_data_cache, get_champion_data, get_arena_challenges)
+                     get_last_played_games, get_role_summary, cleanup, get_arena_challenges,
+                     get_first_blood_stats, cache_puuid, get_mastery_leaderboard,
+                     get_puuid, get_cached_match_ids, get_ranked_matches)
+from riot_ids import normalize_riot_id, split_riot_id
+from champions import champion_catalog
+from autocomplete import get_riot_id_index, add_tracked_riot_id, remove_tracked_riot_id, clear_tracked_riot_ids
+from settings_cache import guild_settings
+from write_behind import write_queue
+from loop_watchdog import watchdog, loop_lag_seconds
+from coordination import leased, release_leases, riot_limiter
+from polling import (DEFAULT_REGION, sweep_streaks, get_strongest_player, refresh_stale_ranks,
+                     get_ranked_leaderboard, get_snapshot_ordinal, clean_caches, refresh_masteries, run_startup_maintenance)
+from rank_tracker import rank_tracker, clear_leader
+from ranks import duo_partner_range
+from outbox import (enqueue_alerts, get_alert_guild_ids, get_pending_alerts, delete_alerts, record_failed_alerts,
+                    coalesce_alerts, alerts_total)
+from tracing import start_trace, finish_trace, lap, profiler
+from metrics import (registry, started_at, timed, poll_sweep_seconds, command_seconds, command_errors, riot_requests,
+                     riot_rate_limited, riot_request_seconds, db_query_seconds, cache_hit_ratio, start_metrics_server)
+import abc
 import asyncio
 from datetime import datetime
 from discord.ui import View, Button
@@ -16,20 +34,61 @@ import io
 import aiohttp
 import urllib.parse
 from discord.ext import tasks
-import aiosqlite
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 import json
+import hashlib
+from collections import defaultdict
+import time
+import traceback
 
 load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
+METRICS_PORT = os.getenv("METRICS_PORT")  # set to serve Prometheus metrics on localhost
+# Sharding: leave both unset for one process with Discord's recommended shard count, or run one
+# process per shard range, e.g. SHARD_COUNT=4 SHARD_IDS=0,1 and SHARD_COUNT=4 SHARD_IDS=2,3
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS = [int(i) for i in os.getenv("SHARD_IDS").split(",")] if os.getenv("SHARD_IDS") else None
+EXTERNAL_POLLER = os.getenv("EXTERNAL_POLLER")  # set when poller.py runs the sweeps; the bot then only delivers alerts
+LEADERBOARD_PAGE_SIZE = 20  # players per /leaderboard page, well inside the 4096-character description limit
+HISTORY_PAGE_SIZE = 10      # games per /history page
+HISTORY_MAX_GAMES = 50      # match-v5 returns at most 100 IDs and we ask for twice the games to allow for filtering
 
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="/", intents=intents)
-
-DEFAULT_REGION = "na1"
+class TracedCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction):
+        # Runs in the same task as the command, so every span below it joins this trace
+        if interaction.type == discord.InteractionType.application_command and interaction.command:
+            interaction.extras["trace"] = start_trace(f"/{interaction.command.qualified_name}")
+        return True
+
+class LeagueBot(commands.AutoShardedBot):
+    async def setup_hook(self):
+        # Breakdown buttons on earlier /feederscore replies keep working across restarts
+        self.add_dynamic_items(BreakdownButton)
+        # One-time startup; on_ready fires again on every reconnect
+        await init_db()
+        await guild_settings.load()
+        write_queue.start()
+        watchdog.start()
+        if METRICS_PORT:
+            self.metrics_runner = await start_metrics_server(port=int(METRICS_PORT))
+        if not EXTERNAL_POLLER:
+            self.prefetch_task = await run_startup_maintenance()
+
+    async def close(self):
+        # discord.py has no shutdown event; close() runs on Ctrl+C and bot.close() alike
+        print("Bot is shutting down...")
+        watchdog.stop()
+        await write_queue.close()
+        print(f"Flushed write-behind queue ({write_queue.metrics['written']} rows in {write_queue.metrics['commits']} commits)")
+        await release_leases()
+        await cleanup()  # Close the persistent session
+        await super().close()
+
+bot = LeagueBot(command_prefix="/", intents=intents, tree_cls=TracedCommandTree, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
 
 SPECIAL_EMOJI_NAMES = {
     "Kha'Zix": "Khazix",
@@ -61,69 +120,99 @@ def get_champion_emoji(champion_name):
             return f"<:{name}:{emoji_id}>"
     return ""
 
-async def create_hastebin(content):
-    """Create a paste using a Hastebin-compatible mirror that allows anonymous posting."""
-    try:
-        print(f"Attempting to create Hastebin paste. Content length: {len(content)}")
-        if len(content) < 500:
-            print(f"Content snippet: {content[:200]}")
+def format_feeder_debug_report(report):
+    """Render a stored feeder score report as plain text."""
+    parts = [
+        f"Feeder Score Debug Information for {report['riot_id']}",
+        f"Analyzed {len(report['games'])} games",
+        f"Average Score: {report['avg_score']:.2f}",
+        ""
+    ]
 
-        headers = {
-            "Content-Type": "text/plain"
-        }
+    for game_debug in report["games"]:
+        parts.append(f"Game {game_debug['game_number']}:")
+        parts.append(f"Final Score: {game_debug['score_components']['final_score']:.2f}")
+        parts.append(f"Raw Stats: {json.dumps(game_debug['raw_stats'], indent=2)}")
+        parts.append(f"Derived Stats: {json.dumps(game_debug['derived_stats'], indent=2)}")
+        parts.append(f"Normalized Values: {json.dumps(game_debug['normalized_values'], indent=2)}")
+        parts.append(f"Penalties: {json.dumps(game_debug['penalties'], indent=2)}")
+        parts.append(f"Rewards: {json.dumps(game_debug['rewards'], indent=2)}")
+        parts.append(f"Score Components: {json.dumps(game_debug['score_components'], indent=2)}")
+        parts.append("-" * 80 + "\n")
+
+    return "\n".join(parts) + "\n"
+
+class BreakdownButton(discord.ui.DynamicItem[Button], template=r"feederscore:breakdown:(?P<report_id>[0-9a-f]+)"):
+    """Show Breakdown button whose custom_id carries the report ID, so it survives a restart"""
+
+    def __init__(self, report_id):
+        super().__init__(Button(
+            label='Show Breakdown',
+            style=discord.ButtonStyle.secondary,
+            emoji='📄',
+            custom_id=f"feederscore:breakdown:{report_id}"
+        ))
+        self.report_id = report_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match):
+        return cls(match["report_id"])
+
+    async def callback(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+
+        row = await get_debug_report(self.report_id)
+        if not row:
+            await interaction.followup.send("This breakdown has expired. Run `/feederscore` again.", ephemeral=True)
+            return
 
-        # Using a known working mirror that does not require an API key
-        mirror_url = "https://haste.zneix.eu" 
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{mirror_url}/documents",
-                data=content,
-                headers=headers,
-                timeout=10
-            ) as response:
-                print(f"Response status: {response.status}")
-                response_text = await response.text()
-                print(f"Response body: {response_text}")
-
-                if response.status == 200:
-                    result = await response.json()
-                    print(f"Success! Paste key: {result['key']}")
-                    return f'{mirror_url}/{result["key"]}'
-                else:
-                    print(f"❌ Hastebin API error: Status {response.status}, Response: {response_text}")
-                    return None
-    except aiohttp.ClientError as e:
-        print(f"❌ Network error creating hastebin paste: {e}")
-        return None
-    except Exception as e:
-        print(f"❌ General error creating hastebin paste: {e}")
-        return None
+        riot_id, data = row
+        debug_text = format_feeder_debug_report(json.loads(data))
+        safe_name = riot_id.replace("#", "_").replace(" ", "_")
+        file = discord.File(io.BytesIO(debug_text.encode("utf-8")), filename=f"feederscore_{safe_name}.txt")
+        await interaction.followup.send(file=file, ephemeral=True)
 
-class RefreshView(View):
-    def __init__(self, generate_embed_func):
+class BreakdownView(View):
+    def __init__(self, report_id):
         super().__init__(timeout=None)
-        self.generate_embed_func = generate_embed_func
+        self.add_item(BreakdownButton(report_id))
 
-    @discord.ui.button(label='Refresh', style=discord.ButtonStyle.primary, emoji='🔄')
-    async def refresh_button(self, interaction: discord.Interaction, button: Button):
+class PageView(View, abc.ABC):
+    """Previous/next buttons over an embed that is built one page at a time.
+
+    Subclasses implement render_page(page); only the page being shown is ever rendered,
+    from data the view already holds, so a click costs the same however long the list is.
+    """
+
+    def __init__(self, page_count, timeout=900):
+        super().__init__(timeout=timeout)
+        self.page = 0
+        self.page_count = page_count
+        self.message = None
+        self.update_buttons()
+
+    @abc.abstractmethod
+    async def render_page(self, page):
+        """Embed for one page"""
+
+    def update_buttons(self):
+        self.previous_button.disabled = self.page <= 0
+        self.next_button.disabled = self.page >= self.page_count - 1
+
+    async def show_page(self, interaction, page):
         await interaction.response.defer()
-        
-        # Disable the button
-        button.disabled = True
-        await interaction.message.edit(view=self)
-        
-        try:
-            updated_embed = await self.generate_embed_func()
-            await interaction.message.edit(embed=updated_embed, view=self)
-        except Exception as e:
-            print(f"Error refreshing leaderboard: {e}")
-            await interaction.followup.send("Error refreshing leaderboard. Please try again.", ephemeral=True)
-        
-        # Wait 5 seconds before re-enabling the button
-        await asyncio.sleep(300)
-        button.disabled = False
-        await interaction.message.edit(view=self)
+        embed = await self.render_page(page)
+        self.page = min(page, self.page_count - 1)
+        self.update_buttons()
+        await interaction.message.edit(embed=embed, view=self)
+
+    @discord.ui.button(label='Previous', style=discord.ButtonStyle.secondary, emoji='◀️')
+    async def previous_button(self, interaction: discord.Interaction, button: Button):
+        await self.show_page(interaction, self.page - 1)
+
+    @discord.ui.button(label='Next', style=discord.ButtonStyle.secondary, emoji='▶️')
+    async def next_button(self, interaction: discord.Interaction, button: Button):
+        await self.show_page(interaction, self.page + 1)
 
     async def on_timeout(self):
         for item in self.children:
@@ -192,6 +281,7 @@ async def help(interaction: discord.Interaction):
         name="🧠 Miscellaneous",
         value=(
             "`/mastery` — View champion mastery for a player\n"
+            "`/masteryboard` — Rank the server's players on a champion\n"
             "`/lfg` — Notifies other players that you're looking for a game"
         ),
         inline=False
@@ -220,6 +310,16 @@ async def help(interaction: discord.Interaction):
     await interaction.followup.send(embed=embed, ephemeral=True)
 
 
+async def riot_id_autocomplete(
+    interaction: discord.Interaction,
+    current: str
+):
+    index = await get_riot_id_index(str(interaction.guild.id))
+    return [
+        app_commands.Choice(name=riot_id, value=riot_id)
+        for riot_id in index.search(current, limit=25)
+    ]
+
 @bot.tree.command(name="add", description="Add a player to the tracking list.")
 async def add(interaction: discord.Interaction, riot_id: str):
     await interaction.response.defer(ephemeral=True) # Defer ephemerally so only the user sees the initial response
@@ -238,7 +338,11 @@ async def add(interaction: discord.Interaction, riot_id: str):
     try:
         normalized_name = f"{account_data['gameName']}#{account_data['tagLine']}"
         print(f"Storing player: {normalized_name}")
-        await add_tracked_player(str(interaction.guild.id), normalized_name, DEFAULT_REGION)
+        await add_tracked_player(str(interaction.guild.id), normalized_name, DEFAULT_REGION, account_data.get("puuid"))
+        await cache_puuid(normalized_name, account_data.get("puuid"))
+        add_tracked_riot_id(str(interaction.guild.id), normalized_name)
+        # If they already have a rank snapshot (tracked elsewhere), they may be the new strongest here
+        await rank_tracker.recompute(str(interaction.guild.id))
         await interaction.followup.send(f"Now tracking **{normalized_name}**.")
     except ValueError as e:
         await interaction.followup.send(str(e))
@@ -246,6 +350,7 @@ async def add(interaction: discord.Interaction, riot_id: str):
         await interaction.followup.send(f"Failed to add summoner: {e}")
 
 @bot.tree.command(name="remove", description="Remove a player from the tracking list.")
+@app_commands.autocomplete(riot_id=riot_id_autocomplete)
 async def remove(interaction: discord.Interaction, riot_id: str):
     await interaction.response.defer()
 
@@ -255,315 +360,303 @@ async def remove(interaction: discord.Interaction, riot_id: str):
 
     try:
         await remove_tracked_player(str(interaction.guild.id), riot_id)
+        remove_tracked_riot_id(str(interaction.guild.id), riot_id)
+        await rank_tracker.player_removed(str(interaction.guild.id), riot_id)
         await interaction.followup.send(f"Removed **{riot_id}** from tracking list.")
     except Exception as e:
         await interaction.followup.send(f"Failed to remove summoner: {e}")
 
-@bot.tree.command(name="leaderboard", description="Displays the ranked leaderboard for tracked players.")
-async def leaderboard(interaction: discord.Interaction):
-    await interaction.response.defer()
+def render_leaderboard_page(leaderboard, page, updated_at):
+    """Embed for one page of (name, tier, division, lp) rows, numbered from the top of the whole leaderboard"""
+    page_count = max(1, -(-len(leaderboard) // LEADERBOARD_PAGE_SIZE))
+    first = page * LEADERBOARD_PAGE_SIZE
+    rows = leaderboard[first:first + LEADERBOARD_PAGE_SIZE]
+
+    # Calculate column widths
+    rank_num_width = max(3, len(str(len(leaderboard))) + 1)
+    name_width = max(len(name) for name, _, _, _ in rows) + 2
+    rank_width = 20
+
+    total_width = rank_num_width + name_width + rank_width + 4
+
+    # Create header
+    header_text = "LEADERBOARD"
+    separator = "-" * total_width
+
+    # Build lines with proper alignment
+    lines = [
+        header_text.center(total_width),
+        separator,
+        f"{'#':<{rank_num_width}} {'SUMMONER NAME':<{name_width}} {'CURRENT RANK':<{rank_width}}",
+        separator
+    ]
 
-    async def generate_leaderboard_embed():
-        players = await get_tracked_players(str(interaction.guild.id))
-        
-        if not players:
-            return discord.Embed(
-                title="No Players Tracked",
-                description="Use `/add SummonerName#TAG` to start tracking players.",
-                color=discord.Color(0x00FFFF)
-            )
+    for i, (name, tier, division, lp) in enumerate(rows, start=first + 1):
+        if not tier:
+            rank_display = "UNRANKED"
+        elif division:
+            rank_display = f"{tier} {division} - {lp}LP"
+        else:
+            rank_display = f"{tier} - {lp}LP"
 
-        # Get ranks for all players
-        leaderboard = []
-        for summoner_name, region in players:
-            rank_data = await get_summoner_rank(region, summoner_name)
-            if rank_data:
-                leaderboard.append((
-                    summoner_name,
-                    rank_data["tier"],
-                    rank_data["rank"],
-                    rank_data["lp"]
-                ))
-            else:
-                leaderboard.append((summoner_name, "UNRANKED", "", 0))
+        line = f"{str(i) + '.':<{rank_num_width}} {name:<{name_width}} {rank_display:<{rank_width}}"
+        lines.append(line)
 
-        # Sort by rank
-        rank_order = {
-            "IRON": 1, "BRONZE": 2, "SILVER": 3, "GOLD": 4,
-            "PLATINUM": 5, "EMERALD": 6, "DIAMOND": 7,
-            "MASTER": 8, "GRANDMASTER": 9, "CHALLENGER": 10
-        }
+    description = "```" + "\n".join(lines) + "```"
 
-        def get_rank_value(entry):
-            tier, division, lp = entry[1], entry[2], entry[3]
-            if tier == "UNRANKED":
-                return (0, 0, 0)
-            if tier in ["MASTER", "GRANDMASTER", "CHALLENGER"]:
-                return (rank_order[tier], 0, lp)
-            division_value = {"I": 1, "II": 2, "III": 3, "IV": 4}.get(division, 4)
-            return (rank_order[tier], -division_value, lp)
-
-        leaderboard.sort(key=get_rank_value, reverse=True)
-
-        # Calculate column widths
-        rank_num_width = 3
-        name_width = max(len(name) for name, _, _, _ in leaderboard) + 2
-        rank_width = 20
-
-        total_width = rank_num_width + name_width + rank_width + 4
-
-        # Create header
-        header_text = "LEADERBOARD"
-        separator = "-" * total_width
-
-        # Build lines with proper alignment
-        lines = [
-            header_text.center(total_width),
-            separator,
-            f"{'#':<{rank_num_width}} {'SUMMONER NAME':<{name_width}} {'CURRENT RANK':<{rank_width}}",
-            separator
-        ]
-
-        for i, (name, tier, division, lp) in enumerate(leaderboard, start=1):
-            if tier == "UNRANKED":
-                rank_display = "UNRANKED"
-            elif division:
-                rank_display = f"{tier} {division} - {lp}LP"
-            else:
-                rank_display = f"{tier} - {lp}LP"
+    embed = discord.Embed(
+        title="",
+        description=description,
+        color=discord.Color(0x00FFFF)
+    )
+    
+    footer = f"Last updated: {updated_at}"
+    if page_count > 1:
+        footer = f"Page {page + 1}/{page_count} • {footer}"
+    embed.set_footer(text=footer)
+    
+    return embed
 
-            line = f"{str(i) + '.':<{rank_num_width}} {name:<{name_width}} {rank_display:<{rank_width}}"
-            lines.append(line)
+def no_players_embed():
+    return discord.Embed(
+        title="No Players Tracked",
+        description="Use `/add SummonerName#TAG` to start tracking players.",
+        color=discord.Color(0x00FFFF)
+    )
 
-        description = "```" + "\n".join(lines) + "```"
+async def build_leaderboard_embed(guild_id):
+    """First page of the ranked leaderboard embed for a guild's tracked players"""
+    leaderboard = await get_ranked_leaderboard(guild_id)
+    if not leaderboard:
+        return no_players_embed()
+    return render_leaderboard_page(leaderboard, 0, datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"))
 
-        embed = discord.Embed(
-            title="",
-            description=description,
-            color=discord.Color(0x00FFFF)
-        )
+class LeaderboardView(PageView):
+    """Paged leaderboard; the rows are loaded once and only reloaded by Refresh"""
+
+    def __init__(self, guild_id, leaderboard):
+        super().__init__(max(1, -(-len(leaderboard) // LEADERBOARD_PAGE_SIZE)))
+        self.guild_id = guild_id
+        self.leaderboard = leaderboard
+        self.updated_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+
+    async def render_page(self, page):
+        return render_leaderboard_page(self.leaderboard, page, self.updated_at)
+
+    @discord.ui.button(label='Refresh', style=discord.ButtonStyle.primary, emoji='🔄')
+    async def refresh_button(self, interaction: discord.Interaction, button: Button):
+        await interaction.response.defer()
         
-        timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
-        embed.set_footer(text=f"Last updated: {timestamp}")
+        # Disable the button
+        button.disabled = True
+        await interaction.message.edit(view=self)
+        
+        try:
+            leaderboard = await get_ranked_leaderboard(self.guild_id)
+            if leaderboard:
+                self.leaderboard = leaderboard
+                self.updated_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+                self.page_count = max(1, -(-len(leaderboard) // LEADERBOARD_PAGE_SIZE))
+                self.page = min(self.page, self.page_count - 1)
+                self.update_buttons()
+                await interaction.message.edit(embed=await self.render_page(self.page), view=self)
+            else:
+                await interaction.message.edit(embed=no_players_embed(), view=self)
+        except Exception as e:
+            print(f"Error refreshing leaderboard: {e}")
+            await interaction.followup.send("Error refreshing leaderboard. Please try again.", ephemeral=True)
         
-        return embed
+        # Wait 5 minutes before re-enabling the button
+        await asyncio.sleep(300)
+        button.disabled = False
+        await interaction.message.edit(view=self)
 
-    embed = await generate_leaderboard_embed()
-    view = RefreshView(generate_leaderboard_embed)
-    message = await interaction.followup.send(embed=embed, view=view)
-    view.message = message
+@bot.tree.command(name="leaderboard", description="Displays the ranked leaderboard for tracked players.")
+async def leaderboard(interaction: discord.Interaction):
+    await interaction.response.defer()
 
-async def get_strongest_player(guild_id):
-    """Helper function to get the strongest player for a guild"""
-    players = await get_tracked_players(guild_id)
-    
-    if not players:
-        return None
+    leaderboard = await get_ranked_leaderboard(str(interaction.guild.id))
+    if not leaderboard:
+        await interaction.followup.send(embed=no_players_embed())
+        return
 
-    rank_order = {
-        "IRON": 1, "BRONZE": 2, "SILVER": 3, "GOLD": 4,
-        "PLATINUM": 5, "EMERALD": 6, "DIAMOND": 7,
-        "MASTER": 8, "GRANDMASTER": 9, "CHALLENGER": 10
-    }
+    view = LeaderboardView(str(interaction.guild.id), leaderboard)
+    message = await interaction.followup.send(embed=await view.render_page(0), view=view)
+    view.message = message
 
-    strongest_player = None
-    highest_rank = (0, 0, 0)
+def render_strongest_image(name):
+    """Draw a player's name onto The Strongest banner and return it as PNG bytes"""
+    base_image = Image.open('assets/TheStrongest.png')
+    img = base_image.copy()
+    draw = ImageDraw.Draw(img)
     
-    # Create tasks for all players
-    tasks = [
-        get_summoner_rank(region, summoner_name)
-        for summoner_name, region in players
-    ]
-    results = await asyncio.gather(*tasks, return_exceptions=True) # Use return_exceptions to avoid crashing on a single failed API call
-
-    # Process results with corresponding player info
-    for (summoner_name, region), rank_data in zip(players, results):
-        if rank_data and not isinstance(rank_data, Exception):
-            tier = rank_data["tier"]
-            division = rank_data["rank"]
-            lp = rank_data["lp"]
-            
-            if tier in ["MASTER", "GRANDMASTER", "CHALLENGER"]:
-                sort_key = (rank_order.get(tier, 0), 0, lp)
-            else:
-                division_value = {"I": 1, "II": 2, "III": 3, "IV": 4}.get(division, 4)
-                sort_key = (rank_order.get(tier, 0), -division_value, lp)
-            
-            if sort_key > highest_rank:
-                highest_rank = sort_key
-                strongest_player = {
-                    'name': summoner_name,
-                    'tier': tier,
-                    'division': division,
-                    'lp': lp
-                }
-
-    if not strongest_player:
-        return None
-
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        # fetch existing row
-        async with conn.execute(
-            "SELECT summoner_name, tier, division, lp, days_as_strongest, last_update FROM strongest_players WHERE guild_id = ?",
-            (guild_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-
-        current_time = datetime.utcnow()
-        is_new_strongest = False
-        
-        if not row:
-            days_as_strongest = 1
-            should_update = True
-            is_new_strongest = True
-        elif row[0] != strongest_player['name']:
-            days_as_strongest = 1
-            should_update = True
-            is_new_strongest = True
-        else:
-            # Check if a full day has passed since last update
-            last_update = datetime.fromisoformat(row[5].replace('Z', '+00:00'))
-            time_diff = current_time - last_update
-            
-            if time_diff.days >= 1:
-                days_as_strongest = row[4] + 1
-                should_update = True
-            else:
-                days_as_strongest = row[4]
-                should_update = False
-
-        if should_update:
-            # Update the database
-            await conn.execute('''
-                INSERT OR REPLACE INTO strongest_players
-                  (guild_id, summoner_name, tier, division, lp, last_update, days_as_strongest)
-                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
-            ''', (
-                guild_id,
-                strongest_player['name'],
-                strongest_player['tier'],
-                strongest_player['division'],
-                strongest_player['lp'],
-                days_as_strongest
-            ))
-            await conn.commit()
-
-        strongest_player['days_as_strongest'] = days_as_strongest
-        strongest_player['is_new_strongest'] = is_new_strongest
-        return strongest_player
-
-async def announce_strongest_player(target, strongest_player, is_interaction=False):
-    """Helper function to announce the strongest player to a channel"""
     try:
-        base_image = Image.open('assets/TheStrongest.png')
-        img = base_image.copy()
-        draw = ImageDraw.Draw(img)
-        
+        font = ImageFont.truetype("assets/MinecraftRegular-Bmg3.otf", 48)
+    except:
         try:
-            font = ImageFont.truetype("assets/MinecraftRegular-Bmg3.otf", 48)
+            font = ImageFont.truetype(r"C:\Users\Sewde\Desktop\DiscordBot\MinecraftRegular-Bmg3.otf", 48)
         except:
-            try:
-                font = ImageFont.truetype(r"C:\Users\Sewde\Desktop\DiscordBot\MinecraftRegular-Bmg3.otf", 48)
-            except:
-                font = ImageFont.load_default()
-        
-        text = strongest_player['name']
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        img_width, img_height = img.size
-        x = (img_width - text_width) // 2 - 625 
-        y = img_height - 925
-        
-        outline_range = 2
-        for adj_x in range(-outline_range, outline_range + 1):
-            for adj_y in range(-outline_range, outline_range + 1):
-                if adj_x != 0 or adj_y != 0:
-                    draw.text((x + adj_x, y + adj_y), text, font=font, fill='white')
-        
-        draw.text((x, y), text, font=font, fill='black')
-        
-        img_bytes = io.BytesIO()
-        img.save(img_bytes, format='PNG')
-        img_bytes.seek(0)
-        
-        file = discord.File(img_bytes, filename='TheStrongest.png')
-        
-        tier_capitalized = strongest_player['tier'].capitalize()
-        if strongest_player['tier'] in ["MASTER", "GRANDMASTER", "CHALLENGER"]:
-            rank_display = f"{tier_capitalized} - {strongest_player['lp']}LP"
-        else:
-            rank_display = f"{tier_capitalized} {strongest_player['division']} - {strongest_player['lp']}LP"
-        
-        # Calculate duration in a natural format
-        days = strongest_player['days_as_strongest']
-        if days >= 365:
-            years = days // 365
-            duration = f"{years} {'YEAR' if years == 1 else 'YEARS'}"
-        elif days >= 30:
-            months = days // 30
-            duration = f"{months} {'MONTH' if months == 1 else 'MONTHS'}"
-        else:
-            duration = f"{days} {'DAY' if days == 1 else 'DAYS'}"
-        
-        content = f"🏆  **{strongest_player['name']},** currently **{rank_display},** has been The Strongest for **{duration}**  🏆"
-        
-        if is_interaction:
-            await target.followup.send(content=content, file=file)
-        else:
-            await target.send(content=content, file=file)
-        
+            font = ImageFont.load_default()
+    
+    text = name
+    bbox = draw.textbbox((0, 0), text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    
+    img_width, img_height = img.size
+    x = (img_width - text_width) // 2 - 625 
+    y = img_height - 925
+    
+    outline_range = 2
+    for adj_x in range(-outline_range, outline_range + 1):
+        for adj_y in range(-outline_range, outline_range + 1):
+            if adj_x != 0 or adj_y != 0:
+                draw.text((x + adj_x, y + adj_y), text, font=font, fill='white')
+    
+    draw.text((x, y), text, font=font, fill='black')
+    
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='PNG')
+    img_bytes.seek(0)
+    return img_bytes
+
+async def build_strongest_message(strongest_player):
+    """Banner file and message text announcing the strongest player"""
+    # PIL drawing takes long enough to stall the gateway heartbeat, so it runs in a thread
+    img_bytes = await asyncio.to_thread(render_strongest_image, strongest_player['name'])
+    file = discord.File(img_bytes, filename='TheStrongest.png')
+    
+    tier_capitalized = strongest_player['tier'].capitalize()
+    if strongest_player['tier'] in ["MASTER", "GRANDMASTER", "CHALLENGER"]:
+        rank_display = f"{tier_capitalized} - {strongest_player['lp']}LP"
+    else:
+        rank_display = f"{tier_capitalized} {strongest_player['division']} - {strongest_player['lp']}LP"
+    
+    # Calculate duration in a natural format
+    days = strongest_player['days_as_strongest']
+    if days >= 365:
+        years = days // 365
+        duration = f"{years} {'YEAR' if years == 1 else 'YEARS'}"
+    elif days >= 30:
+        months = days // 30
+        duration = f"{months} {'MONTH' if months == 1 else 'MONTHS'}"
+    else:
+        duration = f"{days} {'DAY' if days == 1 else 'DAYS'}"
+    
+    content = f"🏆  **{strongest_player['name']},** currently **{rank_display},** has been The Strongest for **{duration}**  🏆"
+    return content, file
+
+async def send_strongest_player(channel, strongest_player):
+    """Post the strongest player banner to a channel; send errors reach the caller"""
+    content, file = await build_strongest_message(strongest_player)
+    await channel.send(content=content, file=file)
+
+async def announce_strongest_player(interaction, strongest_player):
+    """Answer /strongest with the strongest player banner"""
+    try:
+        content, file = await build_strongest_message(strongest_player)
+        await interaction.followup.send(content=content, file=file)
     except Exception as e:
         print(f"Error posting strongest update: {e}")
 
-@tasks.loop(hours=6)
-async def check_strongest():
-    for guild in bot.guilds:
-        guild_id = str(guild.id)
-        strongest_player = await get_strongest_player(guild_id)
-        
-        if not strongest_player:
-            continue
-
-        # Only announce if there's a change in the strongest player
-        if not strongest_player.get('is_new_strongest', False):
-            continue
-
-        # Try to get the notification channel, fall back to general or first available channel
-        channel = None
-        channel_id = await get_notification_channel(guild_id)
-        if channel_id:
-            channel = bot.get_channel(int(channel_id))
-        
-        if not channel:
-            # Try to find general channel
-            channel = discord.utils.get(guild.text_channels, name="general")
-            
-        if not channel and guild.text_channels:
-            # If no general channel, use the first available text channel
-            channel = guild.text_channels[0]
-            
+def resolve_alert_channel(guild):
+    """Where a guild's alerts go: the /setchannel channel, otherwise general or the first text channel"""
+    channel = None
+    channel_id = guild_settings.get_notification_channel(str(guild.id))
+    if channel_id:
+        channel = guild.get_channel(int(channel_id))
+    if not channel:
+        # Try to find general channel
+        channel = discord.utils.get(guild.text_channels, name="general")
+    if not channel and guild.text_channels:
+        # If no general channel, use the first available text channel
+        channel = guild.text_channels[0]
+    return channel
+
+alert_delivery_locks = defaultdict(asyncio.Lock)  # guild_id -> lock, so a sweep and the delivery loop never send the same rows
+
+async def deliver_guild_alerts(guild):
+    """Post a guild's queued alerts to its alert channel.
+
+    Streak alerts are coalesced into as few messages as possible; strongest-player updates
+    keep their own message for the banner. Failed sends stay queued and are retried with backoff.
+    """
+    guild_id = str(guild.id)
+    async with alert_delivery_locks[guild_id]:
+        alerts = await get_pending_alerts(guild_id)
+        if not alerts:
+            return
+        channel = resolve_alert_channel(guild)
         if not channel:
-            continue
+            await record_failed_alerts([alert_id for alert_id, _, _ in alerts])
+            return
+
+        streaks = [(alert_id, message) for alert_id, kind, message in alerts if kind != "strongest"]
+        batches = [(alert_ids, None, content) for alert_ids, content in coalesce_alerts(streaks)]
+        batches += [([alert_id], json.loads(message), None) for alert_id, kind, message in alerts if kind == "strongest"]
 
-        await announce_strongest_player(channel, strongest_player)
+        delivered, failed = [], []
+        for alert_ids, strongest_player, content in batches:
+            kinds = [kind for alert_id, kind, _ in alerts if alert_id in alert_ids]
+            try:
+                if strongest_player:
+                    await send_strongest_player(channel, strongest_player)
+                else:
+                    await channel.send(content)
+            except (discord.Forbidden, discord.NotFound) as e:
+                # Retrying won't help until the channel or permissions change; give up on these now
+                print(f"Dropping alerts for guild {guild_id}: {e}")
+                delivered.extend(alert_ids)
+                for kind in kinds:
+                    alerts_total.inc(kind=kind, status="dropped")
+                continue
+            except Exception as e:
+                print(f"Failed to send alerts for guild {guild_id}: {e}")
+                failed.extend(alert_ids)
+                for kind in kinds:
+                    alerts_total.inc(kind=kind, status="failed")
+                continue
+            delivered.extend(alert_ids)
+            for kind in kinds:
+                alerts_total.inc(kind=kind, status="delivered")
+        await delete_alerts(delivered)
+        await record_failed_alerts(failed)
+
+@tasks.loop(seconds=30)
+async def deliver_alerts():
+    """Deliver alerts queued by the poller process, and retry any that failed earlier"""
+    for guild_id in await get_alert_guild_ids():
+        guild = bot.get_guild(int(guild_id))
+        # Guilds on another shard process are left for that process
+        if guild:
+            await deliver_guild_alerts(guild)
+
+@tasks.loop(minutes=30)
+@leased("rank_refresh", ttl=40 * 60)
+@timed(poll_sweep_seconds, loop="refresh_ranks")
+async def refresh_ranks():
+    """Keep rank snapshots fresh; strongest-player changes are announced through the outbox as they happen"""
+    await refresh_stale_ranks()
 
 @tasks.loop(hours=168)  # 7 days = 168 hours
+@leased("clean_puuid_cache", ttl=169 * 3600)
 async def clean_puuid_cache():
-    """Clean PUUID cache every 7 days"""
-    print("Running scheduled PUUID cache cleanup...")
-    # Clear corrupted entries
-    corrupted_count = await clear_corrupted_puuid_cache()
-    # Clear expired entries
-    expired_count = await clear_expired_puuid_cache()
-    # Clear expired match data cache entries
-    await clear_expired_match_data_cache()
-    # Clear corrupted match data cache entries
-    corrupted_match_data = await clear_corrupted_match_data_cache()
-    if corrupted_match_data > 0:
-        print(f"Cleared {corrupted_match_data} corrupted match_data entries during scheduled cleanup")
-    print(f"Cache cleanup complete: {corrupted_count} corrupted, {expired_count} expired entries cleared")
+    await clean_caches()
+
+@tasks.loop(hours=3)
+@timed(poll_sweep_seconds, loop="refresh_champion_catalog")
+async def refresh_champion_catalog():
+    """Pick up new Data Dragon patches in the background"""
+    try:
+        await champion_catalog.refresh()
+    except Exception as e:
+        print(f"Error refreshing champion catalog: {e}")
+
+@tasks.loop(hours=6)
+@leased("refresh_mastery_cache", ttl=7 * 3600)
+@timed(poll_sweep_seconds, loop="refresh_mastery_cache")
+async def refresh_mastery_cache():
+    await refresh_masteries()
 
 @bot.tree.command(name="strongest", description="Finds the strongest tracked player based on rank.")
 async def strongest(interaction: discord.Interaction):
@@ -575,38 +668,24 @@ async def strongest(interaction: discord.Interaction):
         await interaction.followup.send("No summoners are currently being tracked for this server.")
         return
 
-    await announce_strongest_player(interaction, strongest_player, is_interaction=True)
-
-@bot.tree.command(name="history", description="Show recent match history for a player.")
-async def history(interaction: discord.Interaction, riot_id: str, games: int = 10):
-    await interaction.response.defer(thinking=True)
-    
-    if '#' not in riot_id:
-        await interaction.followup.send("Please use format: GameName#TAG", ephemeral=True)
-        return
-
-    if games < 1:
-        await interaction.followup.send("Please request at least 1 game.", ephemeral=True)
-        return
-    if games > 20:
-        await interaction.followup.send("For future reference, a maxiumum of only 20 games can be displayed.", ephemeral=True)
-        games = 20
-
-    game_name, tag_line = riot_id.split("#", 1)
-    cleaned_riot_id = f"{game_name.strip()}#{tag_line.strip()}"
-    
-    matches = await get_match_history(DEFAULT_REGION, cleaned_riot_id, games)
+    await announce_strongest_player(interaction, strongest_player)
 
-    if not matches:
-        await interaction.followup.send("No match history found or rate limit reached.", ephemeral=True)
-        return
+def render_history_page(riot_id, matches, page, page_count):
+    """Embed for one page of a player's ranked games; the winrate covers every game loaded so far, and says so"""
+    game_name, tag_line = split_riot_id(riot_id)
+    first = page * HISTORY_PAGE_SIZE
+    page_matches = matches[first:first + HISTORY_PAGE_SIZE]
 
+    if page_count > 1:
+        title = f"Games {first + 1}-{first + len(page_matches)} for {riot_id}"
+    else:
+        title = f"Latest {len(matches)} Games for {riot_id}"
     embed = discord.Embed(
-        title=f"Latest {len(matches)} Games for {cleaned_riot_id}",
+        title=title,
         color=discord.Color(0x00FFFF)
     )
 
-    for i, match in enumerate(matches, 1):
+    for i, match in enumerate(page_matches, first + 1):
         match_time = datetime.fromtimestamp(match["timestamp"] / 1000).strftime("%Y-%m-%d %H:%M")
         minutes = match["gameDuration"] // 60
         seconds = match["gameDuration"] % 60
@@ -615,8 +694,8 @@ async def history(interaction: discord.Interaction, riot_id: str, games: int = 1
         kda = f"{match['kills']}/{match['deaths']}/{match['assists']}"
         kda_ratio = (match['kills'] + match['assists']) / max(1, match['deaths'])
 
-        safe_game_name = urllib.parse.quote(game_name.strip())
-        safe_tag_line = urllib.parse.quote(tag_line.strip().replace(" ", "-"))
+        safe_game_name = urllib.parse.quote(game_name)
+        safe_tag_line = urllib.parse.quote(tag_line.replace(" ", "-"))
         deeplol_link = f"https://www.deeplol.gg/summoner/na/{safe_game_name}-{safe_tag_line}/matches/{match['matchId']}"
 
         champion_emoji = get_champion_emoji(match['champion'])
@@ -640,19 +719,85 @@ async def history(interaction: discord.Interaction, riot_id: str, games: int = 1
     total = len(matches)
     winrate = (wins / total) * 100 if total > 0 else 0
 
+    winrate_label = f"Winrate (last {total} games)" if page_count > 1 else "Winrate"
     embed.add_field(
         name="\u200b",
-        value=f"**Winrate:** {wins}/{total} ({winrate:.2f}%)",
+        value=f"**{winrate_label}:** {wins}/{total} ({winrate:.2f}%)",
         inline=False
     )
 
     timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
-    embed.set_footer(text=f"Last updated: {timestamp}")
+    footer = f"Last updated: {timestamp}"
+    if page_count > 1:
+        footer = f"Page {page + 1}/{page_count} • {footer}"
+    embed.set_footer(text=footer)
+    return embed
+
+class HistoryView(PageView):
+    """Paged match history that fetches each page's games the first time it is shown.
+
+    The match IDs are fetched once up front; each page resumes from where the previous one
+    stopped in that list, so a click only looks at the games on its own page.
+    """
+
+    def __init__(self, riot_id, games, puuid, match_ids):
+        super().__init__(-(-games // HISTORY_PAGE_SIZE))
+        self.riot_id = riot_id
+        self.games = games
+        self.puuid = puuid
+        self.match_ids = match_ids
+        self.matches = []
+        self.next_index = 0
+
+    async def render_page(self, page):
+        wanted = min((page + 1) * HISTORY_PAGE_SIZE, self.games)
+        if len(self.matches) < wanted and self.next_index < len(self.match_ids):
+            matches, self.next_index = await get_ranked_matches(
+                None, self.puuid, self.match_ids, self.next_index, wanted - len(self.matches)
+            )
+            self.matches.extend(matches)
+            if len(self.matches) < wanted:
+                # Ran out of ranked games before filling the requested number of pages
+                self.page_count = max(1, -(-len(self.matches) // HISTORY_PAGE_SIZE))
+        return render_history_page(self.riot_id, self.matches, min(page, self.page_count - 1), self.page_count)
 
-    await interaction.followup.send(embed=embed)
+@bot.tree.command(name="history", description="Show recent match history for a player.")
+@app_commands.autocomplete(riot_id=riot_id_autocomplete)
+async def history(interaction: discord.Interaction, riot_id: str, games: int = 10):
+    await interaction.response.defer(thinking=True)
+    
+    if not split_riot_id(riot_id):
+        await interaction.followup.send("Please use format: GameName#TAG", ephemeral=True)
+        return
+
+    if games < 1:
+        await interaction.followup.send("Please request at least 1 game.", ephemeral=True)
+        return
+    if games > HISTORY_MAX_GAMES:
+        await interaction.followup.send(f"For future reference, a maxiumum of only {HISTORY_MAX_GAMES} games can be displayed.", ephemeral=True)
+        games = HISTORY_MAX_GAMES
+
+    cleaned_riot_id = normalize_riot_id(riot_id)
+
+    puuid = await get_puuid(cleaned_riot_id)
+    match_ids = await get_cached_match_ids(None, puuid, games * 2) if puuid else None  # extra IDs to allow for filtering
+
+    # Only the first page's games are fetched now; the rest load as the buttons are pressed
+    view = HistoryView(cleaned_riot_id, games, puuid, match_ids or [])
+    embed = await view.render_page(0)
+
+    if not view.matches:
+        await interaction.followup.send("No match history found or rate limit reached.", ephemeral=True)
+        return
+
+    if view.page_count > 1:
+        view.message = await interaction.followup.send(embed=embed, view=view)
+    else:
+        await interaction.followup.send(embed=embed)
 
 
 @bot.tree.command(name="stats", description="Show detailed statistics for a player over a number of games.")
+@app_commands.autocomplete(riot_id=riot_id_autocomplete)
 async def stats(interaction: discord.Interaction, riot_id: str, games: int = 20):
     await interaction.response.defer()
     
@@ -668,6 +813,7 @@ async def stats(interaction: discord.Interaction, riot_id: str, games: int = 20)
         return
     
     matches = await get_detailed_match_history(DEFAULT_REGION, riot_id, games)
+    lap("match history")
     
     if not matches:
         await interaction.followup.send("Rate limit reached. Please try again in 2 minutes.")
@@ -706,6 +852,7 @@ async def stats(interaction: discord.Interaction, riot_id: str, games: int = 20)
         champion_stats[champ]['assists'] += match['assists']
     
     sorted_champions = sorted(champion_stats.items(), key=lambda x: x[1]['games'], reverse=True)[:5]
+    lap("aggregate")
     
     embed = discord.Embed(
         title=f"Stats for {riot_id} - Last {total_games} Ranked Games",
@@ -753,6 +900,7 @@ async def stats(interaction: discord.Interaction, riot_id: str, games: int = 20)
     
     timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
     embed.set_footer(text=f"Stats from last {total_games} ranked games • {timestamp}")
+    lap("embed")
     
     await interaction.followup.send(embed=embed)
 
@@ -760,17 +908,15 @@ async def champion_name_autocomplete(
     interaction: discord.Interaction,
     current: str
 ):
-    # Get all champion names (cache this if possible)
-    id_to_name, _ = await get_champion_data()
-    all_names = sorted(id_to_name.values())
-    # Filter by what the user has typed so far
+    await champion_catalog.ensure_loaded()
+    # Discord only allows up to 25 choices
     return [
         app_commands.Choice(name=champ, value=champ)
-        for champ in all_names if current.lower() in champ.lower()
-    ][:25]  # Discord only allows up to 25 choices
+        for champ in champion_catalog.search(current, limit=25)
+    ]
 
 @bot.tree.command(name="mastery", description="Show champion mastery for a player.")
-@app_commands.autocomplete(champion_name=champion_name_autocomplete)
+@app_commands.autocomplete(riot_id=riot_id_autocomplete, champion_name=champion_name_autocomplete)
 async def mastery(interaction: discord.Interaction, riot_id: str, champion_name: str = None):
     await interaction.response.defer()
     
@@ -839,109 +985,71 @@ async def mastery(interaction: discord.Interaction, riot_id: str, champion_name:
         
         await interaction.followup.send(embed=embed)
 
+@bot.tree.command(name="masteryboard", description="Rank this server's tracked players on one champion.")
+@app_commands.autocomplete(champion_name=champion_name_autocomplete)
+async def masteryboard(interaction: discord.Interaction, champion_name: str):
+    await interaction.response.defer()
+
+    await champion_catalog.ensure_loaded()
+    champion_id = champion_catalog.find_id(champion_name)
+    if not champion_id:
+        await interaction.followup.send(f"Could not find a champion named {champion_name}.", ephemeral=True)
+        return
+    champion_name = champion_catalog.id_to_name.get(champion_id, champion_name)
+
+    rows = await get_mastery_leaderboard(str(interaction.guild.id), champion_id)
+    if not rows:
+        await interaction.followup.send(f"No cached {champion_name} mastery for tracked players yet. Try again after the next refresh.")
+        return
+
+    champion_emoji = get_champion_emoji(champion_name)
+    embed = discord.Embed(
+        title=f"{champion_emoji} {champion_name} Mastery Leaderboard".strip(),
+        color=discord.Color(0x00FFFF)
+    )
+
+    description_lines = []
+    for i, (summoner_name, champion_level, champion_points) in enumerate(rows[:25], 1):
+        description_lines.append(f"{i}. **{summoner_name}**: Mastery {champion_level} – {champion_points:,} points")
+    embed.description = "\n".join(description_lines)
+
+    timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+    embed.set_footer(text=f"Mastery refreshes every few hours • {timestamp}")
+
+    await interaction.followup.send(embed=embed)
+
 @bot.tree.command(name="tiltcheck", description="Toggle tiltcheck alerts.")
 async def tiltcheck(interaction: discord.Interaction):
     await interaction.response.defer()
-    enabled = await toggle_tiltcheck(str(interaction.guild.id))
+    enabled = await guild_settings.toggle_tiltcheck(str(interaction.guild.id))
     status_msg = "enabled ✅" if enabled else "disabled ❌"
     await interaction.followup.send(f"Tiltcheck alerts are now {status_msg}.")
 
 @bot.tree.command(name="wincheck", description="Toggle win streak alerts.")
 async def wincheck(interaction: discord.Interaction):
     await interaction.response.defer()
-    enabled = await toggle_wincheck(str(interaction.guild.id))
+    enabled = await guild_settings.toggle_wincheck(str(interaction.guild.id))
     status_msg = "enabled ✅" if enabled else "disabled ❌"
     await interaction.followup.send(f"Win streak alerts are now {status_msg}.")
 
 @tasks.loop(minutes=40)
+@timed(poll_sweep_seconds, loop="check_streaks")
 async def check_streaks():
-    for guild in bot.guilds:
-        guild_id = str(guild.id)
-        tilt_enabled = await is_tiltcheck_enabled(guild_id)
-        win_enabled = await is_wincheck_enabled(guild_id)
-        
-        if not tilt_enabled and not win_enabled:
-            continue
-        
-        players = await get_tracked_players(guild_id)
-        for summoner_name, region in players:
-            try:
-                all_matches = await get_match_history(region, summoner_name, 20)
-                
-                # Filter out remakes (less than 4 minutes)
-                matches = [m for m in all_matches if m.get("gameDuration", 0) >= 240]
-
-                if not matches:
-                    continue
-                
-                last_tilt_match_id, last_tilt_time, last_tilt_streak = await get_tiltcheck_cooldown(guild_id, summoner_name)
-                last_win_match_id, last_win_time, last_win_streak = await get_winstreak_cooldown(guild_id, summoner_name)
-
-                if tilt_enabled and (not last_tilt_match_id or matches[0]["matchId"] != last_tilt_match_id):
-                    streak = 0
-                    for match in matches:
-                        if not match["win"]:
-                            streak += 1
-                        else:
-                            break
-                    
-                    # Send alert if streak is 3+ and we haven't already reported this exact streak
-                    if streak >= 3 and streak != last_tilt_streak:
-                        channel = discord.utils.get(guild.text_channels, name="general") or guild.text_channels[0]
-                        
-                        if streak == 3:
-                            message = f"😟 **{summoner_name}** is on a **3-game losing streak**. Might want to take a break."
-                        elif streak == 4:
-                            message = f"😨 **{summoner_name}** is on a **4-game losing streak**. Seriously, take a break!"
-                        elif streak == 5:
-                            message = f"😱 **{summoner_name}** is on a **5-game losing streak**. Please stop playing for today!"
-                        elif streak == 7:
-                            message = f"🥶 **{summoner_name}** is on a **7-game losing streak**. I am begging you! Please stop playing!"
-                        else:
-                            message = f"💀 **{summoner_name}** is on a **{streak}-game losing streak**. Somebody call Riot!"
-                        
-                        try:
-                            await channel.send(message)
-                        except Exception as e:
-                            print(f"Failed to send tilt alert: {e}")
-                        
-                        await update_tiltcheck_cooldown(guild_id, summoner_name, matches[0]["matchId"], streak)
-                
-                if win_enabled and (not last_win_match_id or matches[0]["matchId"] != last_win_match_id):
-                    streak = 0
-                    for match in matches:
-                        if match["win"]:
-                            streak += 1
-                        else:
-                            break
-                    
-                    # Send alert if streak is 3+ and we haven't already reported this exact streak
-                    if streak >= 3 and streak != last_win_streak:
-                        channel = discord.utils.get(guild.text_channels, name="general") or guild.text_channels[0]
-                        
-                        if streak == 3:
-                            message = f"🔥 **{summoner_name}** is on a **3-game winning streak**! Keep it up!"
-                        elif streak == 4:
-                            message = f"🔥 **{summoner_name}** is on a **4-game winning streak**! You're on fire!"
-                        else:
-                            message = f"🔥 **{summoner_name}** is on a **{streak}-game winning streak**! Absolutely dominating!"
-                        
-                        try:
-                            await channel.send(message)
-                        except Exception as e:
-                            print(f"Failed to send win alert: {e}")
-                        
-                        await update_winstreak_cooldown(guild_id, summoner_name, matches[0]["matchId"], streak)
-                
-                await asyncio.sleep(1)
-                
-            except Exception as e:
-                print(f"Error checking streaks for {summoner_name}: {e}")
-                if "429" in str(e):
-                    await asyncio.sleep(10)
-                continue
+    await run_streak_sweep(bot.guilds)
+
+async def run_streak_sweep(guilds):
+    """Sweep the given guilds for streaks, posting each guild's alerts as soon as it finishes"""
+    by_id = {str(guild.id): guild for guild in guilds}
+
+    async def deliver(guild_id, alerts):
+        if alerts:
+            await enqueue_alerts(guild_id, alerts)
+            await deliver_guild_alerts(by_id[guild_id])
+
+    return await sweep_streaks(list(by_id), deliver)
 
 @bot.tree.command(name="lastplayed", description="Show last played games for different modes.")
+@app_commands.autocomplete(riot_id=riot_id_autocomplete)
 async def lastplayed(interaction: discord.Interaction, riot_id: str):
     await interaction.response.defer()
     
@@ -1016,6 +1124,7 @@ async def lastplayed(interaction: discord.Interaction, riot_id: str):
     await interaction.followup.send(embed=embed)
 
 @bot.tree.command(name="rank", description="Show a player's current rank.")
+@app_commands.autocomplete(riot_id=riot_id_autocomplete)
 async def rank(interaction: discord.Interaction, riot_id: str):
     await interaction.response.defer()
     
@@ -1045,22 +1154,22 @@ async def setchannel(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)
 
     channel_id = str(interaction.channel.id)
-    await set_notification_channel(str(interaction.guild.id), channel_id)
+    await guild_settings.set_notification_channel(str(interaction.guild.id), channel_id)
     await interaction.followup.send(f"Notifications will now be sent to {interaction.channel.mention}")
 
 @bot.tree.command(name="firstblood", description="Show first blood statistics for a player.")
+@app_commands.autocomplete(riot_id=riot_id_autocomplete)
 async def firstblood(interaction: discord.Interaction, riot_id: str, games: int = 20):
     await interaction.response.defer()
     
-    if "#" not in riot_id:
+    if not split_riot_id(riot_id):
         await interaction.followup.send("Please use format: GameName#TAG", ephemeral=True)
         return
 
-    tag_line_index = riot_id.rfind('#')
-    game_name = riot_id[:tag_line_index].strip()
-    tag_line = riot_id[tag_line_index + 1:].strip()
+    riot_id = normalize_riot_id(riot_id)
+    game_name, tag_line = split_riot_id(riot_id)
 
-    matches = await get_detailed_match_history(DEFAULT_REGION, riot_id, games)
+    matches = await get_first_blood_stats(DEFAULT_REGION, riot_id, games)
 
     if not matches:
         await interaction.followup.send("No recent games found or error occurred.")
@@ -1145,7 +1254,26 @@ async def firstblood(interaction: discord.Interaction, riot_id: str, games: int
 
     await interaction.followup.send(embed=embed)
 
+def render_role_chart(role_counts):
+    """Pie chart of games per role as PNG bytes.
+
+    Uses a standalone Figure rather than pyplot's global state so it is safe to run in a thread.
+    """
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    roles = list(role_counts.keys())
+    games_count = list(role_counts.values())
+    
+    ax.pie(games_count, labels=roles, autopct='%1.1f%%', startangle=90)
+    ax.axis('equal')
+    
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    buf.seek(0)
+    return buf
+
 @bot.tree.command(name="rolesummary", description="Show a player's role distribution.")
+@app_commands.autocomplete(riot_id=riot_id_autocomplete)
 async def rolesummary(interaction: discord.Interaction, riot_id: str, games: int = 20):
     await interaction.response.defer()
     
@@ -1158,17 +1286,7 @@ async def rolesummary(interaction: discord.Interaction, riot_id: str, games: int
         await interaction.followup.send("Rate limit reached. Please try again in 2 minutes.")
         return
     
-    plt.figure(figsize=(10, 6))
-    roles = list(role_data["role_data"].keys())
-    games_count = list(role_data["role_data"].values())
-    
-    plt.pie(games_count, labels=roles, autopct='%1.1f%%', startangle=90)
-    plt.axis('equal')
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight')
-    buf.seek(0)
-    plt.close()
+    buf = await asyncio.to_thread(render_role_chart, role_data["role_data"])
     
     embed = discord.Embed(
         title=f"Role Distribution for {riot_id}",
@@ -1193,17 +1311,15 @@ async def rolesummary(interaction: discord.Interaction, riot_id: str, games: int
     await interaction.followup.send(embed=embed, file=file)
 
 @bot.tree.command(name="feederscore", description="Calculate a player's feeder score.")
+@app_commands.autocomplete(riot_id=riot_id_autocomplete)
 async def feederscore(interaction: discord.Interaction, riot_id: str, games: int = 20):
     await interaction.response.defer()
     
-    if "#" not in riot_id:
+    if not split_riot_id(riot_id):
         await interaction.followup.send("Please use format: GameName#TAG", ephemeral=True)
         return
 
-    tag_line_index = riot_id.rfind('#')
-    game_name = riot_id[:tag_line_index].strip()
-    tag_line = riot_id[tag_line_index + 1:].strip()
-    cleaned_riot_id = f"{game_name}#{tag_line}"
+    cleaned_riot_id = normalize_riot_id(riot_id)
 
     def calculate_feeder_score(stats, game_number):
         deaths       = stats["deaths"]
@@ -1334,6 +1450,7 @@ async def feederscore(interaction: discord.Interaction, riot_id: str, games: int
     debug_info_list = []
     try:
         matches = await get_detailed_match_history(DEFAULT_REGION, cleaned_riot_id, games)
+        lap("match history")
         if not matches:
             await interaction.followup.send(f"Rate limit reached. Please try again in 2 minutes.")
             return
@@ -1373,23 +1490,18 @@ async def feederscore(interaction: discord.Interaction, riot_id: str, games: int
         return
 
     avg_score = sum(scores) / len(scores)
-
-    debug_text = f"Feeder Score Debug Information for {cleaned_riot_id}\n"
-    debug_text += f"Analyzed {len(scores)} games\n"
-    debug_text += f"Average Score: {avg_score:.2f}\n\n"
-    
-    for game_debug in debug_info_list:
-        debug_text += f"Game {game_debug['game_number']}:\n"
-        debug_text += f"Final Score: {game_debug['score_components']['final_score']:.2f}\n"
-        debug_text += f"Raw Stats: {json.dumps(game_debug['raw_stats'], indent=2)}\n"
-        debug_text += f"Derived Stats: {json.dumps(game_debug['derived_stats'], indent=2)}\n"
-        debug_text += f"Normalized Values: {json.dumps(game_debug['normalized_values'], indent=2)}\n"
-        debug_text += f"Penalties: {json.dumps(game_debug['penalties'], indent=2)}\n"
-        debug_text += f"Rewards: {json.dumps(game_debug['rewards'], indent=2)}\n"
-        debug_text += f"Score Components: {json.dumps(game_debug['score_components'], indent=2)}\n"
-        debug_text += "-" * 80 + "\n\n"
-
-    hastebin_url = await create_hastebin(debug_text)
+    lap("score")
+
+    # Store the raw breakdown locally; the text report is only rendered if someone asks for it
+    report_data = json.dumps({
+        "riot_id": cleaned_riot_id,
+        "avg_score": avg_score,
+        "games": debug_info_list
+    }, sort_keys=True)
+    report_id = hashlib.sha256(report_data.encode("utf-8")).hexdigest()[:32]
+    lap("report json")
+    await save_debug_report(report_id, cleaned_riot_id, report_data)
+    lap("save report")
 
     embed = discord.Embed(
         title=f"Feeder Score for {cleaned_riot_id}",
@@ -1418,18 +1530,13 @@ async def feederscore(interaction: discord.Interaction, riot_id: str, games: int
         inline=False
     )
 
-    if hastebin_url:
-        embed.add_field(
-            name="Detailed Analysis",
-            value=f"[View Detailed Score Breakdown]({hastebin_url})",
-            inline=False
-        )
-
     embed.set_footer(text=f"Calculation based on last {len(scores)} ranked games • {datetime.utcnow():%Y-%m-%d %H:%M UTC}")
+    lap("embed")
 
-    await interaction.followup.send(embed=embed)
+    await interaction.followup.send(embed=embed, view=BreakdownView(report_id))
 
 @bot.tree.command(name="link", description="Link a Discord account to a Riot ID for duo notifications.")
+@app_commands.autocomplete(riot_id=riot_id_autocomplete)
 async def link(interaction: discord.Interaction, riot_id: str, discord_user: discord.Member = None):
     await interaction.response.defer()
     
@@ -1454,6 +1561,8 @@ async def link(interaction: discord.Interaction, riot_id: str, discord_user: dis
             return
 
         await link_discord_riot(str(interaction.guild.id), str(target_user.id), riot_id)
+        # Snapshot their ranks now so /lfg can match them before the next background refresh
+        await get_summoner_rank(DEFAULT_REGION, riot_id)
         
         if target_user.id == interaction.user.id:
             await interaction.followup.send(f"Successfully linked the Discord account to **{riot_id}**!")
@@ -1511,80 +1620,25 @@ async def lfg(interaction: discord.Interaction, queue_type: app_commands.Choice[
         await interaction.followup.send("No other mapped players found to notify.", ephemeral=True)
         return
 
-    # Get caller's rank based on queue type
-    caller_rank = None
-    if queue_type.value != "unranked":
-        if queue_type.value == "ranked":
-            caller_rank = await get_summoner_rank(DEFAULT_REGION, caller_riot_id)
-        else:  # flex
-            caller_rank = await get_flex_rank(DEFAULT_REGION, caller_riot_id)
-            
-        if not caller_rank:
+    if queue_type.value == "unranked":
+        eligible_users = mapped_users
+    else:
+        # Ranks come from the snapshots the background refresh keeps current, so only the
+        # caller's own rank may need a lookup; partners are one indexed range query.
+        queue = "RANKED_SOLO_5x5" if queue_type.value == "ranked" else "RANKED_FLEX_SR"
+        caller_ordinal = await get_snapshot_ordinal(caller_riot_id, queue)
+        if caller_ordinal is None:
             await interaction.followup.send(f"You need to be ranked in {queue_type.name} to use this feature.", ephemeral=True)
             return
 
-    # Filter users based on queue type and rank restrictions
-    eligible_users = []
-    for discord_id, riot_id in mapped_users:
-        if queue_type.value == "unranked":
-            eligible_users.append((discord_id, riot_id))
-            continue
-
-        # Get user's rank based on queue type
-        if queue_type.value == "ranked":
-            user_rank = await get_summoner_rank(DEFAULT_REGION, riot_id)
-        else:  # flex
-            user_rank = await get_flex_rank(DEFAULT_REGION, riot_id)
-            
-        if not user_rank:
-            continue
-
-        # Define rank tiers and their values (no Emerald)
-        rank_tiers = {
-            "IRON": 1, "BRONZE": 2, "SILVER": 3, "GOLD": 4,
-            "PLATINUM": 5, "DIAMOND": 6, "MASTER": 7,
-            "GRANDMASTER": 8, "CHALLENGER": 9
-        }
-        div_map = {"I": 1, "II": 2, "III": 3, "IV": 4}
-        
-        caller_tier = rank_tiers.get(caller_rank["tier"], 0)
-        user_tier = rank_tiers.get(user_rank["tier"], 0)
-        can_duo = False
-
-        if queue_type.value == "ranked":
-            # Grandmaster/Challenger: no duo allowed
-            if caller_tier >= 8 or user_tier >= 8:
-                can_duo = False
-            # Master: only with Diamond I or other Master
-            elif caller_tier == 7 or user_tier == 7:
-                if caller_tier == 7 and user_tier == 6 and user_rank["rank"] == "I":
-                    can_duo = True
-                elif user_tier == 7 and caller_tier == 6 and caller_rank["rank"] == "I":
-                    can_duo = True
-                elif caller_tier == 7 and user_tier == 7:
-                    can_duo = True
-            # Diamond: both must be Diamond, within two divisions
-            elif caller_tier == 6 or user_tier == 6:
-                if caller_tier == user_tier == 6:
-                    caller_div = div_map.get(caller_rank["rank"], 4)
-                    user_div = div_map.get(user_rank["rank"], 4)
-                    can_duo = abs(caller_div - user_div) <= 2
-            # Iron: can duo up to two tiers above
-            elif caller_tier == 1 or user_tier == 1:
-                can_duo = abs(caller_tier - user_tier) <= 2
-            # Bronze–Platinum: within one tier
-            elif caller_tier < 6 and user_tier < 6:
-                can_duo = abs(caller_tier - user_tier) <= 1
-
-        elif queue_type.value == "flex":
-            # Master+ must both be at least Platinum (tier 5)
-            if caller_tier >= 7 or user_tier >= 7:
-                can_duo = caller_tier >= 5 and user_tier >= 5
-            else:
-                can_duo = True
-
-        if can_duo:
-            eligible_users.append((discord_id, riot_id))
+        partner_range = duo_partner_range(queue, caller_ordinal)
+        eligible_users = []
+        if partner_range:
+            eligible_users = [
+                (discord_id, riot_id)
+                for discord_id, riot_id in await get_mapped_players_in_rank_range(str(interaction.guild.id), queue, *partner_range)
+                if discord_id != str(interaction.user.id)
+            ]
 
     if not eligible_users:
         await interaction.followup.send("Sorry! You're either too garbage or godlike to duo with someone in this server.")
@@ -1612,6 +1666,7 @@ async def lfg(interaction: discord.Interaction, queue_type: app_commands.Choice[
         await interaction.followup.send("Error sending duo check notification. Please try again.", ephemeral=True)
 
 @bot.tree.command(name="arenagod", description="Show Arena 'Adapt to all Situations' challenge stats for a player.")
+@app_commands.autocomplete(riot_id=riot_id_autocomplete)
 async def arenagod(interaction: discord.Interaction, riot_id: str):
     await interaction.response.defer()
     
@@ -1680,20 +1735,132 @@ async def clear(interaction: discord.Interaction, confirm: app_commands.Choice[s
         return
     
     try:
-        # Get all mapped players before clearing
-        mapped_players = await get_all_mapped_players(str(interaction.guild.id))
-        
-        # Clear tracked players
-        await clear_tracked_players(str(interaction.guild.id))
-        
-        # Unlink all Discord-Riot ID mappings
-        for discord_id, _ in mapped_players:
-            await unlink_discord_riot(str(interaction.guild.id), discord_id)
+        # Clear tracked players and unlink all Discord-Riot ID mappings in one transaction
+        await clear_guild_players(str(interaction.guild.id))
+        clear_tracked_riot_ids(str(interaction.guild.id))
+        await clear_leader(str(interaction.guild.id))
         
         await interaction.followup.send("Successfully cleared all tracked players from the leaderboard and unlinked all Discord-Riot ID mappings.")
     except Exception as e:
         await interaction.followup.send(f"Failed to clear leaderboard: {e}")
 
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    # Measured from when Discord created the interaction, so it includes defer and followup time
+    elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+    command_seconds.observe(elapsed, command=command.qualified_name)
+    finish_trace(interaction.extras.get("trace"))
+
+@bot.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    command_name = interaction.command.qualified_name if interaction.command else "unknown"
+    command_errors.inc(command=command_name)
+    finish_trace(interaction.extras.get("trace"), threshold=0)
+    print(f"Error in /{command_name}: {error}")
+    traceback.print_exception(type(error), error, error.__traceback__)
+
+def format_seconds(seconds):
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.1f}s"
+
+def format_histogram_lines(histogram, label, values, limit=8):
+    lines = []
+    for value in values[:limit]:
+        count, mean, p95 = histogram.summary(**{label: value})
+        if count:
+            lines.append(f"`{value}`: {count}× avg {format_seconds(mean)}, p95 ≤{format_seconds(p95)}")
+    return lines
+
+@bot.tree.command(name="botstats", description="Show bot performance metrics (bot owner only).")
+async def botstats(interaction: discord.Interaction):
+    if not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+
+    embed = discord.Embed(title="Bot Stats", color=discord.Color(0x00FFFF))
+    uptime = int(time.time() - started_at)
+    embed.description = f"Uptime: {uptime // 86400}d {uptime % 86400 // 3600}h {uptime % 3600 // 60}m • {len(bot.guilds)} servers"
+    shards = ",".join(str(i) for i in sorted(bot.shards)) or "0"
+    embed.description += f" • shards {shards} of {bot.shard_count or 1}"
+
+    by_endpoint = {}
+    for (endpoint, status), count in riot_requests.values.items():
+        by_endpoint.setdefault(endpoint, {})[status] = count
+    endpoints = sorted(by_endpoint, key=lambda e: -sum(by_endpoint[e].values()))
+    riot_lines = [f"Total: {riot_requests.total()} • 429s: {riot_rate_limited.total()}"]
+    if riot_limiter.limits:
+        riot_lines[0] += f" • waited {format_seconds(riot_limiter.waited)} on the shared rate limit"
+    for endpoint in endpoints[:8]:
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(by_endpoint[endpoint].items()))
+        _, mean, _ = riot_request_seconds.summary(endpoint=endpoint)
+        riot_lines.append(f"`{endpoint}` {statuses} (avg {format_seconds(mean)})")
+    embed.add_field(name="Riot API", value="\n".join(riot_lines), inline=False)
+
+    cache_lines = []
+    for cache in ("puuid", "match", "match_history", "league", "mastery"):
+        ratio = cache_hit_ratio(cache)
+        if ratio is not None:
+            cache_lines.append(f"`{cache}`: {ratio:.0%} hits")
+    embed.add_field(name="Cache Hit Ratio", value="\n".join(cache_lines) or "No lookups yet", inline=False)
+
+    operations = sorted((key[0] for key in db_query_seconds.values), key=lambda op: -db_query_seconds.count(operation=op))
+    db_lines = format_histogram_lines(db_query_seconds, "operation", operations)
+    db_lines.append(f"Write-behind: {write_queue.metrics['commits']} commits, {write_queue.metrics['written']} rows, {len(write_queue)} pending")
+    embed.add_field(name="Database", value="\n".join(db_lines), inline=False)
+
+    sweep_lines = format_histogram_lines(poll_sweep_seconds, "loop", sorted(key[0] for key in poll_sweep_seconds.values))
+    embed.add_field(name="Background Sweeps", value="\n".join(sweep_lines) or "None finished yet", inline=False)
+
+    commands_used = sorted((key[0] for key in command_seconds.values), key=lambda c: -command_seconds.count(command=c))
+    command_lines = format_histogram_lines(command_seconds, "command", commands_used)
+    errors = command_errors.total()
+    if errors:
+        command_lines.append(f"Errors: {errors}")
+    embed.add_field(name="Commands", value="\n".join(command_lines) or "None run yet", inline=False)
+
+    count, mean, p95 = loop_lag_seconds.summary()
+    loop_lines = [f"Lag: avg {format_seconds(mean)}, p95 ≤{format_seconds(p95)}, max {format_seconds(watchdog.max_lag)}"] if count else []
+    for stalled_at, seconds, location, _ in list(watchdog.stalls)[-3:]:
+        loop_lines.append(f"<t:{int(stalled_at)}:R> blocked {format_seconds(seconds)} at `{location}`")
+    embed.add_field(name="Event Loop", value="\n".join(loop_lines) or "Watchdog not running", inline=False)
+
+    embed.set_footer(text=f"{len(registry.metrics)} metrics exported" + (f" on :{METRICS_PORT}/metrics" if METRICS_PORT else ""))
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="profile", description="Start or stop the runtime profiler (bot owner only).")
+@app_commands.choices(
+    action=[
+        app_commands.Choice(name="Start", value="start"),
+        app_commands.Choice(name="Stop", value="stop")
+    ],
+    mode=[
+        app_commands.Choice(name="Sampling (flamegraph)", value="sample"),
+        app_commands.Choice(name="cProfile", value="cprofile")
+    ]
+)
+async def profile(interaction: discord.Interaction, action: app_commands.Choice[str], mode: app_commands.Choice[str] = None):
+    if not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+
+    try:
+        if action.value == "start":
+            profiler.start(mode.value if mode else "sample")
+            await interaction.followup.send(f"Profiler started in **{profiler.mode}** mode. Run `/profile stop` to dump it.", ephemeral=True)
+            return
+        path = profiler.stop()
+    except (RuntimeError, ValueError) as e:
+        await interaction.followup.send(str(e), ephemeral=True)
+        return
+
+    hint = "speedscope or flamegraph.pl" if path.endswith(".folded") else "snakeviz or flameprof"
+    message = f"Profile written to `{path}` (open with {hint})."
+    if os.path.getsize(path) < 8 * 1024 * 1024:
+        await interaction.followup.send(message, file=discord.File(path), ephemeral=True)
+    else:
+        await interaction.followup.send(message, ephemeral=True)
+
 async def fetch_app_emojis(bot):
     app_id = bot.user.id
     token = os.getenv("DISCORD_TOKEN")
@@ -1711,36 +1878,21 @@ async def on_ready():
     await fetch_app_emojis(bot)
     print(f"Fetched {len(getattr(bot, 'app_emojis', {}))} app emojis: {list(getattr(bot, 'app_emojis', {}).keys())[:20]}")
 
-    await init_db()
-    await ensure_puuid_table()
-    await ensure_match_data_table()
-    # Check for corrupted PUUID cache on startup
-    print("Checking for corrupted PUUID cache entries...")
-    corrupted_count = await clear_corrupted_puuid_cache()
-    if corrupted_count > 0:
-        print(f"Cleared {corrupted_count} corrupted PUUID entries on startup")
-    # Clear corrupted match data cache entries on startup
-    corrupted_match_data = await clear_corrupted_match_data_cache()
-    if corrupted_match_data > 0:
-        print(f"Cleared {corrupted_match_data} corrupted match_data entries on startup")
-    # Clear expired match data cache entries on startup
-    await clear_expired_match_data_cache()
-    print("Pre-fetching PUUIDs...")
-    await prefetch_puuids()
-    check_streaks.start()
-    check_strongest.start()
-    clean_puuid_cache.start()
+    # Loops wait for the guild list, so they start here; on_ready fires again on reconnects
+    loops = [deliver_alerts, refresh_champion_catalog]
+    if not EXTERNAL_POLLER:
+        loops += [check_streaks, refresh_ranks, clean_puuid_cache, refresh_mastery_cache]
+    for loop in loops:
+        if not loop.is_running():
+            loop.start()
+    # Commands are global, so one shard process syncing them is enough
+    if SHARD_IDS and 0 not in SHARD_IDS:
+        return
     try:
         synced = await bot.tree.sync()
         print(f"Synced {len(synced)} commands.")
     except Exception as e:
         print(f"Error syncing commands: {e}")
 
-# Add cleanup on shutdown
-@bot.event
-async def on_shutdown():
-    print("Bot is shutting down...")
-    await cleanup()  # Close the persistent session
-    await bot.close()
-
-bot.run(DISCORD_TOKEN)
\ No newline at end of file
+if __name__ == "__main__":
+    bot.run(DISCORD_TOKEN)
@@ -0,0 +1,140 @@
+import bisect
+from collections import defaultdict
+from db import get_tracked_players
+
+MIN_SIMILARITY = 0.3  # share of query trigrams a fuzzy match must contain
+
+def normalize_search_text(text):
+    """Casefold and drop punctuation so Kha'Zix, khazix and Kha Zix all compare equal"""
+    return "".join(ch for ch in text.casefold() if ch.isalnum() or ch == "#")
+
+def _grams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+class SearchIndex:
+    """Prefix, substring and trigram-fuzzy lookups over a small set of display strings.
+
+    Every 1-, 2- and 3-gram of each normalized entry is indexed, so short queries are a
+    single dict lookup and longer ones are ranked by how many of their trigrams match.
+    """
+
+    def __init__(self, items=()):
+        self._normalized = {}                # display -> normalized
+        self._sorted = []                    # sorted (normalized, display) pairs
+        self._grams = defaultdict(set)       # n-gram -> displays containing it
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self._normalized)
+
+    def __contains__(self, display):
+        return display in self._normalized
+
+    def add(self, display):
+        if display in self._normalized:
+            return
+        normalized = normalize_search_text(display)
+        self._normalized[display] = normalized
+        bisect.insort(self._sorted, (normalized, display))
+        for size in (1, 2, 3):
+            for gram in _grams(normalized, size):
+                self._grams[gram].add(display)
+
+    def remove(self, display):
+        normalized = self._normalized.pop(display, None)
+        if normalized is None:
+            return
+        index = bisect.bisect_left(self._sorted, (normalized, display))
+        if index < len(self._sorted) and self._sorted[index] == (normalized, display):
+            del self._sorted[index]
+        for size in (1, 2, 3):
+            for gram in _grams(normalized, size):
+                entries = self._grams.get(gram)
+                if entries:
+                    entries.discard(display)
+                    if not entries:
+                        del self._grams[gram]
+
+    def find(self, text):
+        """Exact match ignoring case and punctuation"""
+        normalized = normalize_search_text(text)
+        index = bisect.bisect_left(self._sorted, (normalized,))
+        if index < len(self._sorted) and self._sorted[index][0] == normalized:
+            return self._sorted[index][1]
+        return None
+
+    def search(self, query, limit=25):
+        """Prefix matches first, then other substring matches, then fuzzy matches by similarity"""
+        query = normalize_search_text(query)
+        if not query:
+            return [display for _, display in self._sorted[:limit]]
+
+        results = []
+        seen = set()
+        start = bisect.bisect_left(self._sorted, (query,))
+        for normalized, display in self._sorted[start:]:
+            if not normalized.startswith(query):
+                break
+            results.append(display)
+            seen.add(display)
+            if len(results) >= limit:
+                return results
+
+        if len(query) <= 3:
+            substring = self._grams.get(query, ())
+            results.extend(sorted((d for d in substring if d not in seen), key=self._normalized.get))
+            return results[:limit]
+
+        # Gather candidates from the rarer trigrams only; a gram shared by most entries
+        # (e.g. "pla" in a server full of Player#...) adds no signal but touches everything
+        query_grams = _grams(query, 3)
+        postings = sorted((self._grams.get(gram, ()) for gram in query_grams), key=len)
+        common = max(50, len(self._normalized) // 2)
+        candidates = set()
+        for entries in postings:
+            if candidates and len(entries) > common:
+                break
+            candidates.update(entries)
+
+        substring = []
+        fuzzy = []
+        for display in candidates - seen:
+            normalized = self._normalized[display]
+            if query in normalized:
+                substring.append(display)
+                continue
+            shared = len(query_grams & _grams(normalized, 3))
+            if shared / len(query_grams) >= MIN_SIMILARITY:
+                fuzzy.append((-shared, normalized, display))
+
+        results.extend(sorted(substring, key=self._normalized.get))
+        results.extend(display for _, _, display in sorted(fuzzy))
+        return results[:limit]
+
+# Per-guild index of tracked Riot IDs, loaded lazily and kept in sync by /add, /remove and /clear
+riot_id_indexes = {}
+
+async def get_riot_id_index(guild_id):
+    index = riot_id_indexes.get(guild_id)
+    if index is None:
+        players = await get_tracked_players(guild_id)
+        index = SearchIndex(summoner_name for summoner_name, _ in players)
+        riot_id_indexes[guild_id] = index
+    return index
+
+def add_tracked_riot_id(guild_id, riot_id):
+    index = riot_id_indexes.get(guild_id)
+    if index is not None:
+        index.add(riot_id)
+
+def remove_tracked_riot_id(guild_id, riot_id):
+    index = riot_id_indexes.get(guild_id)
+    if index is not None:
+        match = index.find(riot_id)
+        # Mirror the case-insensitive match remove_tracked_player uses
+        if match and match.lower() == riot_id.lower():
+            index.remove(match)
+
+def clear_tracked_riot_ids(guild_id):
+    riot_id_indexes.pop(guild_id, None)
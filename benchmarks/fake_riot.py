@@ -0,0 +1,114 @@
+"""Local aiohttp server answering the Riot API routes the bot uses.
+
+Point riot_api at it with RIOT_API_BASE_URL=http://127.0.0.1:<port>. Every response can be
+delayed (latency plus jitter) and a share of requests can be answered with 429 to exercise
+the rate-limit paths.
+"""
+import argparse
+import asyncio
+import random
+from aiohttp import web
+from benchmarks.fixtures import FixtureSet, load_recorded
+
+class FakeRiotServer:
+    def __init__(self, fixtures=None, latency=0.0, jitter=0.0, rate_limit_ratio=0.0, retry_after=0, seed=0):
+        self.fixtures = fixtures or FixtureSet()
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rate_limited = 0
+        self._random = random.Random(seed)
+        self._runner = None
+        self.port = None
+
+    def _app(self):
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}", self._account)
+        app.router.add_get("/lol/match/v5/matches/by-puuid/{puuid}/ids", self._match_ids)
+        app.router.add_get("/lol/match/v5/matches/{match_id}/timeline", self._timeline)
+        app.router.add_get("/lol/match/v5/matches/{match_id}", self._match)
+        app.router.add_get("/lol/league/v4/entries/by-puuid/{puuid}", self._league)
+        app.router.add_get("/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}", self._mastery)
+        app.router.add_get("/lol/challenges/v1/challenges/config", self._challenges_config)
+        app.router.add_get("/lol/challenges/v1/player-data/{puuid}", self._challenges_player)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self._random.random() * self.jitter)
+        if self.rate_limit_ratio and self._random.random() < self.rate_limit_ratio:
+            self.rate_limited += 1
+            return web.json_response(
+                {"status": {"message": "Rate limit exceeded", "status_code": 429}},
+                status=429,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        return await handler(request)
+
+    async def _account(self, request):
+        return web.json_response(self.fixtures.account(request.match_info["game_name"], request.match_info["tag_line"]))
+
+    async def _match_ids(self, request):
+        count = int(request.query.get("count", 20))
+        return web.json_response(self.fixtures.match_ids(request.match_info["puuid"], count))
+
+    async def _match(self, request):
+        return web.json_response(self.fixtures.match(request.match_info["match_id"]))
+
+    async def _timeline(self, request):
+        return web.json_response(self.fixtures.timeline(request.match_info["match_id"]))
+
+    async def _league(self, request):
+        return web.json_response(self.fixtures.league(request.match_info["puuid"]))
+
+    async def _mastery(self, request):
+        return web.json_response(self.fixtures.mastery(request.match_info["puuid"]))
+
+    async def _challenges_config(self, request):
+        return web.json_response(self.fixtures.challenges_config())
+
+    async def _challenges_player(self, request):
+        return web.json_response(self.fixtures.challenges_player(request.match_info["puuid"]))
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._runner = web.AppRunner(self._app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return f"http://{host}:{self.port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+async def serve(args):
+    server = FakeRiotServer(
+        fixtures=FixtureSet(load_recorded(args.fixtures)),
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        rate_limit_ratio=args.rate_limit_ratio
+    )
+    url = await server.start(port=args.port)
+    print(f"Fake Riot API listening on {url} (set RIOT_API_BASE_URL={url})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the fake Riot API server on its own")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--fixtures", help="directory of recorded payloads from benchmarks/record.py")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,218 @@
+"""Riot API payloads for the fake server, synthesized or replayed from recordings.
+
+Synthetic payloads are deterministic per PUUID / match ID, so repeated runs fetch the
+same data. If a fixtures directory holds recorded payloads (see record.py), those are
+used as templates instead and only the IDs are rewritten.
+"""
+import copy
+import hashlib
+import json
+import os
+import random
+import zlib
+
+CHAMPIONS = [
+    (266, "Aatrox"), (103, "Ahri"), (84, "Akali"), (22, "Ashe"), (53, "Blitzcrank"),
+    (63, "Brand"), (51, "Caitlyn"), (122, "Darius"), (119, "Draven"), (81, "Ezreal"),
+    (114, "Fiora"), (86, "Garen"), (104, "Graves"), (39, "Irelia"), (202, "Jhin"),
+    (222, "Jinx"), (145, "Kaisa"), (121, "Khazix"), (64, "LeeSin"), (99, "Lux"),
+    (21, "MissFortune"), (111, "Nautilus"), (555, "Pyke"), (92, "Riven"), (235, "Senna"),
+    (412, "Thresh"), (67, "Vayne"), (254, "Vi"), (157, "Yasuo"), (238, "Zed")
+]
+POSITIONS = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER", "GRANDMASTER", "CHALLENGER"]
+DIVISIONS = ["IV", "III", "II", "I"]
+QUEUES = [420] * 8 + [440, 450]
+ARENA_GOD_ID = 602002
+ADAPT_ID = 602001
+RECORDED_KINDS = ("match", "timeline", "league", "mastery", "challenges_config", "challenges_player")
+
+def _rng(*parts):
+    return random.Random(zlib.crc32("|".join(str(p) for p in parts).encode()))
+
+def puuid_for(game_name, tag_line):
+    """Stable 78-character PUUID for a Riot ID, like the real ones"""
+    digest = hashlib.sha256(f"{game_name.lower()}#{tag_line.lower()}".encode()).hexdigest()
+    return (digest + digest)[:78]
+
+def match_ids_for(puuid, count):
+    seed = zlib.crc32(puuid.encode()) % 1_000_000
+    return [f"NA1_{seed:06d}{i:04d}" for i in range(count)]
+
+def load_recorded(directory):
+    """Recorded payload templates from directory, keyed by kind"""
+    recorded = {}
+    if not directory:
+        return recorded
+    for kind in RECORDED_KINDS:
+        path = os.path.join(directory, f"{kind}.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                recorded[kind] = json.load(f)
+    return recorded
+
+class FixtureSet:
+    def __init__(self, recorded=None):
+        self.recorded = recorded or {}
+        self.match_owners = {}  # match ID -> PUUID that asked for it, so that player appears in it
+
+    def account(self, game_name, tag_line):
+        return {"puuid": puuid_for(game_name, tag_line), "gameName": game_name, "tagLine": tag_line}
+
+    def match_ids(self, puuid, count):
+        ids = match_ids_for(puuid, count)
+        for match_id in ids:
+            self.match_owners.setdefault(match_id, puuid)
+        return ids
+
+    def match(self, match_id):
+        owner = self.match_owners.get(match_id)
+        rng = _rng("match", match_id)
+        puuids = [hashlib.sha256(f"{match_id}-{i}".encode()).hexdigest()[:78].ljust(78, "0") for i in range(10)]
+        if owner:
+            puuids[rng.randrange(10)] = owner
+
+        if "match" in self.recorded:
+            data = copy.deepcopy(self.recorded["match"])
+            data["metadata"]["matchId"] = match_id
+            data["metadata"]["participants"] = puuids
+            for participant, puuid in zip(data["info"]["participants"], puuids):
+                participant["puuid"] = puuid
+            return data
+
+        duration = rng.choice([200] + [rng.randint(900, 2400) for _ in range(19)])
+        start = 1_700_000_000_000 + zlib.crc32(match_id.encode()) * 1000
+        blue_win = rng.random() < 0.5
+        participants = []
+        for i, puuid in enumerate(puuids):
+            team_id = 100 if i < 5 else 200
+            champion_id, champion_name = rng.choice(CHAMPIONS)
+            participants.append({
+                "puuid": puuid,
+                "participantId": i + 1,
+                "teamId": team_id,
+                "championId": champion_id,
+                "championName": champion_name,
+                "teamPosition": POSITIONS[i % 5],
+                "individualPosition": POSITIONS[i % 5],
+                "kills": rng.randint(0, 15),
+                "deaths": rng.randint(0, 12),
+                "assists": rng.randint(0, 20),
+                "win": blue_win == (team_id == 100),
+                "totalDamageDealtToChampions": rng.randint(5000, 45000),
+                "totalDamageDealt": rng.randint(50000, 250000),
+                "goldEarned": rng.randint(6000, 18000),
+                "damageDealtToBuildings": rng.randint(0, 9000),
+                "damageDealtToTurrets": rng.randint(0, 7000),
+                "totalMinionsKilled": rng.randint(20, 280),
+                "neutralMinionsKilled": rng.randint(0, 180),
+                "visionScore": rng.randint(5, 80),
+                "champLevel": rng.randint(11, 18),
+                "turretKills": rng.randint(0, 3),
+                "inhibitorKills": rng.randint(0, 1),
+                "largestKillingSpree": rng.randint(0, 8)
+            })
+        return {
+            "metadata": {"matchId": match_id, "participants": puuids},
+            "info": {
+                "queueId": rng.choice(QUEUES),
+                "gameMode": "CLASSIC",
+                "gameDuration": duration,
+                "gameCreation": start - 60_000,
+                "gameStartTimestamp": start,
+                "gameEndTimestamp": start + duration * 1000,
+                "participants": participants
+            }
+        }
+
+    def timeline(self, match_id):
+        if "timeline" in self.recorded:
+            data = copy.deepcopy(self.recorded["timeline"])
+            data["metadata"]["matchId"] = match_id
+            return data
+
+        rng = _rng("timeline", match_id)
+        frames = []
+        for minute in range(rng.randint(15, 40)):
+            events = []
+            for _ in range(rng.randint(0, 4)):
+                killer, victim = rng.sample(range(1, 11), 2)
+                events.append({
+                    "type": "CHAMPION_KILL",
+                    "timestamp": minute * 60_000 + rng.randint(0, 59_999),
+                    "killerId": killer,
+                    "victimId": victim,
+                    "assistingParticipantIds": rng.sample([p for p in range(1, 11) if p not in (killer, victim)], rng.randint(0, 3))
+                })
+            if minute and minute % 5 == 0:
+                events.append({
+                    "type": "ELITE_MONSTER_KILL",
+                    "timestamp": minute * 60_000,
+                    "monsterType": rng.choice(["DRAGON", "DRAGON", "RIFTHERALD", "BARON_NASHOR"])
+                })
+            events.sort(key=lambda event: event["timestamp"])
+            frames.append({"timestamp": minute * 60_000, "events": events})
+        return {"metadata": {"matchId": match_id}, "info": {"frameInterval": 60000, "frames": frames}}
+
+    def league(self, puuid):
+        if "league" in self.recorded:
+            entries = copy.deepcopy(self.recorded["league"])
+            for entry in entries:
+                entry["puuid"] = puuid
+            return entries
+
+        rng = _rng("league", puuid)
+        if rng.random() < 0.1:
+            return []
+        tier = rng.choice(TIERS)
+        apex = tier in ("MASTER", "GRANDMASTER", "CHALLENGER")
+        return [{
+            "puuid": puuid,
+            "queueType": queue_type,
+            "tier": tier,
+            "rank": "I" if apex else rng.choice(DIVISIONS),
+            "leaguePoints": rng.randint(0, 1200 if apex else 99),
+            "wins": rng.randint(10, 300),
+            "losses": rng.randint(10, 300)
+        } for queue_type in ("RANKED_SOLO_5x5", "RANKED_FLEX_SR")]
+
+    def mastery(self, puuid):
+        if "mastery" in self.recorded:
+            entries = copy.deepcopy(self.recorded["mastery"])
+            for entry in entries:
+                entry["puuid"] = puuid
+            return entries
+
+        rng = _rng("mastery", puuid)
+        entries = [{
+            "puuid": puuid,
+            "championId": champion_id,
+            "championLevel": rng.randint(1, 50),
+            "championPoints": rng.randint(100, 900_000),
+            "lastPlayTime": 1_700_000_000_000 + rng.randint(0, 10**10)
+        } for champion_id, _ in CHAMPIONS]
+        entries.sort(key=lambda entry: -entry["championPoints"])
+        return entries
+
+    def challenges_config(self):
+        if "challenges_config" in self.recorded:
+            return self.recorded["challenges_config"]
+        config = [
+            {"id": ARENA_GOD_ID, "localizedNames": {"en_US": {"name": "Arena God"}}},
+            {"id": ADAPT_ID, "localizedNames": {"en_US": {"name": "Adapt to All Situations"}}}
+        ]
+        config.extend(
+            {"id": 100000 + i, "localizedNames": {"en_US": {"name": f"Challenge {i}"}}}
+            for i in range(400)
+        )
+        return config
+
+    def challenges_player(self, puuid):
+        if "challenges_player" in self.recorded:
+            return self.recorded["challenges_player"]
+        rng = _rng("challenges", puuid)
+        adapt_ids = [champion_id for champion_id, _ in rng.sample(CHAMPIONS, rng.randint(0, 12))]
+        return {"challenges": [
+            {"challengeId": ARENA_GOD_ID, "value": rng.randint(0, 60), "level": "GOLD"},
+            {"challengeId": ADAPT_ID, "value": len(adapt_ids), "level": "SILVER", "achievedObjectiveIds": adapt_ids}
+        ]}
@@ -0,0 +1,232 @@
+"""Shared setup for benchmarks: a throwaway working directory with its own riot_bot.db,
+the fake Riot server, seeded guilds/players, and latency statistics."""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import aiosqlite
+import riot_api
+from db import init_db
+from riot_ids import riot_id_key
+from settings_cache import guild_settings
+from write_behind import write_queue
+from benchmarks.fake_riot import FakeRiotServer
+from benchmarks.fixtures import FixtureSet, load_recorded, puuid_for
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return 0.0
+    index = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples) + 0.5) - 1))
+    return sorted_samples[index]
+
+def summarize(name, samples, wall_time, requests=0, units=None):
+    """Throughput and latency percentiles for one benchmark, as a plain dict"""
+    ordered = sorted(samples)
+    count = len(ordered)
+    result = {
+        "name": name,
+        "count": count,
+        "throughput": count / wall_time if wall_time else 0.0,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "riot_requests": requests
+    }
+    if units:
+        result["units_per_sec"] = units / wall_time if wall_time else 0.0
+    return result
+
+def format_results(results):
+    lines = [f"{'benchmark':<36} {'n':>5} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'riot req':>9}"]
+    for r in results:
+        line = (f"{r['name']:<36} {r['count']:>5} {r['throughput']:>9.1f} {r['p50_ms']:>9.1f} "
+                f"{r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['riot_requests']:>9}")
+        if "units_per_sec" in r:
+            line += f"  ({r['units_per_sec']:.1f} players/s)"
+        lines.append(line)
+    return "\n".join(lines)
+
+def rss_mb():
+    """Current resident set size in MB (Linux), falling back to the peak elsewhere"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+class LoopLagMonitor:
+    """Measures how late a periodic sleep wakes up, i.e. how long the loop was blocked"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        ordered = sorted(self.samples)
+        return {"lag_p99_ms": percentile(ordered, 99) * 1000, "lag_max_ms": (ordered[-1] if ordered else 0.0) * 1000}
+
+def riot_id_for(guild_index, player_index):
+    return f"Bench{guild_index}x{player_index}#BNCH"
+
+class FakeChannel:
+    def __init__(self, name):
+        self.name = name
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(content)
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.text_channels = [FakeChannel("general")]
+
+class BenchEnvironment:
+    """Async context manager running everything against a temp DB and the fake server"""
+
+    def __init__(self, guilds=1, players=10, latency=0.0, jitter=0.0, rate_limit_ratio=0.0, fixtures_dir=None,
+                 cached_match_ratio=0.0):
+        self.guild_count = guilds
+        self.player_count = players
+        self.cached_match_ratio = cached_match_ratio
+        self.server = FakeRiotServer(
+            FixtureSet(load_recorded(fixtures_dir)),
+            latency=latency,
+            jitter=jitter,
+            rate_limit_ratio=rate_limit_ratio
+        )
+        self.guilds = []
+        self._previous_cwd = None
+        self._workdir = None
+
+    async def __aenter__(self):
+        self._previous_cwd = os.getcwd()
+        self._workdir = tempfile.mkdtemp(prefix="riotbot-bench-")
+        try:
+            os.symlink(os.path.join(REPO_ROOT, "assets"), os.path.join(self._workdir, "assets"))
+        except OSError:
+            shutil.copytree(os.path.join(REPO_ROOT, "assets"), os.path.join(self._workdir, "assets"))
+        os.chdir(self._workdir)
+
+        riot_api.RIOT_API_BASE_URL = await self.server.start()
+        riot_api.RIOT_API_KEY = "benchmark"
+
+        await init_db()
+        self.guilds = [FakeGuild(900000 + g) for g in range(self.guild_count)]
+        await self.seed(self.cached_match_ratio)
+        await guild_settings.load()
+        write_queue.start()
+        return self
+
+    async def seed(self, cached_match_ratio=0.0, matches_per_player=40):
+        """Bulk-insert guild settings, tracked players and links, plus cached PUUIDs and
+        match payloads for cached_match_ratio of the players"""
+        now = int(time.time())
+        players, links, settings, puuids, matches = [], [], [], [], {}
+        for g, guild in enumerate(self.guilds):
+            guild_id = str(guild.id)
+            settings.append((guild_id, 1))
+            for p in range(self.player_count):
+                riot_id = riot_id_for(g, p)
+                players.append((guild_id, riot_id, riot_id_key(riot_id), "na1"))
+                links.append((guild_id, str(10**17 + g * 10**4 + p), riot_id, riot_id_key(riot_id)))
+                if p < self.player_count * cached_match_ratio:
+                    game_name, tag_line = riot_id.split("#")
+                    puuid = puuid_for(game_name, tag_line)
+                    puuids.append((riot_id_key(riot_id), puuid, now))
+                    for match_id in self.server.fixtures.match_ids(puuid, matches_per_player):
+                        matches.setdefault(match_id, (match_id, json.dumps(self.server.fixtures.match(match_id)), now))
+
+        async with aiosqlite.connect("riot_bot.db") as conn:
+            await conn.executemany("INSERT OR REPLACE INTO tiltcheck_settings (guild_id, enabled) VALUES (?, ?)", settings)
+            await conn.executemany("INSERT OR REPLACE INTO wincheck_settings (guild_id, enabled) VALUES (?, ?)", settings)
+            await conn.executemany(
+                "INSERT OR IGNORE INTO tracked_players (guild_id, summoner_name, normalized_name, region) VALUES (?, ?, ?, ?)",
+                players
+            )
+            await conn.executemany(
+                "INSERT OR REPLACE INTO discord_riot_mapping (guild_id, discord_id, riot_id, riot_key) VALUES (?, ?, ?, ?)",
+                links
+            )
+            await conn.executemany("INSERT OR REPLACE INTO puuid_cache (riot_id, puuid, cached_at) VALUES (?, ?, ?)", puuids)
+            await conn.executemany("INSERT OR REPLACE INTO match_data (match_id, data, cached_at) VALUES (?, ?, ?)", matches.values())
+            await conn.commit()
+
+    async def __aexit__(self, *exc_info):
+        await write_queue.close()
+        await riot_api.cleanup()
+        await self.server.stop()
+        os.chdir(self._previous_cwd)
+        shutil.rmtree(self._workdir, ignore_errors=True)
+
+    def riot_ids(self):
+        return [riot_id_for(g, p) for g in range(self.guild_count) for p in range(self.player_count)]
+
+    def clear_memory_caches(self):
+        for cache in (riot_api.match_cache, riot_api.match_history_cache, riot_api.puuid_cache,
+                      riot_api.puuid_negative_cache, riot_api.league_entries_cache,
+                      riot_api.player_challenges_cache, riot_api.challenge_config_cache):
+            cache.clear()
+
+    async def reset_caches(self):
+        """Forget everything cached in memory and on disk so the next call is fully cold"""
+        self.clear_memory_caches()
+        await write_queue.flush()
+        async with aiosqlite.connect("riot_bot.db") as conn:
+            for table in ("match_data", "puuid_cache", "first_blood_events", "champion_mastery", "mastery_refresh"):
+                await conn.execute(f"DELETE FROM {table}")
+            await conn.commit()
+
+async def run_timed(name, calls, env=None, units=None, before=None):
+    """Await each zero-argument coroutine factory in calls in turn, timing them individually.
+
+    before (e.g. env.reset_caches) runs ahead of every call and is left out of the timings.
+    """
+    requests_before = env.server.requests if env else 0
+    samples = []
+    wall = 0.0
+    for call in calls:
+        if before:
+            await before()
+        start = time.perf_counter()
+        await call()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        wall += elapsed
+    return summarize(name, samples, wall, (env.server.requests - requests_before) if env else 0, units)
+
+def run_timed_sync(name, func, iterations):
+    samples = []
+    wall_start = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(name, samples, time.perf_counter() - wall_start)
@@ -0,0 +1,172 @@
+"""Scale test: how many guilds and tracked players one process can sweep per check_streaks interval.
+
+    python -m benchmarks.loadtest --scales 10x10,100x10,500x20 --latency-ms 40 --command-rate 2
+
+Each scale gets a fresh riot_bot.db seeded with synthetic guilds, tracked players, Discord
+links and (for --cached-ratio of players) cached PUUIDs and matches. A full streak sweep then
+runs against the fake Riot server while slash commands are fired at it through a stubbed
+Discord interaction, and the report shows sweep time, API calls per player, memory growth,
+event-loop lag and command latency at each scale.
+"""
+import argparse
+import asyncio
+import random
+import time
+from benchmarks.harness import BenchEnvironment, LoopLagMonitor, percentile, riot_id_for, rss_mb
+from polling import STREAK_CONCURRENCY
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+
+class FakeMessage:
+    async def edit(self, **kwargs):
+        pass
+
+class FakeResponse:
+    async def defer(self, **kwargs):
+        pass
+
+    async def send_message(self, *args, **kwargs):
+        pass
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+        return FakeMessage()
+
+class FakeInteraction:
+    """Just enough of discord.Interaction for the command callbacks"""
+
+    def __init__(self, guild, user_id):
+        self.guild = guild
+        self.user = FakeUser(user_id)
+        self.channel = guild.text_channels[0]
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+        self.message = FakeMessage()
+        self.extras = {}
+
+COMMAND_MIX = [("rank", {}), ("history", {"games": 10}), ("stats", {"games": 20}), ("leaderboard", None)]
+
+async def drive_commands(bot_module, env, rate, stop):
+    """Fire random commands at rate per second until stop is set; returns their latencies"""
+    rng = random.Random(1)
+    latencies = []
+    pending = set()
+
+    async def invoke(name, kwargs, guild_index, player_index):
+        command = bot_module.bot.tree.get_command(name)
+        interaction = FakeInteraction(env.guilds[guild_index], 10**17 + player_index)
+        start = time.perf_counter()
+        try:
+            if kwargs is None:
+                await command.callback(interaction)
+            else:
+                await command.callback(interaction, riot_id=riot_id_for(guild_index, player_index), **kwargs)
+        except Exception as e:
+            print(f"/{name} failed: {e}")
+        latencies.append(time.perf_counter() - start)
+
+    while not stop.is_set() and rate > 0:
+        name, kwargs = rng.choice(COMMAND_MIX)
+        task = asyncio.create_task(invoke(name, kwargs, rng.randrange(env.guild_count), rng.randrange(env.player_count)))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1 / rate)
+        except asyncio.TimeoutError:
+            pass
+    if pending:
+        await asyncio.gather(*pending)
+    return latencies
+
+async def run_scale(bot_module, guilds, players, args):
+    env = BenchEnvironment(
+        guilds=guilds,
+        players=players,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        rate_limit_ratio=args.rate_limit_ratio,
+        fixtures_dir=args.fixtures,
+        cached_match_ratio=args.cached_ratio
+    )
+    seed_start = time.perf_counter()
+    async with env:
+        seed_time = time.perf_counter() - seed_start
+        env.clear_memory_caches()
+        rss_before = rss_mb()
+        requests_before = env.server.requests
+
+        lag = LoopLagMonitor()
+        lag.start()
+        stop = asyncio.Event()
+        commands = asyncio.create_task(drive_commands(bot_module, env, args.command_rate, stop))
+
+        start = time.perf_counter()
+        guild_times = sorted((await bot_module.run_streak_sweep(env.guilds)).values())
+        sweep = time.perf_counter() - start
+
+        stop.set()
+        command_latencies = sorted(await commands)
+        lag_stats = await lag.stop()
+        total_players = guilds * players
+        alerts = sum(len(guild.text_channels[0].sent) for guild in env.guilds)
+
+        interval = bot_module.check_streaks.minutes * 60
+        per_player = sweep / total_players
+        return {
+            "guilds": guilds,
+            "players": total_players,
+            "seed_s": seed_time,
+            "sweep_s": sweep,
+            "guild_p95_s": percentile(guild_times, 95),
+            "fits_interval": sweep <= interval,
+            "capacity_players": int(interval / per_player),
+            "api_calls_per_player": (env.server.requests - requests_before) / total_players,
+            "rss_growth_mb": rss_mb() - rss_before,
+            "alerts": alerts,
+            "commands": len(command_latencies),
+            "command_p95_ms": percentile(command_latencies, 95) * 1000,
+            **lag_stats
+        }
+
+def format_report(rows):
+    header = (f"{'guilds':>7} {'players':>8} {'sweep s':>8} {'guild p95':>10} {'fits':>5} {'capacity':>9} "
+              f"{'api/player':>10} {'rss +MB':>8} {'lag p99':>8} {'lag max':>8} {'cmds':>5} {'cmd p95':>8}")
+    lines = [header]
+    for r in rows:
+        lines.append(
+            f"{r['guilds']:>7} {r['players']:>8} {r['sweep_s']:>8.1f} {r['guild_p95_s']:>10.1f} "
+            f"{'yes' if r['fits_interval'] else 'NO':>5} {r['capacity_players']:>9} {r['api_calls_per_player']:>10.1f} "
+            f"{r['rss_growth_mb']:>8.1f} {r['lag_p99_ms']:>8.1f} {r['lag_max_ms']:>8.1f} {r['commands']:>5} {r['command_p95_ms']:>8.1f}"
+        )
+    return "\n".join(lines)
+
+async def main(args):
+    import LeagueBot
+
+    rows = []
+    for scale in args.scales.split(","):
+        guilds, players = (int(n) for n in scale.lower().split("x"))
+        print(f"Running {guilds} guilds x {players} players...")
+        rows.append(await run_scale(LeagueBot, guilds, players, args))
+    print(format_report(rows))
+    print(f"'guild p95' is the 95th percentile of per-guild sweep time (first player queued to last player checked) "
+          f"with {STREAK_CONCURRENCY} players in flight; 'capacity' is the player count that still fits the "
+          f"{LeagueBot.check_streaks.minutes:.0f}-minute interval.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scale test the streak sweep and commands")
+    parser.add_argument("--scales", default="10x10,50x20,200x20", help="comma-separated GUILDSxPLAYERS")
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--cached-ratio", type=float, default=0.5, help="share of players seeded with cached matches")
+    parser.add_argument("--command-rate", type=float, default=2, help="slash commands per second during the sweep")
+    parser.add_argument("--fixtures", help="directory of recorded payloads from benchmarks/record.py")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,57 @@
+"""Record real Riot API payloads for one player as fake-server fixtures.
+
+    RIOT_API_KEY=... python -m benchmarks.record "GameName#TAG" benchmarks/fixtures
+
+Writes match.json, timeline.json, league.json, mastery.json, challenges_config.json and
+challenges_player.json. The fake server rewrites the IDs in them, so one recording is
+enough to replay any number of synthetic players.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from urllib.parse import quote
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from riot_ids import split_riot_id
+
+async def record(riot_id, directory, platform="na1", regional="americas"):
+    game_name, tag_line = split_riot_id(riot_id)
+    headers = {"X-Riot-Token": os.environ["RIOT_API_KEY"]}
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def get(host, path):
+            async with session.get(f"https://{host}.api.riotgames.com{path}") as response:
+                response.raise_for_status()
+                return await response.json()
+
+        account = await get(regional, f"/riot/account/v1/accounts/by-riot-id/{quote(game_name)}/{quote(tag_line)}")
+        puuid = account["puuid"]
+        match_ids = await get(regional, f"/lol/match/v5/matches/by-puuid/{puuid}/ids?queue=420&start=0&count=1")
+        if not match_ids:
+            raise SystemExit(f"{riot_id} has no ranked matches to record")
+
+        payloads = {
+            "match": await get(regional, f"/lol/match/v5/matches/{match_ids[0]}"),
+            "timeline": await get(regional, f"/lol/match/v5/matches/{match_ids[0]}/timeline"),
+            "league": await get(platform, f"/lol/league/v4/entries/by-puuid/{puuid}"),
+            "mastery": await get(platform, f"/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}"),
+            "challenges_config": await get(platform, "/lol/challenges/v1/challenges/config"),
+            "challenges_player": await get(platform, f"/lol/challenges/v1/player-data/{puuid}")
+        }
+
+    os.makedirs(directory, exist_ok=True)
+    for kind, payload in payloads.items():
+        with open(os.path.join(directory, f"{kind}.json"), "w") as f:
+            json.dump(payload, f)
+    print(f"Recorded {len(payloads)} payloads for {riot_id} into {directory}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("riot_id")
+    parser.add_argument("directory")
+    parser.add_argument("--platform", default="na1")
+    args = parser.parse_args()
+    asyncio.run(record(args.riot_id, args.directory, args.platform))
@@ -0,0 +1,132 @@
+"""Offline benchmarks against the fake Riot server.
+
+    python -m benchmarks.run                         # default suite
+    python -m benchmarks.run --guilds 20 --players 25 --latency-ms 40 --rate-limit-ratio 0.02
+    python -m benchmarks.run --save baseline.json
+    python -m benchmarks.run --compare baseline.json  # exit 1 on a p50/p95 regression
+
+Every benchmark runs in a temporary directory with its own riot_bot.db; nothing touches
+the network or the real database.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from benchmarks.harness import BenchEnvironment, format_results, run_timed, run_timed_sync
+
+REGRESSION_THRESHOLD = 0.20  # p50/p95 more than 20% slower than the baseline fails --compare
+
+async def bench_riot_api(env, iterations):
+    from riot_api import get_match_history, get_detailed_match_history
+
+    riot_ids = env.riot_ids()
+    pick = lambda i: riot_ids[i % len(riot_ids)]
+    results = []
+    for cold in (True, False):
+        label = "cold" if cold else "warm"
+        before = env.reset_caches if cold else None
+        if not cold:
+            await get_match_history("na1", pick(0), 20)
+            await get_detailed_match_history("na1", pick(0), 20)
+        results.append(await run_timed(
+            f"get_match_history(20) {label}",
+            [lambda i=i: get_match_history("na1", pick(i if cold else 0), 20) for i in range(iterations)],
+            env, before=before
+        ))
+        results.append(await run_timed(
+            f"get_detailed_match_history(20) {label}",
+            [lambda i=i: get_detailed_match_history("na1", pick(i if cold else 0), 20) for i in range(iterations)],
+            env, before=before
+        ))
+    return results
+
+async def bench_bot(env, iterations):
+    # Imported here so the Riot API benchmarks still run without discord.py installed
+    import LeagueBot
+
+    guild_id = str(env.guilds[0].id)
+    results = [
+        await run_timed(
+            f"leaderboard ({env.player_count} players) cold",
+            [lambda: LeagueBot.build_leaderboard_embed(guild_id) for _ in range(iterations)],
+            env, before=env.reset_caches
+        ),
+        await run_timed(
+            f"leaderboard ({env.player_count} players) warm",
+            [lambda: LeagueBot.build_leaderboard_embed(guild_id) for _ in range(iterations)],
+            env
+        )
+    ]
+
+    async def sweep():
+        await LeagueBot.run_streak_sweep(env.guilds)
+
+    players = env.guild_count * env.player_count
+    sweeps = max(1, iterations // 5)
+    results.append(await run_timed(
+        f"check_streaks ({env.guild_count}x{env.player_count}) cold",
+        [sweep for _ in range(sweeps)],
+        env, units=players * sweeps, before=env.reset_caches
+    ))
+
+    role_counts = {"TOP": 6, "JUNGLE": 3, "MIDDLE": 8, "BOTTOM": 2, "UTILITY": 1}
+    results.append(run_timed_sync("render_role_chart", lambda: LeagueBot.render_role_chart(role_counts), iterations))
+    results.append(run_timed_sync("render_strongest_image", lambda: LeagueBot.render_strongest_image("Bench0x0#BNCH"), iterations))
+    return results
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r for r in json.load(f)}
+    regressions = []
+    for result in results:
+        old = baseline.get(result["name"])
+        if not old:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if old[key] and result[key] > old[key] * (1 + REGRESSION_THRESHOLD):
+                regressions.append(f"{result['name']}: {key} {old[key]:.1f} -> {result[key]:.1f}")
+    return regressions
+
+async def main(args):
+    results = []
+    async with BenchEnvironment(
+        guilds=args.guilds,
+        players=args.players,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        rate_limit_ratio=args.rate_limit_ratio,
+        fixtures_dir=args.fixtures
+    ) as env:
+        if args.only in (None, "api"):
+            results.extend(await bench_riot_api(env, args.iterations))
+        if args.only in (None, "bot"):
+            try:
+                results.extend(await bench_bot(env, args.iterations))
+            except ImportError as e:
+                print(f"Skipping bot benchmarks ({e})")
+        print(f"Fake server: {env.server.requests} requests, {env.server.rate_limited} answered with 429")
+
+    print(format_results(results))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--guilds", type=int, default=5)
+    parser.add_argument("--players", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--fixtures", help="directory of recorded payloads from benchmarks/record.py")
+    parser.add_argument("--only", choices=["api", "bot"])
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from --save to check for regressions")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+import aiohttp
+import aiosqlite
+from autocomplete import SearchIndex
+
+DDRAGON_URL = "https://ddragon.leagueoflegends.com"
+
+async def _fetch_ddragon(session, path):
+    async with session.get(f"{DDRAGON_URL}{path}", timeout=aiohttp.ClientTimeout(total=15)) as response:
+        return await response.json() if response.status == 200 else None
+
+class ChampionCatalog:
+    """Data Dragon champion list for one patch, persisted per version in SQLite"""
+
+    def __init__(self):
+        self.version = None
+        self.id_to_name = {}
+        self.name_to_id = {}
+        self.sorted_names = []
+        self.search_index = SearchIndex()
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self):
+        return self.version is not None
+
+    def load(self, version, champ_data):
+        """Build lookup tables and search indexes from a champion.json payload"""
+        id_to_name = {}
+        name_to_id = {}
+        for val in champ_data["data"].values():
+            id_to_name[int(val["key"])] = val["name"]
+            name_to_id[val["name"].lower()] = int(val["key"])
+
+        self.id_to_name = id_to_name
+        self.name_to_id = name_to_id
+        self.sorted_names = sorted(id_to_name.values(), key=str.lower)
+        self.search_index = SearchIndex(self.sorted_names)
+        self.version = version
+
+    def search(self, query, limit=25):
+        """Champion names matching query by prefix, substring, then fuzzy similarity"""
+        return self.search_index.search(query, limit)
+
+    def find_id(self, champion_name):
+        """Resolve a champion name to its ID, ignoring case and punctuation (e.g. khazix)"""
+        champion_id = self.name_to_id.get(champion_name.lower())
+        if champion_id is None:
+            match = self.search_index.find(champion_name)
+            if match:
+                champion_id = self.name_to_id.get(match.lower())
+        return champion_id
+
+    async def _load_from_disk(self, version=None):
+        async with aiosqlite.connect("riot_bot.db") as conn:
+            if version:
+                query = "SELECT version, data FROM champion_catalog WHERE version = ?"
+                params = (version,)
+            else:
+                query = "SELECT version, data FROM champion_catalog ORDER BY fetched_at DESC LIMIT 1"
+                params = ()
+            async with conn.execute(query, params) as cursor:
+                row = await cursor.fetchone()
+        if not row:
+            return False
+        self.load(row[0], json.loads(row[1]))
+        return True
+
+    async def _save_to_disk(self, version, champ_data):
+        async with aiosqlite.connect("riot_bot.db") as conn:
+            await conn.execute(
+                "INSERT OR REPLACE INTO champion_catalog (version, data, fetched_at) VALUES (?, ?, ?)",
+                (version, json.dumps(champ_data), int(time.time()))
+            )
+            await conn.commit()
+
+    async def ensure_loaded(self):
+        """Load the newest catalog on disk, only going to the network if there is none"""
+        if self.loaded:
+            return
+        async with self._lock:
+            if self.loaded:
+                return
+            if not await self._load_from_disk():
+                await self._refresh_locked()
+
+    async def refresh(self):
+        """Check Data Dragon for a new patch and swap the catalog in if one appeared"""
+        async with self._lock:
+            return await self._refresh_locked()
+
+    async def _refresh_locked(self):
+        async with aiohttp.ClientSession() as session:
+            versions = await _fetch_ddragon(session, "/api/versions.json")
+            if not versions:
+                return False
+            latest = versions[0]
+            if latest == self.version:
+                return False
+            if await self._load_from_disk(latest):
+                return True
+
+            champ_data = await _fetch_ddragon(session, f"/cdn/{latest}/data/en_US/champion.json")
+            if not champ_data:
+                return False
+
+        await self._save_to_disk(latest, champ_data)
+        self.load(latest, champ_data)
+        print(f"Loaded champion catalog for patch {latest} ({len(self.id_to_name)} champions)")
+        return True
+
+champion_catalog = ChampionCatalog()
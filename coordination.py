@@ -0,0 +1,165 @@
+import asyncio
+import functools
+import os
+import socket
+import time
+import aiosqlite
+
+# State shared by every bot process that points at the same riot_bot.db, so several shard
+# processes can run side by side: one Riot app rate limit between them, and leases so jobs
+# that cover every guild (cache cleanup, mastery refresh, prefetch) run in one process only.
+
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+def parse_rate_limits(value):
+    """"20:1,100:120" -> [(20, 1.0), (100, 120.0)], i.e. requests per window in seconds"""
+    limits = []
+    for part in (value or "").split(","):
+        if part.strip():
+            requests, seconds = part.split(":")
+            limits.append((int(requests), float(seconds)))
+    return limits
+
+RATE_LIMIT_BATCH = 5  # request slots a process reserves per SQLite transaction
+
+class SharedRateLimiter:
+    """Riot app rate limits counted in SQLite, so every process on the host draws from one budget.
+
+    Each window is a fixed bucket row (start time and request count) updated inside a
+    BEGIN IMMEDIATE transaction. A process reserves up to `batch` slots per transaction and
+    hands them out locally until the shortest window they were counted in closes, so the
+    write rate is roughly requests / batch rather than one write per request. A 429 also
+    stores a blocked-until time that all processes honour, and drops any local slots. With
+    no limits configured acquire() returns straight away.
+    """
+
+    def __init__(self, limits, db_path="riot_bot.db", batch=RATE_LIMIT_BATCH):
+        self.limits = limits
+        self.db_path = db_path
+        self.batch = batch
+        self.waited = 0.0
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._slots = 0
+        self._slots_expire = 0.0
+
+    async def _connection(self):
+        if self._conn is None:
+            # Autocommit mode, so BEGIN IMMEDIATE below is the only transaction
+            self._conn = await aiosqlite.connect(self.db_path, isolation_level=None)
+        return self._conn
+
+    async def _take_slots(self):
+        """Count up to `batch` requests in every window.
+
+        Returns (wait, slots, expires): how long to wait before trying again, or how many slots
+        were taken and when the shortest window holding them ends.
+        """
+        conn = await self._connection()
+        now = time.time()
+        buckets = ["blocked"] + [f"app:{seconds:g}" for _, seconds in self.limits]
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            async with conn.execute(
+                f"SELECT bucket, window_start, count FROM riot_rate_limits WHERE bucket IN ({', '.join('?' * len(buckets))})",
+                buckets
+            ) as cursor:
+                state = {bucket: (start, count) for bucket, start, count in await cursor.fetchall()}
+
+            wait = max(0.0, state.get("blocked", (0.0, 0))[0] - now)
+            slots, expires = self.batch, float("inf")
+            windows = []
+            for (requests, seconds), bucket in zip(self.limits, buckets[1:]):
+                start, count = state.get(bucket, (now, 0))
+                if now - start >= seconds:
+                    start, count = now, 0
+                if count >= requests:
+                    wait = max(wait, start + seconds - now)
+                slots = min(slots, requests - count)
+                expires = min(expires, start + seconds)
+                windows.append((bucket, start, count))
+
+            if not wait:
+                await conn.executemany(
+                    "INSERT OR REPLACE INTO riot_rate_limits (bucket, window_start, count) VALUES (?, ?, ?)",
+                    [(bucket, start, count + slots) for bucket, start, count in windows]
+                )
+            await conn.execute("COMMIT")
+        except Exception:
+            await conn.execute("ROLLBACK")
+            raise
+        return (wait, 0, 0.0) if wait else (0.0, slots, expires)
+
+    async def acquire(self):
+        if not self.limits:
+            return
+        # One request per process queries SQLite at a time; the rest queue here in order
+        async with self._lock:
+            while True:
+                if self._slots and time.time() < self._slots_expire:
+                    self._slots -= 1
+                    return
+                wait, self._slots, self._slots_expire = await self._take_slots()
+                if not wait:
+                    continue
+                self.waited += wait
+                await asyncio.sleep(wait)
+
+    async def block(self, retry_after):
+        """Hold every process off the Riot API after a 429"""
+        if not self.limits:
+            return
+        self._slots = 0
+        conn = await self._connection()
+        await conn.execute(
+            '''INSERT INTO riot_rate_limits (bucket, window_start, count) VALUES ('blocked', ?, 0)
+               ON CONFLICT(bucket) DO UPDATE SET window_start = MAX(window_start, excluded.window_start)''',
+            (time.time() + retry_after,)
+        )
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+# Requests are only throttled when RIOT_RATE_LIMITS is set to the key's app rate limit
+riot_limiter = SharedRateLimiter(parse_rate_limits(os.getenv("RIOT_RATE_LIMITS")))
+
+async def acquire_lease(name, ttl, owner=PROCESS_ID):
+    """True if owner holds the named lease, taking it over if it is free or has expired.
+
+    The holder renews it on every call; a lease left behind by a process that died is
+    picked up by another one after ttl seconds.
+    """
+    now = int(time.time())
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        await conn.execute('''
+            INSERT INTO job_leases (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE job_leases.owner = excluded.owner OR job_leases.expires_at < ?
+        ''', (name, owner, now + ttl, now))
+        await conn.commit()
+        async with conn.execute("SELECT owner FROM job_leases WHERE name = ?", (name,)) as cursor:
+            row = await cursor.fetchone()
+    return row is not None and row[0] == owner
+
+async def release_lease(name, owner=PROCESS_ID):
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        await conn.execute("DELETE FROM job_leases WHERE name = ? AND owner = ?", (name, owner))
+        await conn.commit()
+
+async def release_leases(owner=PROCESS_ID):
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        await conn.execute("DELETE FROM job_leases WHERE owner = ?", (owner,))
+        await conn.commit()
+
+def leased(name, ttl):
+    """Skip the decorated job unless this process holds the named lease"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not await acquire_lease(name, ttl):
+                return None
+            return await func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,119 +1,37 @@
 import aiosqlite
+import time
+from migrations import apply_migrations
+from riot_ids import riot_id_key
+from write_behind import write_queue
+from metrics import db_timed
+
+DEBUG_REPORT_TTL = 7 * 24 * 60 * 60  # 7 days in seconds
 
 async def init_db():
     async with aiosqlite.connect("riot_bot.db") as conn:
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS tracked_players (
-                guild_id TEXT,
-                summoner_name TEXT,
-                region TEXT,
-                last_match_id TEXT
-            )
-        ''')
-
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS highest_ranked (
-                guild_id TEXT PRIMARY KEY,
-                summoner_name TEXT,
-                region TEXT,
-                tier TEXT,
-                rank TEXT,
-                lp INTEGER
-            )
-        ''')
-
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS tiltcheck_settings (
-                guild_id TEXT PRIMARY KEY,
-                enabled INTEGER
-            )
-        ''')
-
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS tiltcheck_cooldowns (
-                guild_id TEXT,
-                summoner_name TEXT,
-                last_match_id TEXT,
-                last_tiltcheck_time TIMESTAMP,
-                last_streak_length INTEGER,
-                PRIMARY KEY (guild_id, summoner_name)
-            )
-        ''')
-
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS winstreak_cooldowns (
-                guild_id TEXT,
-                summoner_name TEXT,
-                last_match_id TEXT,
-                last_winstreak_time TIMESTAMP,
-                last_streak_length INTEGER,
-                PRIMARY KEY (guild_id, summoner_name)
-            )
-        ''')
-
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS wincheck_settings (
-                guild_id TEXT PRIMARY KEY,
-                enabled INTEGER
-            )
-        ''')
-
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS notification_channels (
-                guild_id TEXT PRIMARY KEY,
-                channel_id TEXT
-            )
-        ''')
-
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS discord_riot_mapping (
-                guild_id TEXT,
-                discord_id TEXT,
-                riot_id TEXT,
-                PRIMARY KEY (guild_id, discord_id)
-            )
-        ''')
-
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS strongest_players (
-                guild_id TEXT PRIMARY KEY,
-                summoner_name TEXT,
-                tier TEXT,
-                division TEXT,
-                lp INTEGER,
-                last_update TIMESTAMP,
-                days_as_strongest INTEGER DEFAULT 0
-            )
-        ''')
-
-        # Check if days_as_strongest column exists
-        async with conn.execute("PRAGMA table_info(strongest_players)") as cursor:
-            columns = [row[1] for row in await cursor.fetchall()]
-            
-        # Add days_as_strongest column if it doesn't exist
-        if 'days_as_strongest' not in columns:
-            await conn.execute('ALTER TABLE strongest_players ADD COLUMN days_as_strongest INTEGER DEFAULT 0')
-            
-        await conn.commit()
+        # WAL lets shard processes read while another one writes; the mode is stored in the file
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await apply_migrations(conn)
 
-async def add_tracked_player(guild_id, summoner_name, region):
+async def add_tracked_player(guild_id, summoner_name, region, puuid=None):
     async with aiosqlite.connect("riot_bot.db") as conn:
         # Check if player already exists (case-insensitive)
         async with conn.execute('''
             SELECT summoner_name FROM tracked_players
-            WHERE guild_id = ? AND LOWER(summoner_name) = LOWER(?)
-        ''', (guild_id, summoner_name)) as cursor:
+            WHERE guild_id = ? AND normalized_name = ?
+        ''', (guild_id, riot_id_key(summoner_name))) as cursor:
             existing_player = await cursor.fetchone()
             if existing_player:
                 raise ValueError(f"Player {summoner_name} is already being tracked in this server.")
 
         await conn.execute('''
-            INSERT INTO tracked_players (guild_id, summoner_name, region, last_match_id)
-            VALUES (?, ?, ?, NULL)
-        ''', (guild_id, summoner_name, region.lower()))
+            INSERT INTO tracked_players (guild_id, summoner_name, normalized_name, region, last_match_id, puuid)
+            VALUES (?, ?, ?, ?, NULL, ?)
+        ''', (guild_id, summoner_name, riot_id_key(summoner_name), region.lower(), puuid))
 
         await conn.commit()
 
+@db_timed
 async def get_tracked_players(guild_id):
     async with aiosqlite.connect("riot_bot.db") as conn:
         async with conn.execute('''
@@ -123,107 +41,53 @@ async def get_tracked_players(guild_id):
             rows = await cursor.fetchall()
             return rows
 
+async def get_tracked_guild_ids():
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute("SELECT DISTINCT guild_id FROM tracked_players") as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+async def get_tracked_guilds_for_player(riot_key):
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute("SELECT guild_id FROM tracked_players WHERE normalized_name = ?", (riot_key,)) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
 async def remove_tracked_player(guild_id, summoner_name):
     async with aiosqlite.connect("riot_bot.db") as conn:
         await conn.execute('''
             DELETE FROM tracked_players
-            WHERE guild_id = ? AND LOWER(summoner_name) = LOWER(?)
-        ''', (guild_id, summoner_name))
+            WHERE guild_id = ? AND normalized_name = ?
+        ''', (guild_id, riot_id_key(summoner_name)))
         await conn.commit()
 
-async def toggle_tiltcheck(guild_id):
+async def set_tiltcheck_enabled(guild_id, enabled):
     async with aiosqlite.connect("riot_bot.db") as conn:
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS tiltcheck_settings (
-                guild_id TEXT PRIMARY KEY,
-                enabled INTEGER
-            )
-        ''')
-
-        async with conn.execute('SELECT enabled FROM tiltcheck_settings WHERE guild_id = ?', (guild_id,)) as cursor:
-            row = await cursor.fetchone()
-
-        if row:
-            new_status = 0 if row[0] else 1
-            await conn.execute('UPDATE tiltcheck_settings SET enabled = ? WHERE guild_id = ?', (new_status, guild_id))
-        else:
-            new_status = 1
-            await conn.execute('INSERT INTO tiltcheck_settings (guild_id, enabled) VALUES (?, ?)', (guild_id, new_status))
-
+        await conn.execute(
+            'INSERT OR REPLACE INTO tiltcheck_settings (guild_id, enabled) VALUES (?, ?)',
+            (guild_id, 1 if enabled else 0)
+        )
         await conn.commit()
-        return new_status == 1
-
-async def is_tiltcheck_enabled(guild_id):
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        async with conn.execute('SELECT enabled FROM tiltcheck_settings WHERE guild_id = ?', (guild_id,)) as cursor:
-            row = await cursor.fetchone()
-            return row and row[0] == 1
 
 async def update_tiltcheck_cooldown(guild_id, summoner_name, match_id, streak_length):
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        await conn.execute('''
-            INSERT OR REPLACE INTO tiltcheck_cooldowns 
-            (guild_id, summoner_name, last_match_id, last_tiltcheck_time, last_streak_length)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)
-        ''', (guild_id, summoner_name, match_id, streak_length))
-        await conn.commit()
-
-async def get_tiltcheck_cooldown(guild_id, summoner_name):
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        async with conn.execute('''
-            SELECT last_match_id, last_tiltcheck_time, last_streak_length 
-            FROM tiltcheck_cooldowns 
-            WHERE guild_id = ? AND summoner_name = ?
-        ''', (guild_id, summoner_name)) as cursor:
-            result = await cursor.fetchone()
-            return result if result else (None, None, 0)
+    write_queue.enqueue('''
+        INSERT OR REPLACE INTO tiltcheck_cooldowns
+        (guild_id, summoner_name, last_match_id, last_tiltcheck_time, last_streak_length)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)
+    ''', (guild_id, summoner_name, match_id, streak_length))
 
 async def update_winstreak_cooldown(guild_id, summoner_name, match_id, streak_length):
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        await conn.execute('''
-            INSERT OR REPLACE INTO winstreak_cooldowns 
-            (guild_id, summoner_name, last_match_id, last_winstreak_time, last_streak_length)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)
-        ''', (guild_id, summoner_name, match_id, streak_length))
-        await conn.commit()
-
-async def get_winstreak_cooldown(guild_id, summoner_name):
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        async with conn.execute('''
-            SELECT last_match_id, last_winstreak_time, last_streak_length
-            FROM winstreak_cooldowns 
-            WHERE guild_id = ? AND summoner_name = ?
-        ''', (guild_id, summoner_name)) as cursor:
-            result = await cursor.fetchone()
-            return result if result else (None, None, 0)
+    write_queue.enqueue('''
+        INSERT OR REPLACE INTO winstreak_cooldowns
+        (guild_id, summoner_name, last_match_id, last_winstreak_time, last_streak_length)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)
+    ''', (guild_id, summoner_name, match_id, streak_length))
 
-async def toggle_wincheck(guild_id):
+async def set_wincheck_enabled(guild_id, enabled):
     async with aiosqlite.connect("riot_bot.db") as conn:
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS wincheck_settings (
-                guild_id TEXT PRIMARY KEY,
-                enabled INTEGER
-            )
-        ''')
-
-        async with conn.execute('SELECT enabled FROM wincheck_settings WHERE guild_id = ?', (guild_id,)) as cursor:
-            row = await cursor.fetchone()
-
-        if row:
-            new_status = 0 if row[0] else 1
-            await conn.execute('UPDATE wincheck_settings SET enabled = ? WHERE guild_id = ?', (new_status, guild_id))
-        else:
-            new_status = 1
-            await conn.execute('INSERT INTO wincheck_settings (guild_id, enabled) VALUES (?, ?)', (guild_id, new_status))
-
+        await conn.execute(
+            'INSERT OR REPLACE INTO wincheck_settings (guild_id, enabled) VALUES (?, ?)',
+            (guild_id, 1 if enabled else 0)
+        )
         await conn.commit()
-        return new_status == 1
-
-async def is_wincheck_enabled(guild_id):
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        async with conn.execute('SELECT enabled FROM wincheck_settings WHERE guild_id = ?', (guild_id,)) as cursor:
-            row = await cursor.fetchone()
-            return row and row[0] == 1
 
 async def set_notification_channel(guild_id, channel_id):
     async with aiosqlite.connect("riot_bot.db") as conn:
@@ -233,32 +97,52 @@ async def set_notification_channel(guild_id, channel_id):
         ''', (guild_id, channel_id))
         await conn.commit()
 
-async def get_notification_channel(guild_id):
+@db_timed
+async def load_guild_settings():
+    """Load every guild's alert toggles and notification channel in one pass."""
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute('SELECT guild_id, enabled FROM tiltcheck_settings') as cursor:
+            tiltcheck = {guild_id: enabled == 1 for guild_id, enabled in await cursor.fetchall()}
+        async with conn.execute('SELECT guild_id, enabled FROM wincheck_settings') as cursor:
+            wincheck = {guild_id: enabled == 1 for guild_id, enabled in await cursor.fetchall()}
+        async with conn.execute('SELECT guild_id, channel_id FROM notification_channels') as cursor:
+            channels = dict(await cursor.fetchall())
+    return tiltcheck, wincheck, channels
+
+@db_timed
+async def load_streak_cooldowns():
+    """Load all tilt and win streak cooldowns keyed by (guild_id, summoner_name)."""
     async with aiosqlite.connect("riot_bot.db") as conn:
         async with conn.execute('''
-            SELECT channel_id FROM notification_channels
-            WHERE guild_id = ?
-        ''', (guild_id,)) as cursor:
-            result = await cursor.fetchone()
-            return result[0] if result else None
+            SELECT guild_id, summoner_name, last_match_id, last_tiltcheck_time, last_streak_length
+            FROM tiltcheck_cooldowns
+        ''') as cursor:
+            tilt = {(row[0], row[1]): tuple(row[2:]) for row in await cursor.fetchall()}
+        async with conn.execute('''
+            SELECT guild_id, summoner_name, last_match_id, last_winstreak_time, last_streak_length
+            FROM winstreak_cooldowns
+        ''') as cursor:
+            win = {(row[0], row[1]): tuple(row[2:]) for row in await cursor.fetchall()}
+    return tilt, win
 
 async def link_discord_riot(guild_id, discord_id, riot_id):
     async with aiosqlite.connect("riot_bot.db") as conn:
         # Verify the Riot ID exists in tracked_players
         async with conn.execute('''
             SELECT summoner_name FROM tracked_players
-            WHERE guild_id = ? AND LOWER(summoner_name) = LOWER(?)
-        ''', (guild_id, riot_id)) as cursor:
+            WHERE guild_id = ? AND normalized_name = ?
+        ''', (guild_id, riot_id_key(riot_id))) as cursor:
             if not await cursor.fetchone():
                 raise ValueError(f"Riot ID {riot_id} is not being tracked in this server.")
 
         # Store the mapping
         await conn.execute('''
-            INSERT OR REPLACE INTO discord_riot_mapping (guild_id, discord_id, riot_id)
-            VALUES (?, ?, ?)
-        ''', (guild_id, discord_id, riot_id))
+            INSERT OR REPLACE INTO discord_riot_mapping (guild_id, discord_id, riot_id, riot_key)
+            VALUES (?, ?, ?, ?)
+        ''', (guild_id, discord_id, riot_id, riot_id_key(riot_id)))
         await conn.commit()
 
+@db_timed
 async def get_riot_id_for_discord(guild_id, discord_id):
     async with aiosqlite.connect("riot_bot.db") as conn:
         async with conn.execute('''
@@ -268,15 +152,17 @@ async def get_riot_id_for_discord(guild_id, discord_id):
             result = await cursor.fetchone()
             return result[0] if result else None
 
+@db_timed
 async def get_discord_id_for_riot(guild_id, riot_id):
     async with aiosqlite.connect("riot_bot.db") as conn:
         async with conn.execute('''
             SELECT discord_id FROM discord_riot_mapping
-            WHERE guild_id = ? AND LOWER(riot_id) = LOWER(?)
-        ''', (guild_id, riot_id)) as cursor:
+            WHERE guild_id = ? AND riot_key = ?
+        ''', (guild_id, riot_id_key(riot_id))) as cursor:
             result = await cursor.fetchone()
             return result[0] if result else None
 
+@db_timed
 async def get_all_mapped_players(guild_id):
     async with aiosqlite.connect("riot_bot.db") as conn:
         async with conn.execute(
@@ -285,6 +171,17 @@ async def get_all_mapped_players(guild_id):
         ) as cursor:
             return await cursor.fetchall()
 
+async def get_mapped_players_in_rank_range(guild_id, queue_type, low, high):
+    """Linked players whose rank snapshot for queue_type lies between the two ordinals"""
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute('''
+            SELECT m.discord_id, m.riot_id
+            FROM discord_riot_mapping m
+            JOIN rank_snapshots r ON r.riot_key = m.riot_key AND r.queue_type = ?
+            WHERE m.guild_id = ? AND r.ordinal BETWEEN ? AND ?
+        ''', (queue_type, guild_id, low, high)) as cursor:
+            return await cursor.fetchall()
+
 async def unlink_discord_riot(guild_id, discord_id):
     """Unlink a Discord account from its Riot ID mapping."""
     async with aiosqlite.connect("riot_bot.db") as conn:
@@ -294,22 +191,38 @@ async def unlink_discord_riot(guild_id, discord_id):
         )
         await conn.commit()
 
-async def ensure_puuid_table():
-    """Ensure the puuid_cache table exists in the database."""
+async def clear_guild_players(guild_id):
+    """Clear tracked players and unlink all mappings for a guild in a single transaction."""
     async with aiosqlite.connect("riot_bot.db") as conn:
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS puuid_cache (
-                riot_id TEXT PRIMARY KEY,
-                puuid TEXT,
-                cached_at INTEGER
-            )
-        ''')
+        await conn.execute("DELETE FROM tracked_players WHERE guild_id = ?", (guild_id,))
+        await conn.execute("DELETE FROM discord_riot_mapping WHERE guild_id = ?", (guild_id,))
         await conn.commit()
 
-async def clear_tracked_players(guild_id):
+async def save_debug_report(report_id, riot_id, data):
+    """Store a serialized debug report keyed by its content hash."""
     async with aiosqlite.connect("riot_bot.db") as conn:
         await conn.execute('''
-            DELETE FROM tracked_players
-            WHERE guild_id = ?
-        ''', (guild_id,))
+            INSERT OR IGNORE INTO debug_reports (report_id, riot_id, data, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (report_id, riot_id, data, int(time.time())))
+        await conn.commit()
+
+async def get_debug_report(report_id):
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute(
+            "SELECT riot_id, data FROM debug_reports WHERE report_id = ?",
+            (report_id,)
+        ) as cursor:
+            return await cursor.fetchone()
+
+async def clear_expired_debug_reports():
+    """Clear debug reports older than DEBUG_REPORT_TTL"""
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        cutoff_time = int(time.time()) - DEBUG_REPORT_TTL
+        async with conn.execute(
+            "DELETE FROM debug_reports WHERE created_at < ?",
+            (cutoff_time,)
+        ) as cursor:
+            deleted_count = cursor.rowcount
         await conn.commit()
+        return deleted_count
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from metrics import registry
+
+LAG_INTERVAL = 0.1          # how often the loop-side probe ticks (seconds)
+BLOCK_THRESHOLD = 0.25      # a callback holding the loop this long gets its stack captured
+RECENT_STALLS = 20          # stalls kept for /botstats
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a periodic probe",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+loop_blocked = registry.counter("event_loop_blocked_total", "Event loop stalls over the threshold by blocking location", ("location",))
+loop_blocked_seconds = registry.counter("event_loop_blocked_seconds_total", "Total time the event loop spent blocked over the threshold")
+
+def _blocking_location(frames):
+    """Innermost frame from the bot's own code, falling back to the innermost frame"""
+    for frame in reversed(frames):
+        if frame.filename.startswith(REPO_DIR) and "site-packages" not in frame.filename:
+            return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+    frame = frames[-1]
+    return f"{os.path.basename(frame.filename)}:{frame.lineno} {frame.name}"
+
+class LoopWatchdog:
+    """Measures event loop lag and captures what is blocking it.
+
+    A probe task on the loop records how late each tick wakes up. A separate thread checks
+    when the probe last ran; once the loop has been stuck longer than BLOCK_THRESHOLD it
+    grabs the loop thread's stack, so the offending code is caught while it still runs.
+    """
+
+    def __init__(self, interval=LAG_INTERVAL, threshold=BLOCK_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = deque(maxlen=RECENT_STALLS)  # (timestamp, seconds, location, stack)
+        self.max_lag = 0.0
+        self._last_tick = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            loop_lag_seconds.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            self._last_tick = time.monotonic()
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            last_tick = self._last_tick
+            if time.monotonic() - last_tick - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            frames = traceback.extract_stack(frame)
+            location = _blocking_location(frames)
+            stack = "".join(traceback.format_list(frames[-8:]))
+
+            # The stack is taken mid-stall; wait for the loop to come back to know how long it lasted
+            while self._last_tick == last_tick and not self._stop.wait(0.05):
+                pass
+            end = self._last_tick if self._last_tick != last_tick else time.monotonic()
+            duration = max(0.0, end - last_tick - self.interval)
+            loop_blocked.inc(location=location)
+            loop_blocked_seconds.inc(duration)
+            self.stalls.append((time.time(), duration, location, stack))
+            print(f"Event loop blocked for {duration:.2f}s at {location}\n{stack}")
+
+watchdog = LoopWatchdog()
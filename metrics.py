@@ -0,0 +1,205 @@
+import bisect
+import functools
+import time
+from aiohttp import web
+
+# Latency buckets in seconds, from a fast SQLite read up to a full poll sweep
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{name}="{value}"'.replace("\n", " ") for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(_label_key(self.labelnames, labels), 0)
+
+    def total(self):
+        return sum(self.values.values())
+
+    def samples(self):
+        for key, value in sorted(self.values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+class Gauge(Counter):
+    """A value that can go up and down, or be read from a callback at export time"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        self.values[_label_key(self.labelnames, labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            self.values = {(): self._function()}
+        return super().samples()
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        series = self.values.get(_label_key(self.labelnames, labels))
+        return sum(series[:-1]) if series else 0
+
+    def summary(self, **labels):
+        """(count, mean, approximate p95) in seconds for one label set"""
+        series = self.values.get(_label_key(self.labelnames, labels))
+        if not series:
+            return 0, 0.0, 0.0
+        count = sum(series[:-1])
+        target = count * 0.95
+        seen = 0
+        p95 = self.buckets[-1]
+        for bound, bucket_count in zip(self.buckets, series):
+            seen += bucket_count
+            if seen >= target:
+                p95 = bound
+                break
+        return count, series[-1] / count, p95
+
+    def samples(self):
+        for key, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, key, ("le", bound)), cumulative
+            cumulative += series[len(self.buckets)]
+            yield f"{self.name}_bucket", _format_labels(self.labelnames, key, ("le", "+Inf")), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, key), series[-1]
+            yield f"{self.name}_count", _format_labels(self.labelnames, key), cumulative
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+started_at = time.time()
+
+riot_requests = registry.counter("riot_requests_total", "Riot API responses by endpoint and HTTP status", ("endpoint", "status"))
+riot_rate_limited = registry.counter("riot_rate_limited_total", "Riot API 429 responses by endpoint", ("endpoint",))
+riot_request_seconds = registry.histogram("riot_request_seconds", "Riot API request latency", ("endpoint",))
+cache_requests = registry.counter("cache_requests_total", "Cache lookups by cache and result (hit or miss)", ("cache", "result"))
+db_query_seconds = registry.histogram("db_query_seconds", "SQLite query latency by operation", ("operation",))
+poll_sweep_seconds = registry.histogram("poll_sweep_seconds", "Duration of background sweeps by loop", ("loop",))
+command_seconds = registry.histogram("command_seconds", "Slash command latency from interaction to completion", ("command",))
+command_errors = registry.counter("command_errors_total", "Slash commands that raised an error", ("command",))
+
+def record_cache(cache, hit, amount=1):
+    cache_requests.inc(amount, cache=cache, result="hit" if hit else "miss")
+
+def cache_hit_ratio(cache):
+    hits = cache_requests.get(cache=cache, result="hit")
+    total = hits + cache_requests.get(cache=cache, result="miss")
+    return hits / total if total else None
+
+def timed(histogram, **labels):
+    """Decorator recording how long an async function takes"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def db_timed(func):
+    """Record an async DB helper's latency under its function name"""
+    return timed(db_query_seconds, operation=func.__name__)(func)
+
+async def start_metrics_server(host="127.0.0.1", port=9108):
+    """Serve registry.render() at http://host:port/metrics"""
+    async def handle_metrics(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,380 @@
+import asyncio
+import sys
+import time
+import aiosqlite
+from riot_ids import riot_id_key
+from ranks import rank_ordinal
+
+# Each migration runs once, in order, inside its own transaction. The schema version is kept in
+# PRAGMA user_version and every applied migration is recorded in schema_migrations.
+
+def _name_key(name):
+    # Fall back to plain lowercasing for rows that predate Riot ID validation
+    return riot_id_key(name) or (name or "").strip().lower()
+
+async def _baseline(conn):
+    """Every table the bot created ad hoc before migrations existed"""
+    statements = [
+        '''CREATE TABLE IF NOT EXISTS tracked_players (
+            guild_id TEXT,
+            summoner_name TEXT,
+            region TEXT,
+            last_match_id TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS highest_ranked (
+            guild_id TEXT PRIMARY KEY,
+            summoner_name TEXT,
+            region TEXT,
+            tier TEXT,
+            rank TEXT,
+            lp INTEGER
+        )''',
+        '''CREATE TABLE IF NOT EXISTS tiltcheck_settings (
+            guild_id TEXT PRIMARY KEY,
+            enabled INTEGER
+        )''',
+        '''CREATE TABLE IF NOT EXISTS tiltcheck_cooldowns (
+            guild_id TEXT,
+            summoner_name TEXT,
+            last_match_id TEXT,
+            last_tiltcheck_time TIMESTAMP,
+            last_streak_length INTEGER,
+            PRIMARY KEY (guild_id, summoner_name)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS winstreak_cooldowns (
+            guild_id TEXT,
+            summoner_name TEXT,
+            last_match_id TEXT,
+            last_winstreak_time TIMESTAMP,
+            last_streak_length INTEGER,
+            PRIMARY KEY (guild_id, summoner_name)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS wincheck_settings (
+            guild_id TEXT PRIMARY KEY,
+            enabled INTEGER
+        )''',
+        '''CREATE TABLE IF NOT EXISTS notification_channels (
+            guild_id TEXT PRIMARY KEY,
+            channel_id TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS discord_riot_mapping (
+            guild_id TEXT,
+            discord_id TEXT,
+            riot_id TEXT,
+            PRIMARY KEY (guild_id, discord_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS strongest_players (
+            guild_id TEXT PRIMARY KEY,
+            summoner_name TEXT,
+            tier TEXT,
+            division TEXT,
+            lp INTEGER,
+            last_update TIMESTAMP,
+            days_as_strongest INTEGER DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS debug_reports (
+            report_id TEXT PRIMARY KEY,
+            riot_id TEXT,
+            data TEXT,
+            created_at INTEGER
+        )''',
+        '''CREATE TABLE IF NOT EXISTS puuid_cache (
+            riot_id TEXT PRIMARY KEY,
+            puuid TEXT,
+            cached_at INTEGER
+        )''',
+        '''CREATE TABLE IF NOT EXISTS match_data (
+            match_id TEXT PRIMARY KEY,
+            data TEXT,
+            cached_at INTEGER
+        )''',
+        '''CREATE TABLE IF NOT EXISTS first_blood_events (
+            match_id TEXT,
+            puuid TEXT,
+            participant_id INTEGER,
+            champion TEXT,
+            queue_id INTEGER,
+            game_timestamp INTEGER,
+            first_blood_kill INTEGER,
+            first_blood_assist INTEGER,
+            first_blood_victim INTEGER,
+            first_blood_time INTEGER,
+            PRIMARY KEY (match_id, puuid)
+        )''',
+        '''CREATE INDEX IF NOT EXISTS idx_first_blood_puuid
+            ON first_blood_events (puuid, queue_id, game_timestamp)''',
+        '''CREATE TABLE IF NOT EXISTS champion_catalog (
+            version TEXT PRIMARY KEY,
+            data TEXT,
+            fetched_at INTEGER
+        )''',
+        '''CREATE TABLE IF NOT EXISTS champion_mastery (
+            puuid TEXT,
+            champion_id INTEGER,
+            champion_level INTEGER,
+            champion_points INTEGER,
+            last_play_time INTEGER,
+            PRIMARY KEY (puuid, champion_id)
+        )''',
+        '''CREATE INDEX IF NOT EXISTS idx_champion_mastery_champion
+            ON champion_mastery (champion_id, champion_points)''',
+        '''CREATE TABLE IF NOT EXISTS mastery_refresh (
+            puuid TEXT PRIMARY KEY,
+            refreshed_at INTEGER
+        )''',
+    ]
+    for statement in statements:
+        await conn.execute(statement)
+
+    # Older databases predate days_as_strongest
+    async with conn.execute("PRAGMA table_info(strongest_players)") as cursor:
+        columns = [row[1] for row in await cursor.fetchall()]
+    if 'days_as_strongest' not in columns:
+        await conn.execute('ALTER TABLE strongest_players ADD COLUMN days_as_strongest INTEGER DEFAULT 0')
+
+async def _keys_and_indexes(conn):
+    """Give tracked_players a real key on a normalized name and index the range-deleted cache columns"""
+    async with conn.execute("SELECT guild_id, summoner_name, region, last_match_id FROM tracked_players") as cursor:
+        players = await cursor.fetchall()
+
+    await conn.execute('''
+        CREATE TABLE tracked_players_new (
+            guild_id TEXT NOT NULL,
+            summoner_name TEXT NOT NULL,
+            normalized_name TEXT NOT NULL,
+            region TEXT,
+            last_match_id TEXT,
+            PRIMARY KEY (guild_id, normalized_name)
+        )
+    ''')
+    # INSERT OR IGNORE drops case-only duplicates the old schema allowed, keeping the first row
+    await conn.executemany('''
+        INSERT OR IGNORE INTO tracked_players_new (guild_id, summoner_name, normalized_name, region, last_match_id)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [
+        (guild_id, summoner_name, _name_key(summoner_name), region, last_match_id)
+        for guild_id, summoner_name, region, last_match_id in players
+        if guild_id is not None and summoner_name
+    ])
+    await conn.execute("DROP TABLE tracked_players")
+    await conn.execute("ALTER TABLE tracked_players_new RENAME TO tracked_players")
+    await conn.execute("CREATE INDEX idx_tracked_players_name ON tracked_players (normalized_name)")
+
+    await conn.execute("ALTER TABLE discord_riot_mapping ADD COLUMN riot_key TEXT")
+    async with conn.execute("SELECT guild_id, discord_id, riot_id FROM discord_riot_mapping") as cursor:
+        mappings = await cursor.fetchall()
+    await conn.executemany(
+        "UPDATE discord_riot_mapping SET riot_key = ? WHERE guild_id = ? AND discord_id = ?",
+        [(_name_key(riot_id), guild_id, discord_id) for guild_id, discord_id, riot_id in mappings]
+    )
+    await conn.execute("CREATE INDEX idx_discord_riot_mapping_riot ON discord_riot_mapping (guild_id, riot_key)")
+
+    await conn.execute("CREATE INDEX idx_puuid_cache_cached_at ON puuid_cache (cached_at)")
+    await conn.execute("CREATE INDEX idx_match_data_cached_at ON match_data (cached_at)")
+    await conn.execute("CREATE INDEX idx_debug_reports_created_at ON debug_reports (created_at)")
+    await conn.execute("CREATE INDEX idx_mastery_refresh_refreshed_at ON mastery_refresh (refreshed_at)")
+
+async def _shared_state(conn):
+    """Tables several bot processes coordinate through: Riot rate limit windows and job leases"""
+    await conn.execute('''
+        CREATE TABLE riot_rate_limits (
+            bucket TEXT PRIMARY KEY,
+            window_start REAL,
+            count INTEGER
+        )
+    ''')
+    await conn.execute('''
+        CREATE TABLE job_leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT,
+            expires_at INTEGER
+        )
+    ''')
+
+async def _alert_outbox(conn):
+    """Alerts waiting for the gateway process to post them"""
+    await conn.execute('''
+        CREATE TABLE alert_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            message TEXT NOT NULL,
+            created_at INTEGER
+        )
+    ''')
+    await conn.execute("CREATE INDEX idx_alert_outbox_guild ON alert_outbox (guild_id, id)")
+    await conn.execute("CREATE INDEX idx_alert_outbox_created_at ON alert_outbox (created_at)")
+
+async def _alert_retries(conn):
+    """Retry bookkeeping for alerts that failed to send"""
+    await conn.execute("ALTER TABLE alert_outbox ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+    await conn.execute("ALTER TABLE alert_outbox ADD COLUMN next_attempt_at INTEGER NOT NULL DEFAULT 0")
+
+async def _rank_snapshots(conn):
+    """Latest known rank per player and ranked queue, written on every league-v4 lookup"""
+    await conn.execute('''
+        CREATE TABLE rank_snapshots (
+            riot_key TEXT NOT NULL,
+            queue_type TEXT NOT NULL,
+            riot_id TEXT,
+            tier TEXT,
+            division TEXT,
+            lp INTEGER,
+            updated_at INTEGER,
+            PRIMARY KEY (riot_key, queue_type)
+        )
+    ''')
+
+async def _rank_ordinals(conn):
+    """Sortable rank ordinal on each snapshot, so leaderboards and rank ranges are answered in SQL"""
+    await conn.execute("ALTER TABLE rank_snapshots ADD COLUMN ordinal INTEGER")
+    async with conn.execute("SELECT riot_key, queue_type, tier, division, lp FROM rank_snapshots") as cursor:
+        snapshots = await cursor.fetchall()
+    await conn.executemany(
+        "UPDATE rank_snapshots SET ordinal = ? WHERE riot_key = ? AND queue_type = ?",
+        [(rank_ordinal(tier, division, lp), riot_key, queue_type) for riot_key, queue_type, tier, division, lp in snapshots]
+    )
+    await conn.execute("CREATE INDEX idx_rank_snapshots_ordinal ON rank_snapshots (queue_type, ordinal)")
+
+async def _tracked_player_puuids(conn):
+    """PUUID stored on tracked_players, so joins by PUUID don't depend on the expiring puuid_cache"""
+    await conn.execute("ALTER TABLE tracked_players ADD COLUMN puuid TEXT")
+    await conn.execute('''
+        UPDATE tracked_players
+        SET puuid = (SELECT p.puuid FROM puuid_cache p WHERE p.riot_id = tracked_players.normalized_name)
+    ''')
+
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "tracked player keys, normalized names and cache indexes", _keys_and_indexes),
+    (3, "shared rate limit and job lease tables", _shared_state),
+    (4, "alert outbox", _alert_outbox),
+    (5, "alert retry attempts", _alert_retries),
+    (6, "rank snapshots", _rank_snapshots),
+    (7, "rank snapshot ordinals", _rank_ordinals),
+    (8, "tracked player PUUIDs", _tracked_player_puuids),
+]
+
+async def get_schema_version(conn):
+    async with conn.execute("PRAGMA user_version") as cursor:
+        return (await cursor.fetchone())[0]
+
+async def apply_migrations(conn):
+    """Bring the database up to the latest schema version, returning the version reached"""
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at INTEGER
+        )
+    ''')
+    await conn.commit()
+
+    version = await get_schema_version(conn)
+    for target, description, migrate in MIGRATIONS:
+        if target <= version:
+            continue
+        await conn.execute("BEGIN")
+        try:
+            await migrate(conn)
+            await conn.execute(
+                "INSERT OR REPLACE INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                (target, description, int(time.time()))
+            )
+            await conn.execute(f"PRAGMA user_version = {int(target)}")
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+        print(f"Applied schema migration {target}: {description}")
+        version = target
+    return version
+
+# Queries on the command and polling hot paths. None of them may fall back to a full table scan.
+HOT_QUERIES = {
+    "get_tracked_players": ("SELECT summoner_name, region FROM tracked_players WHERE guild_id = ?", ("g",)),
+    "find_tracked_player": ("SELECT summoner_name FROM tracked_players WHERE guild_id = ? AND normalized_name = ?", ("g", "n")),
+    "remove_tracked_player": ("DELETE FROM tracked_players WHERE guild_id = ? AND normalized_name = ?", ("g", "n")),
+    "tracked_guilds_for_player": ("SELECT guild_id FROM tracked_players WHERE normalized_name = ?", ("n",)),
+    "get_riot_id_for_discord": ("SELECT riot_id FROM discord_riot_mapping WHERE guild_id = ? AND discord_id = ?", ("g", "d")),
+    "get_discord_id_for_riot": ("SELECT discord_id FROM discord_riot_mapping WHERE guild_id = ? AND riot_key = ?", ("g", "n")),
+    "get_all_mapped_players": ("SELECT discord_id, riot_id FROM discord_riot_mapping WHERE guild_id = ?", ("g",)),
+    "get_strongest_player": ("SELECT summoner_name, tier, division, lp, days_as_strongest, last_update FROM strongest_players WHERE guild_id = ?", ("g",)),
+    "get_puuids_from_db": ("SELECT riot_id, puuid, cached_at FROM puuid_cache WHERE riot_id IN (?, ?)", ("a", "b")),
+    "clear_expired_puuid_cache": ("DELETE FROM puuid_cache WHERE cached_at < ?", (0,)),
+    "get_match_data_local": ("SELECT data, cached_at FROM match_data WHERE match_id = ?", ("m",)),
+    "clear_expired_match_data_cache": ("DELETE FROM match_data WHERE cached_at < ?", (0,)),
+    "get_debug_report": ("SELECT riot_id, data FROM debug_reports WHERE report_id = ?", ("r",)),
+    "clear_expired_debug_reports": ("DELETE FROM debug_reports WHERE created_at < ?", (0,)),
+    "get_first_blood_stats": ("SELECT match_id FROM first_blood_events WHERE puuid = ? AND queue_id = 420 ORDER BY game_timestamp DESC LIMIT ?", ("p", 20)),
+    "get_indexed_first_blood_matches": ("SELECT match_id FROM first_blood_events WHERE puuid = ? AND match_id IN (?, ?)", ("p", "a", "b")),
+    "get_all_masteries": ("SELECT champion_id, champion_level, champion_points, last_play_time FROM champion_mastery WHERE puuid = ? ORDER BY champion_points DESC", ("p",)),
+    "fresh_masteries": ("SELECT puuid FROM mastery_refresh WHERE refreshed_at >= ?", (0,)),
+    "get_mastery_leaderboard": ('''
+        SELECT t.summoner_name, m.champion_level, m.champion_points
+        FROM tracked_players t
+        JOIN champion_mastery m ON m.puuid = t.puuid AND m.champion_id = ?
+        WHERE t.guild_id = ?
+        ORDER BY m.champion_points DESC
+    ''', (1, "g")),
+    "take_rate_limit_slot": ("SELECT bucket, window_start, count FROM riot_rate_limits WHERE bucket IN (?, ?)", ("blocked", "app:1")),
+    "acquire_lease": ("SELECT owner FROM job_leases WHERE name = ?", ("l",)),
+    "get_pending_alerts": ("SELECT id, kind, message FROM alert_outbox WHERE guild_id = ? AND next_attempt_at <= ? ORDER BY id", ("g", 0)),
+    "clear_stale_alerts": ("DELETE FROM alert_outbox WHERE created_at < ?", (0,)),
+    "recompute_strongest": ('''
+        SELECT t.summoner_name, r.tier, r.division, r.lp
+        FROM tracked_players t
+        JOIN rank_snapshots r ON r.riot_key = t.normalized_name AND r.queue_type = ?
+        WHERE t.guild_id = ? AND r.ordinal IS NOT NULL
+        ORDER BY r.ordinal DESC LIMIT 1
+    ''', ("RANKED_SOLO_5x5", "g")),
+    "get_ranked_leaderboard": ('''
+        SELECT t.summoner_name, t.region, r.tier, r.division, r.lp, r.updated_at
+        FROM tracked_players t
+        LEFT JOIN rank_snapshots r ON r.riot_key = t.normalized_name AND r.queue_type = ?
+        WHERE t.guild_id = ?
+        ORDER BY r.ordinal IS NULL, r.ordinal DESC, t.summoner_name
+    ''', ("RANKED_SOLO_5x5", "g")),
+    "get_rank_snapshot": ("SELECT tier, division, lp, ordinal, updated_at FROM rank_snapshots WHERE riot_key = ? AND queue_type = ?", ("n", "RANKED_SOLO_5x5")),
+    "update_tracked_puuid": ("UPDATE tracked_players SET puuid = ? WHERE normalized_name = ?", ("p", "n")),
+    "get_mapped_players_in_rank_range": ('''
+        SELECT m.discord_id, m.riot_id
+        FROM discord_riot_mapping m
+        JOIN rank_snapshots r ON r.riot_key = m.riot_key AND r.queue_type = ?
+        WHERE m.guild_id = ? AND r.ordinal BETWEEN ? AND ?
+    ''', ("RANKED_SOLO_5x5", "g", 0, 1)),
+}
+
+def find_table_scans(plan_rows):
+    """Plan lines that read a whole table rather than searching a key or index"""
+    scans = []
+    for row in plan_rows:
+        detail = row[-1]
+        if detail.startswith("SCAN") and "INDEX" not in detail:
+            scans.append(detail)
+    return scans
+
+async def check_query_plans(conn, queries=None):
+    """EXPLAIN QUERY PLAN every hot query, returning {name: [table scans]} for the ones that scan"""
+    failures = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        async with conn.execute(f"EXPLAIN QUERY PLAN {sql}", params) as cursor:
+            scans = find_table_scans(await cursor.fetchall())
+        if scans:
+            failures[name] = scans
+    return failures
+
+async def _check_plans_main():
+    async with aiosqlite.connect(":memory:") as conn:
+        version = await apply_migrations(conn)
+        failures = await check_query_plans(conn)
+    print(f"Checked {len(HOT_QUERIES)} hot queries against schema version {version}")
+    for name, scans in failures.items():
+        print(f"FAIL {name}: {'; '.join(scans)}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    # python migrations.py --check-plans
+    if "--check-plans" in sys.argv:
+        sys.exit(asyncio.run(_check_plans_main()))
+    print("Usage: python migrations.py --check-plans")
@@ -0,0 +1,91 @@
+import time
+import aiosqlite
+from metrics import registry
+
+# Alerts found by a sweep are stored here until the gateway process posts them, so the sweep can
+# run in a separate poller process and nothing is lost if the bot is down when it finishes.
+
+ALERT_MAX_AGE = 86400  # undelivered alerts older than a day are dropped by the cache cleanup
+MAX_ALERT_ATTEMPTS = 5  # failed sends are retried with backoff this many times before the alert is dropped
+RETRY_BACKOFF = 30      # seconds before the first retry, doubling after each failure
+DISCORD_MESSAGE_LIMIT = 2000
+
+alerts_total = registry.counter("alerts_total", "Streak and strongest-player alerts by kind and outcome", ("kind", "status"))
+
+async def enqueue_alerts(guild_id, alerts):
+    """Store (kind, message) pairs for a guild; strongest-player alerts carry a JSON payload as the message"""
+    if not alerts:
+        return
+    now = int(time.time())
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        await conn.executemany(
+            "INSERT INTO alert_outbox (guild_id, kind, message, created_at) VALUES (?, ?, ?, ?)",
+            [(guild_id, kind, message, now) for kind, message in alerts]
+        )
+        await conn.commit()
+    for kind, _ in alerts:
+        alerts_total.inc(kind=kind, status="queued")
+
+async def get_alert_guild_ids():
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute("SELECT DISTINCT guild_id FROM alert_outbox") as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+async def get_pending_alerts(guild_id):
+    """Alerts for a guild that are due to be sent, oldest first, skipping ones waiting out a retry backoff"""
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute(
+            "SELECT id, kind, message FROM alert_outbox WHERE guild_id = ? AND next_attempt_at <= ? ORDER BY id",
+            (guild_id, int(time.time()))
+        ) as cursor:
+            return await cursor.fetchall()
+
+async def record_failed_alerts(alert_ids):
+    """Push failed alerts back with exponential backoff, dropping any that have used up their attempts"""
+    if not alert_ids:
+        return
+    now = int(time.time())
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        await conn.executemany(
+            "UPDATE alert_outbox SET attempts = attempts + 1, next_attempt_at = ? + (? << attempts) WHERE id = ?",
+            [(now, RETRY_BACKOFF, alert_id) for alert_id in alert_ids]
+        )
+        cursor = await conn.execute(
+            f"DELETE FROM alert_outbox WHERE attempts >= ? AND id IN ({', '.join('?' * len(alert_ids))})",
+            (MAX_ALERT_ATTEMPTS, *alert_ids)
+        )
+        dropped = cursor.rowcount
+        await conn.commit()
+    if dropped:
+        print(f"Dropped {dropped} alerts after {MAX_ALERT_ATTEMPTS} failed attempts")
+
+def coalesce_alerts(alerts, limit=DISCORD_MESSAGE_LIMIT):
+    """Join (alert_id, message) pairs into as few (alert_ids, content) messages as fit Discord's length limit"""
+    batches = []
+    alert_ids, lines, length = [], [], 0
+    for alert_id, message in alerts:
+        if lines and length + 1 + len(message) > limit:
+            batches.append((alert_ids, "\n".join(lines)))
+            alert_ids, lines, length = [], [], 0
+        length += len(message) + (1 if lines else 0)
+        alert_ids.append(alert_id)
+        lines.append(message)
+    if lines:
+        batches.append((alert_ids, "\n".join(lines)))
+    return batches
+
+async def delete_alerts(alert_ids):
+    if not alert_ids:
+        return
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        await conn.executemany("DELETE FROM alert_outbox WHERE id = ?", [(alert_id,) for alert_id in alert_ids])
+        await conn.commit()
+
+async def clear_stale_alerts():
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        cursor = await conn.execute("DELETE FROM alert_outbox WHERE created_at < ?", (int(time.time()) - ALERT_MAX_AGE,))
+        deleted = cursor.rowcount
+        await conn.commit()
+    if deleted:
+        print(f"Dropped {deleted} undelivered alerts older than a day")
+    return deleted
@@ -0,0 +1,98 @@
+"""Standalone poller: runs the streak sweep, the rank refresh that drives strongest-player
+announcements, and the cache upkeep jobs without a Discord connection.
+
+    python poller.py
+    EXTERNAL_POLLER=1 python LeagueBot.py
+
+Alerts are written to the alert_outbox table and the bot, started with EXTERNAL_POLLER set,
+only delivers them, so either process can be restarted or scaled on its own. Sweeps hold
+leases, so a second poller started as a standby stays idle until the first one stops.
+"""
+import asyncio
+import os
+from dotenv import load_dotenv
+from discord.ext import tasks
+from db import init_db, get_tracked_guild_ids
+from riot_api import cleanup
+from champions import champion_catalog
+from settings_cache import guild_settings
+from write_behind import write_queue
+from loop_watchdog import watchdog
+from coordination import leased, release_leases
+from metrics import timed, poll_sweep_seconds, start_metrics_server
+from outbox import enqueue_alerts
+from polling import sweep_streaks, refresh_stale_ranks, clean_caches, refresh_masteries, run_startup_maintenance
+
+load_dotenv()
+METRICS_PORT = os.getenv("POLLER_METRICS_PORT")  # the bot may already use METRICS_PORT on this host
+SETTINGS_RELOAD_SECONDS = 60  # how quickly /tiltcheck, /wincheck and /setchannel changes reach the poller
+
+@tasks.loop(minutes=40)
+@leased("streak_sweep", ttl=50 * 60)
+@timed(poll_sweep_seconds, loop="check_streaks")
+async def check_streaks():
+    await sweep_streaks(await get_tracked_guild_ids(), enqueue_alerts)
+
+@tasks.loop(minutes=30)
+@leased("rank_refresh", ttl=40 * 60)
+@timed(poll_sweep_seconds, loop="refresh_ranks")
+async def refresh_ranks():
+    await refresh_stale_ranks()
+
+@tasks.loop(hours=168)
+@leased("clean_puuid_cache", ttl=169 * 3600)
+async def clean_puuid_cache():
+    await clean_caches()
+
+@tasks.loop(hours=6)
+@leased("refresh_mastery_cache", ttl=7 * 3600)
+@timed(poll_sweep_seconds, loop="refresh_mastery_cache")
+async def refresh_mastery_cache():
+    await refresh_masteries()
+
+@tasks.loop(hours=3)
+async def refresh_champion_catalog():
+    try:
+        await champion_catalog.refresh()
+    except Exception as e:
+        print(f"Error refreshing champion catalog: {e}")
+
+@tasks.loop(seconds=SETTINGS_RELOAD_SECONDS)
+async def reload_settings():
+    try:
+        await guild_settings.reload_settings()
+    except Exception as e:
+        print(f"Error reloading guild settings: {e}")
+
+LOOPS = [reload_settings, refresh_champion_catalog, check_streaks, refresh_ranks, clean_puuid_cache, refresh_mastery_cache]
+
+async def main():
+    await init_db()
+    await guild_settings.load()
+    write_queue.start()
+    watchdog.start()
+    metrics_runner = await start_metrics_server(port=int(METRICS_PORT)) if METRICS_PORT else None
+    prefetch_task = await run_startup_maintenance()
+    for loop in LOOPS:
+        loop.start()
+    print("Poller running")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        print("Poller is shutting down...")
+        for loop in LOOPS:
+            loop.cancel()
+        if prefetch_task:
+            prefetch_task.cancel()
+        watchdog.stop()
+        await write_queue.close()
+        await release_leases()
+        await cleanup()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
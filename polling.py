@@ -0,0 +1,331 @@
+import asyncio
+import time
+from datetime import datetime
+import aiosqlite
+from db import get_tracked_players, clear_expired_debug_reports
+from riot_api import (get_match_history, get_summoner_rank, get_queue_rank, prefetch_puuids, refresh_tracked_masteries,
+                      clear_corrupted_puuid_cache, clear_expired_puuid_cache, clear_expired_match_data_cache,
+                      clear_corrupted_match_data_cache, LEAGUE_ENTRIES_TTL)
+from settings_cache import guild_settings
+from write_behind import write_queue
+from outbox import clear_stale_alerts
+from metrics import poll_sweep_seconds
+from coordination import acquire_lease, release_lease
+from rank_tracker import rank_tracker, get_leader, get_rank_snapshot
+
+# The polling side of the bot: streak detection, the strongest-player check and cache upkeep.
+# Nothing here talks to Discord; alerts go into the outbox, so the same code runs inside the
+# bot process or in the standalone poller (poller.py).
+
+DEFAULT_REGION = "na1"
+STREAK_CONCURRENCY = 8  # players checked at once in a streak sweep, across all guilds
+RANK_REFRESH_AGE = 6 * 3600  # rank snapshots older than this are refreshed in the background
+LINKED_RANK_REFRESH_AGE = 3600  # tighter for players linked to a Discord account, whose ranks /lfg matches on
+STARTUP_MAINTENANCE_TTL = 15 * 60  # lease cover for a holder that dies mid-maintenance
+
+def tilt_message(summoner_name, streak):
+    if streak == 3:
+        return f"😟 **{summoner_name}** is on a **3-game losing streak**. Might want to take a break."
+    elif streak == 4:
+        return f"😨 **{summoner_name}** is on a **4-game losing streak**. Seriously, take a break!"
+    elif streak == 5:
+        return f"😱 **{summoner_name}** is on a **5-game losing streak**. Please stop playing for today!"
+    elif streak == 7:
+        return f"🥶 **{summoner_name}** is on a **7-game losing streak**. I am begging you! Please stop playing!"
+    return f"💀 **{summoner_name}** is on a **{streak}-game losing streak**. Somebody call Riot!"
+
+def win_message(summoner_name, streak):
+    if streak == 3:
+        return f"🔥 **{summoner_name}** is on a **3-game winning streak**! Keep it up!"
+    elif streak == 4:
+        return f"🔥 **{summoner_name}** is on a **4-game winning streak**! You're on fire!"
+    return f"🔥 **{summoner_name}** is on a **{streak}-game winning streak**! Absolutely dominating!"
+
+def streak_length(matches, won):
+    """Number of most recent matches in a row with the given result"""
+    streak = 0
+    for match in matches:
+        if match["win"] != won:
+            break
+        streak += 1
+    return streak
+
+async def check_player_streaks(guild_id, summoner_name, region, tilt_enabled, win_enabled):
+    """Tilt and win streak alerts due for one tracked player, as (kind, message) pairs.
+
+    Cooldowns are recorded as alerts are found, so the same streak is never reported twice.
+    """
+    alerts = []
+    try:
+        all_matches = await get_match_history(region, summoner_name, 20)
+        
+        # Filter out remakes (less than 4 minutes)
+        matches = [m for m in all_matches if m.get("gameDuration", 0) >= 240]
+
+        if not matches:
+            return alerts
+        
+        last_tilt_match_id, last_tilt_time, last_tilt_streak = guild_settings.get_tiltcheck_cooldown(guild_id, summoner_name)
+        last_win_match_id, last_win_time, last_win_streak = guild_settings.get_winstreak_cooldown(guild_id, summoner_name)
+
+        if tilt_enabled and (not last_tilt_match_id or matches[0]["matchId"] != last_tilt_match_id):
+            streak = streak_length(matches, won=False)
+            # Alert if streak is 3+ and we haven't already reported this exact streak
+            if streak >= 3 and streak != last_tilt_streak:
+                alerts.append(("tilt", tilt_message(summoner_name, streak)))
+                await guild_settings.update_tiltcheck_cooldown(guild_id, summoner_name, matches[0]["matchId"], streak)
+        
+        if win_enabled and (not last_win_match_id or matches[0]["matchId"] != last_win_match_id):
+            streak = streak_length(matches, won=True)
+            if streak >= 3 and streak != last_win_streak:
+                alerts.append(("win", win_message(summoner_name, streak)))
+                await guild_settings.update_winstreak_cooldown(guild_id, summoner_name, matches[0]["matchId"], streak)
+        
+    except Exception as e:
+        print(f"Error checking streaks for {summoner_name}: {e}")
+    return alerts
+
+async def sweep_streaks(guild_ids, on_guild_done, concurrency=STREAK_CONCURRENCY):
+    """Check every tracked player in guild_ids for streaks, with at most `concurrency` players in flight.
+
+    Players from all guilds share one worker pool, so a slow guild no longer holds up the
+    others. Pacing comes from the pool size and the Riot rate limiter rather than fixed sleeps.
+    When a guild's last player is done, on_guild_done(guild_id, alerts) runs in its own task.
+    Returns each guild's wall time in seconds.
+
+    Cooldowns are re-read first, since a standby process taking over the sweep lease has
+    not seen what the previous holder alerted on, and each guild's cooldown writes are
+    committed before its alerts are handed on, so a crash cannot leave a sent alert unrecorded.
+    """
+    await write_queue.flush()
+    await guild_settings.reload_cooldowns()
+    queue = asyncio.Queue(maxsize=concurrency * 2)  # bounded, so guilds are read from the DB only as workers free up
+    pending = {}  # guild_id -> [players left, started, alerts]
+    timings = {}
+    deliveries = []
+
+    async def finish_guild(guild_id, alerts):
+        await write_queue.flush()
+        await on_guild_done(guild_id, alerts)
+
+    async def produce():
+        for guild_id in guild_ids:
+            tilt_enabled = guild_settings.is_tiltcheck_enabled(guild_id)
+            win_enabled = guild_settings.is_wincheck_enabled(guild_id)
+            if not tilt_enabled and not win_enabled:
+                continue
+            players = await get_tracked_players(guild_id)
+            if not players:
+                continue
+            pending[guild_id] = [len(players), time.perf_counter(), []]
+            for summoner_name, region in players:
+                await queue.put((guild_id, summoner_name, region, tilt_enabled, win_enabled))
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def work():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            guild_id = item[0]
+            alerts = await check_player_streaks(*item)
+            state = pending[guild_id]
+            state[0] -= 1
+            state[2].extend(alerts)
+            if state[0] == 0:
+                del pending[guild_id]
+                timings[guild_id] = time.perf_counter() - state[1]
+                poll_sweep_seconds.observe(timings[guild_id], loop="check_streaks_guild")
+                deliveries.append(asyncio.create_task(finish_guild(guild_id, state[2])))
+
+    await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+    for result in await asyncio.gather(*deliveries, return_exceptions=True):
+        if isinstance(result, Exception):
+            print(f"Error delivering streak alerts: {result}")
+
+    if timings:
+        slowest = sorted(timings.items(), key=lambda item: -item[1])[:3]
+        print(f"Streak sweep: {len(timings)} guilds; slowest " + ", ".join(f"{guild_id} {seconds:.1f}s" for guild_id, seconds in slowest))
+    return timings
+
+async def get_strongest_player(guild_id):
+    """The guild's strongest player as kept by rank_tracker, with the days counter brought up to date"""
+    leader = await get_leader(guild_id)
+    if not leader:
+        # Nothing recorded for this guild yet: look its players up once, which fills the snapshots
+        players = await get_tracked_players(guild_id)
+        if not players:
+            return None
+        async with rank_tracker.batch():
+            await asyncio.gather(*(get_summoner_rank(region, name) for name, region in players), return_exceptions=True)
+        leader = await get_leader(guild_id)
+        if not leader and await rank_tracker.recompute(guild_id):
+            leader = await get_leader(guild_id)
+        if not leader:
+            return None
+
+    summoner_name, tier, division, lp, days_as_strongest, last_update = leader
+    # Count whole days since the counter last moved
+    elapsed_days = (datetime.utcnow() - datetime.fromisoformat(last_update.replace('Z', '+00:00'))).days
+    if elapsed_days >= 1:
+        days_as_strongest += elapsed_days
+        async with aiosqlite.connect("riot_bot.db") as conn:
+            await conn.execute(
+                "UPDATE strongest_players SET days_as_strongest = ?, last_update = datetime(last_update, ?) WHERE guild_id = ?",
+                (days_as_strongest, f"+{elapsed_days} days", guild_id)
+            )
+            await conn.commit()
+
+    return {
+        'name': summoner_name,
+        'tier': tier,
+        'division': division,
+        'lp': lp,
+        'days_as_strongest': days_as_strongest,
+        'is_new_strongest': False
+    }
+
+async def refresh_stale_ranks(concurrency=STREAK_CONCURRENCY):
+    """Look up every tracked player whose rank snapshot is older than RANK_REFRESH_AGE,
+    or LINKED_RANK_REFRESH_AGE for players linked to a Discord account.
+
+    Each lookup goes through rank_tracker, so guild leaders follow along and announcements
+    fire as ranks change, without sweeping every guild. Players tracked in several guilds
+    are fetched once.
+    """
+    await write_queue.flush()  # snapshots written by earlier lookups may still be queued
+    now = int(time.time())
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute('''
+            SELECT t.summoner_name, MIN(t.region)
+            FROM tracked_players t
+            LEFT JOIN rank_snapshots r ON r.riot_key = t.normalized_name AND r.queue_type = 'RANKED_SOLO_5x5'
+            WHERE r.updated_at IS NULL OR r.updated_at < CASE
+                WHEN EXISTS (SELECT 1 FROM discord_riot_mapping m WHERE m.guild_id = t.guild_id AND m.riot_key = t.normalized_name)
+                THEN ? ELSE ? END
+            GROUP BY t.normalized_name
+        ''', (now - LINKED_RANK_REFRESH_AGE, now - RANK_REFRESH_AGE)) as cursor:
+            stale = await cursor.fetchall()
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def refresh(summoner_name, region):
+        async with semaphore:
+            return await get_summoner_rank(region, summoner_name)
+
+    async with rank_tracker.batch():
+        results = await asyncio.gather(*(refresh(name, region) for name, region in stale), return_exceptions=True)
+    failures = sum(1 for result in results if isinstance(result, Exception))
+    if stale:
+        print(f"Refreshed ranks for {len(stale) - failures}/{len(stale)} players")
+    return len(stale) - failures
+
+async def query_ranked_leaderboard(guild_id):
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute('''
+            SELECT t.summoner_name, t.region, r.tier, r.division, r.lp, r.updated_at
+            FROM tracked_players t
+            LEFT JOIN rank_snapshots r ON r.riot_key = t.normalized_name AND r.queue_type = 'RANKED_SOLO_5x5'
+            WHERE t.guild_id = ?
+            ORDER BY r.ordinal IS NULL, r.ordinal DESC, t.summoner_name
+        ''', (guild_id,)) as cursor:
+            return await cursor.fetchall()
+
+async def get_ranked_leaderboard(guild_id, max_age=LEAGUE_ENTRIES_TTL, concurrency=STREAK_CONCURRENCY):
+    """A guild's tracked players as (name, tier, division, lp), best solo queue rank first, unranked last.
+
+    Snapshots older than max_age are looked up again first, concurrently, and the order comes
+    from the snapshot ordinals in SQL.
+    """
+    await write_queue.flush()
+    rows = await query_ranked_leaderboard(guild_id)
+    cutoff = int(time.time()) - max_age
+    stale = [(name, region) for name, region, _, _, _, updated_at in rows if updated_at is None or updated_at < cutoff]
+    if stale:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def refresh(summoner_name, region):
+            async with semaphore:
+                return await get_summoner_rank(region, summoner_name)
+
+        async with rank_tracker.batch():
+            await asyncio.gather(*(refresh(name, region) for name, region in stale), return_exceptions=True)
+        await write_queue.flush()
+        rows = await query_ranked_leaderboard(guild_id)
+    return [(name, tier, division, lp) for name, _, tier, division, lp, _ in rows]
+
+async def get_snapshot_ordinal(riot_id, queue_type, max_age=LINKED_RANK_REFRESH_AGE):
+    """Rank ordinal for a player's queue from their snapshot, looked up first if the snapshot is
+    missing or older than max_age. None when unranked."""
+    snapshot = await get_rank_snapshot(riot_id, queue_type)
+    if snapshot is None or snapshot[4] < int(time.time()) - max_age:
+        await get_queue_rank(DEFAULT_REGION, riot_id, queue_type)
+        await write_queue.flush()
+        snapshot = await get_rank_snapshot(riot_id, queue_type) or snapshot
+    return snapshot[3] if snapshot else None
+
+async def clean_caches():
+    """Clean PUUID cache every 7 days"""
+    print("Running scheduled PUUID cache cleanup...")
+    # Clear corrupted entries
+    corrupted_count = await clear_corrupted_puuid_cache()
+    # Clear expired entries
+    expired_count = await clear_expired_puuid_cache()
+    # Clear expired match data cache entries
+    await clear_expired_match_data_cache()
+    # Clear corrupted match data cache entries
+    corrupted_match_data = await clear_corrupted_match_data_cache()
+    if corrupted_match_data > 0:
+        print(f"Cleared {corrupted_match_data} corrupted match_data entries during scheduled cleanup")
+    # Clear expired feeder score breakdowns
+    await clear_expired_debug_reports()
+    await clear_stale_alerts()
+    print(f"Cache cleanup complete: {corrupted_count} corrupted, {expired_count} expired entries cleared")
+
+async def refresh_masteries(region=DEFAULT_REGION):
+    """Refresh champion mastery for tracked players in the background"""
+    try:
+        refreshed = await refresh_tracked_masteries(region)
+        if refreshed:
+            print(f"Refreshed champion mastery for {refreshed} players")
+    except Exception as e:
+        print(f"Error refreshing mastery cache: {e}")
+
+async def run_startup_maintenance():
+    """Clear broken and expired cache entries, then start resolving PUUIDs in a background task, which is returned.
+
+    Processes started together share the caches, so only the holder of the startup_maintenance
+    lease does this and the rest get None. The lease is released once the prefetch ends, so a
+    process restarted after a crash (a new owner ID) runs maintenance again straight away.
+    """
+    if not await acquire_lease("startup_maintenance", ttl=STARTUP_MAINTENANCE_TTL):
+        return None
+    try:
+        await clear_startup_caches()
+    except Exception:
+        await release_lease("startup_maintenance")
+        raise
+
+    async def prefetch():
+        try:
+            await prefetch_puuids()
+        finally:
+            await release_lease("startup_maintenance")
+
+    # Resolve PUUIDs in the background so startup doesn't wait on the Riot API
+    print("Pre-fetching PUUIDs in the background...")
+    return asyncio.create_task(prefetch())
+
+async def clear_startup_caches():
+    # Check for corrupted PUUID cache on startup
+    print("Checking for corrupted PUUID cache entries...")
+    corrupted_count = await clear_corrupted_puuid_cache()
+    if corrupted_count > 0:
+        print(f"Cleared {corrupted_count} corrupted PUUID entries on startup")
+    # Clear corrupted match data cache entries on startup
+    corrupted_match_data = await clear_corrupted_match_data_cache()
+    if corrupted_match_data > 0:
+        print(f"Cleared {corrupted_match_data} corrupted match_data entries on startup")
+    # Clear expired match data cache entries on startup
+    await clear_expired_match_data_cache()
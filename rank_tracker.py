@@ -0,0 +1,166 @@
+import contextlib
+import json
+import time
+import aiosqlite
+from riot_ids import riot_id_key
+from db import get_tracked_guilds_for_player
+from write_behind import write_queue
+from outbox import enqueue_alerts
+from ranks import rank_ordinal
+
+RANKED_QUEUES = ("RANKED_SOLO_5x5", "RANKED_FLEX_SR")
+STRONGEST_QUEUE = "RANKED_SOLO_5x5"
+
+class RankTracker:
+    """Keeps rank_snapshots and each guild's strongest player up to date from rank lookups.
+
+    Every fresh league-v4 response is recorded as a snapshot, and the solo queue rank is
+    checked against the stored leader of each guild the player is tracked in. When a player
+    overtakes the leader, or the leader's own rank changes, the guild is recomputed from the
+    snapshots without any Riot API calls. Leader changes queue a strongest-player
+    announcement in the outbox. The strongest_players row is the per-guild maximum, so
+    every process sees the same leader.
+    """
+
+    def __init__(self):
+        self._batch_depth = 0
+        self._announce = {}  # guild_id -> riot key of the leader before the batch started
+
+    @contextlib.asynccontextmanager
+    async def batch(self):
+        """Hold announcements until the block ends, then announce each guild's final leader once.
+
+        A bulk refresh can pass the lead around several times on the way to the final order;
+        only the outcome is worth a message.
+        """
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                pending, self._announce = self._announce, {}
+                for guild_id, previous_key in pending.items():
+                    leader = await get_leader(guild_id)
+                    if leader and riot_id_key(leader[0]) != previous_key:
+                        await announce_leader(guild_id, *leader[:4])
+
+    async def record_entries(self, riot_id, entries):
+        player_key = riot_id_key(riot_id)
+        if not player_key:
+            return
+        by_queue = {entry["queueType"]: entry for entry in entries}
+        now = int(time.time())
+        for queue in RANKED_QUEUES:
+            entry = by_queue.get(queue)
+            # Unranked queues are stored too, so their snapshot still counts as fresh
+            tier, division, lp = (entry["tier"], entry["rank"], entry["leaguePoints"]) if entry else (None, None, None)
+            write_queue.enqueue(
+                '''INSERT OR REPLACE INTO rank_snapshots (riot_key, queue_type, riot_id, tier, division, lp, ordinal, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                (player_key, queue, riot_id, tier, division, lp, rank_ordinal(tier, division, lp), now)
+            )
+        solo = by_queue.get(STRONGEST_QUEUE, {})
+        await self.update_leaders(riot_id, player_key, solo.get("tier"), solo.get("rank"), solo.get("leaguePoints"))
+
+    async def update_leaders(self, riot_id, player_key, tier, division, lp):
+        # A cheap check against the stored leader decides whether the guild needs a recompute;
+        # the recompute itself does the compare-and-set under a write lock.
+        new_key = rank_ordinal(tier, division, lp)
+        for guild_id in await get_tracked_guilds_for_player(player_key):
+            leader = await get_leader(guild_id)
+            leader_key = rank_ordinal(*leader[1:4]) if leader else None
+            if leader and riot_id_key(leader[0]) == player_key:
+                if new_key != leader_key:
+                    await self.recompute(guild_id)
+            elif new_key is not None and (leader_key is None or new_key > leader_key):
+                await self.recompute(guild_id)
+
+    async def recompute(self, guild_id):
+        """Pick the guild's leader again from the stored snapshots.
+
+        The snapshot maximum is read and strongest_players written inside one BEGIN IMMEDIATE
+        transaction, so recomputes from every process serialize and the stored leader is always
+        the best snapshot committed so far, whichever order they finish in.
+        """
+        await write_queue.flush()
+        async with aiosqlite.connect("riot_bot.db", isolation_level=None) as conn:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                async with conn.execute('''
+                    SELECT t.summoner_name, r.tier, r.division, r.lp
+                    FROM tracked_players t
+                    JOIN rank_snapshots r ON r.riot_key = t.normalized_name AND r.queue_type = ?
+                    WHERE t.guild_id = ? AND r.ordinal IS NOT NULL
+                    ORDER BY r.ordinal DESC LIMIT 1
+                ''', (STRONGEST_QUEUE, guild_id)) as cursor:
+                    best = await cursor.fetchone()
+                async with conn.execute("SELECT summoner_name FROM strongest_players WHERE guild_id = ?", (guild_id,)) as cursor:
+                    leader = await cursor.fetchone()
+
+                crowned = best is not None and not (leader and riot_id_key(leader[0]) == riot_id_key(best[0]))
+                if best is None:
+                    await conn.execute("DELETE FROM strongest_players WHERE guild_id = ?", (guild_id,))
+                elif crowned:
+                    await conn.execute('''
+                        INSERT OR REPLACE INTO strongest_players
+                          (guild_id, summoner_name, tier, division, lp, last_update, days_as_strongest)
+                        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, 1)
+                    ''', (guild_id, *best))
+                else:
+                    # Same leader, new rank; the days counter carries on
+                    await conn.execute(
+                        "UPDATE strongest_players SET tier = ?, division = ?, lp = ? WHERE guild_id = ?",
+                        (*best[1:4], guild_id)
+                    )
+                await conn.execute("COMMIT")
+            except Exception:
+                await conn.execute("ROLLBACK")
+                raise
+
+        if crowned:
+            if self._batch_depth:
+                self._announce.setdefault(guild_id, riot_id_key(leader[0]) if leader else None)
+            else:
+                await announce_leader(guild_id, *best)
+        return best
+
+    async def player_removed(self, guild_id, riot_id):
+        leader = await get_leader(guild_id)
+        if leader and riot_id_key(leader[0]) == riot_id_key(riot_id):
+            await self.recompute(guild_id)
+
+async def get_rank_snapshot(riot_id, queue_type):
+    """(tier, division, lp, ordinal, updated_at) from the player's latest snapshot, or None"""
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute(
+            "SELECT tier, division, lp, ordinal, updated_at FROM rank_snapshots WHERE riot_key = ? AND queue_type = ?",
+            (riot_id_key(riot_id), queue_type)
+        ) as cursor:
+            return await cursor.fetchone()
+
+async def get_leader(guild_id):
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute(
+            "SELECT summoner_name, tier, division, lp, days_as_strongest, last_update FROM strongest_players WHERE guild_id = ?",
+            (guild_id,)
+        ) as cursor:
+            return await cursor.fetchone()
+
+async def announce_leader(guild_id, riot_id, tier, division, lp):
+    strongest_player = {
+        'name': riot_id,
+        'tier': tier,
+        'division': division,
+        'lp': lp,
+        'days_as_strongest': 1,
+        'is_new_strongest': True
+    }
+    await enqueue_alerts(guild_id, [("strongest", json.dumps(strongest_player))])
+
+async def clear_leader(guild_id):
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        await conn.execute("DELETE FROM strongest_players WHERE guild_id = ?", (guild_id,))
+        await conn.commit()
+
+rank_tracker = RankTracker()
@@ -0,0 +1,76 @@
+TIERS = ["IRON", "BRONZE", "SILVER", "GOLD", "PLATINUM", "EMERALD", "DIAMOND", "MASTER", "GRANDMASTER", "CHALLENGER"]
+DIVISIONS = ["IV", "III", "II", "I"]
+APEX_TIERS = {"MASTER", "GRANDMASTER", "CHALLENGER"}
+
+# Every division gets DIVISION_SPAN ordinals for its LP. Apex tiers have no divisions and
+# LP well into the thousands, so they sit in the top division slot with room to spare.
+DIVISION_SPAN = 10000
+
+def rank_ordinal(tier, division, lp):
+    """One integer that sorts ranks correctly: (tier, division, LP) -> ordinal, or None when unranked"""
+    if tier not in TIERS:
+        return None
+    if tier in APEX_TIERS:
+        division_index = len(DIVISIONS) - 1
+    else:
+        division_index = DIVISIONS.index(division) if division in DIVISIONS else 0
+    lp = min(max(lp or 0, 0), DIVISION_SPAN - 1)
+    return (TIERS.index(tier) * len(DIVISIONS) + division_index) * DIVISION_SPAN + lp
+
+def tier_of(ordinal):
+    """Tier index of an ordinal, i.e. TIERS.index(tier)"""
+    return ordinal // (len(DIVISIONS) * DIVISION_SPAN)
+
+def division_of(ordinal):
+    """Division step of an ordinal, counting every division from Iron IV upwards"""
+    return ordinal // DIVISION_SPAN
+
+def tier_range(low_tier, high_tier):
+    """Lowest and highest ordinal from the bottom of low_tier to the top of high_tier, by tier index"""
+    low_tier = max(low_tier, 0)
+    high_tier = min(high_tier, len(TIERS) - 1)
+    per_tier = len(DIVISIONS) * DIVISION_SPAN
+    return low_tier * per_tier, (high_tier + 1) * per_tier - 1
+
+def division_range(low_division, high_division):
+    """Lowest and highest ordinal across division steps low_division..high_division"""
+    low_division = max(low_division, 0)
+    high_division = min(high_division, len(TIERS) * len(DIVISIONS) - 1)
+    return low_division * DIVISION_SPAN, (high_division + 1) * DIVISION_SPAN - 1
+
+def duo_partner_range(queue_type, ordinal):
+    """(lowest, highest) ordinal a player at ordinal may queue with, or None when they cannot duo.
+
+    Riot's duo restrictions, written as a single ordinal interval per rank:
+    Solo/Duo - Grandmaster and Challenger cannot duo, Master only with Master or Diamond I,
+    Diamond with Diamond within two divisions, Iron up to two tiers above, Bronze to Emerald
+    within one tier. Flex - Master and above only with Platinum and above.
+    """
+    tier = tier_of(ordinal)
+    iron, silver, platinum, emerald, diamond, master, grandmaster = (
+        TIERS.index(name) for name in ("IRON", "SILVER", "PLATINUM", "EMERALD", "DIAMOND", "MASTER", "GRANDMASTER")
+    )
+    if queue_type == "RANKED_FLEX_SR":
+        if tier >= master:
+            return tier_range(platinum, len(TIERS) - 1)
+        if tier >= platinum:
+            return tier_range(iron, len(TIERS) - 1)
+        return tier_range(iron, diamond)
+
+    if tier >= grandmaster:
+        return None
+    diamond_four = division_of(rank_ordinal("DIAMOND", "IV", 0))
+    diamond_one = division_of(rank_ordinal("DIAMOND", "I", 0))
+    master_top = division_of(tier_range(master, master)[1])
+    division = division_of(ordinal)
+    if tier == master:
+        return division_range(diamond_one, master_top)
+    if tier == diamond:
+        if division == diamond_one:
+            return division_range(division - 2, master_top)
+        return division_range(max(division - 2, diamond_four), min(division + 2, diamond_one))
+    if tier == iron:
+        return tier_range(iron, iron + 2)
+    # Silver and below can still pair with Iron, which may duo up to two tiers above itself
+    low = iron if tier <= silver else tier - 1
+    return tier_range(low, min(tier + 1, emerald))
@@ -4,34 +4,54 @@ import asyncio
 from dotenv import load_dotenv
 from functools import lru_cache
 import json
+import re
 import aiosqlite
 import time
 from collections import defaultdict
+from champions import champion_catalog
+from riot_ids import split_riot_id, riot_id_key
+from urllib.parse import quote
+from write_behind import write_queue
+from coordination import riot_limiter
+from rank_tracker import rank_tracker
+from tracing import span, traced
+from metrics import record_cache, riot_requests, riot_rate_limited, riot_request_seconds, db_timed
 
 load_dotenv()
 RIOT_API_KEY = os.getenv("RIOT_API_KEY")
+RIOT_API_BASE_URL = os.getenv("RIOT_API_BASE_URL")  # e.g. http://127.0.0.1:8089 to use the benchmark fake server
+
+def riot_url(host, path):
+    """URL for a Riot API path on a regional (americas) or platform (na1) host"""
+    if RIOT_API_BASE_URL:
+        return f"{RIOT_API_BASE_URL.rstrip('/')}{path}"
+    return f"https://{host}.api.riotgames.com{path}"
 
 # Cache configurations
 match_cache = {}
 match_history_cache = {}
-puuid_cache = {}
+puuid_cache = {}  # riot_id_key -> puuid
+league_entries_cache = {}  # (region, puuid) -> (entries, cached_at)
+challenge_config_cache = {}  # platform -> (lowercase name -> challenge id, cached_at)
+player_challenges_cache = {}  # (platform, puuid) -> (challenge id -> entry, cached_at)
+puuid_negative_cache = {}  # riot_id_key -> expiry time for IDs account-v1 reported as unknown
+_pending_puuid_lookups = {}
 
 # TTL configurations
 MATCH_DATA_TTL = 32400  # 9 hours in seconds
 MATCH_HISTORY_TTL = 600  # 10 minutes in seconds
+LEAGUE_ENTRIES_TTL = 300  # 5 minutes in seconds
+CHALLENGE_CONFIG_TTL = 86400  # 1 day in seconds
+PLAYER_CHALLENGES_TTL = 300  # 5 minutes in seconds
+MASTERY_CACHE_TTL = 43200  # 12 hours in seconds
 PUUID_CACHE_TTL = 604800  # 7 days in seconds
+PUUID_NEGATIVE_TTL = 3600  # 1 hour in seconds
 MATCH_DATA_CACHE_TTL = 15 * 24 * 60 * 60  # 2.5 weeks in seconds
 
 # Rate limiting and metrics
 rate_limit_lock = asyncio.Semaphore(20)  # allow 20 concurrent requests safely
-cache_metrics = {
-    "match_cache_hits": 0,
-    "match_cache_misses": 0,
-    "match_history_cache_hits": 0,
-    "match_history_cache_misses": 0,
-    "puuid_cache_hits": 0,
-    "puuid_cache_misses": 0
-}
+account_lookup_lock = asyncio.Semaphore(10)  # concurrent account-v1 lookups during batch resolution
+challenge_config_lock = asyncio.Lock()
 
 # Global session
 _session = None
@@ -48,38 +68,84 @@ async def close_session():
         await _session.close()
         _session = None
 
-# Replace the old fetch_json with this version
-async def fetch_json(url, headers):
+RIOT_ENDPOINTS = [
+    (re.compile(r"/riot/account/v1/accounts/by-riot-id/"), "account-v1 by-riot-id"),
+    (re.compile(r"/riot/account/v1/accounts/by-puuid/"), "account-v1 by-puuid"),
+    (re.compile(r"/lol/match/v5/matches/by-puuid/"), "match-v5 ids"),
+    (re.compile(r"/lol/match/v5/matches/[^/]+/timeline"), "match-v5 timeline"),
+    (re.compile(r"/lol/match/v5/matches/"), "match-v5 match"),
+    (re.compile(r"/lol/league/v4/"), "league-v4"),
+    (re.compile(r"/lol/champion-mastery/v4/"), "champion-mastery-v4"),
+    (re.compile(r"/lol/challenges/v1/challenges/config"), "challenges-v1 config"),
+    (re.compile(r"/lol/challenges/v1/player-data/"), "challenges-v1 player"),
+    (re.compile(r"/lol/summoner/v4/"), "summoner-v4"),
+]
+
+def riot_endpoint(url):
+    """Low-cardinality metrics label for a Riot API URL"""
+    for pattern, name in RIOT_ENDPOINTS:
+        if pattern.search(url):
+            return name
+    return "other"
+
+def record_riot_response(endpoint, status, started):
+    riot_requests.inc(endpoint=endpoint, status=status)
+    riot_request_seconds.observe(time.perf_counter() - started, endpoint=endpoint)
+    if status == 429:
+        riot_rate_limited.inc(endpoint=endpoint)
+
+async def fetch_json_with_status(url, headers):
+    """Like fetch_json, but also returns the HTTP status so callers can tell a 404 from a failure"""
     session = await get_session()
-    async with session.get(url, headers=headers) as response:
-        if response.status == 429:
+    endpoint = riot_endpoint(url)
+    with span("rate limiter"):
+        await riot_limiter.acquire()
+    started = time.perf_counter()
+    with span(f"http {endpoint}"):
+        async with session.get(url, headers=headers) as response:
+            record_riot_response(endpoint, response.status, started)
+            if response.status == 200:
+                with span("json"):
+                    return response.status, await response.json()
+            elif response.status == 400:
+                # Check for PUUID corruption error
+                try:
+                    error_text = await response.text()
+                    if "Exception decrypting" in error_text and "PUUID" in error_text:
+                        print(f"PUUID corruption detected: {error_text}")
+                except:
+                    pass
+            if response.status != 429:
+                return response.status, None
             retry_after = int(response.headers.get('Retry-After', 10))
-            await asyncio.sleep(retry_after)
-            return await fetch_json(url, headers)
-        elif response.status == 400:
-            # Check for PUUID corruption error
-            try:
-                error_text = await response.text()
-                if "Exception decrypting" in error_text and "PUUID" in error_text:
-                    print(f"PUUID corruption detected: {error_text}")
-                    return None
-            except:
-                pass
-        return await response.json() if response.status == 200 else None
+            await riot_limiter.block(retry_after)
+    # Waited out of the http span so rate limiting shows up as its own stage
+    with span("rate limited"):
+        await asyncio.sleep(retry_after)
+    return await fetch_json_with_status(url, headers)
+
+async def fetch_json(url, headers):
+    _, data = await fetch_json_with_status(url, headers)
+    return data
 
 # Add shutdown handler to LeagueBot's on_ready
 async def cleanup():
     await close_session()
+    await riot_limiter.close()
 
 async def safe_request(session, url, headers, retries=3):
     for attempt in range(retries):
         async with rate_limit_lock:
+            await riot_limiter.acquire()
+            started = time.perf_counter()
             async with session.get(url, headers=headers) as response:
+                record_riot_response(riot_endpoint(url), response.status, started)
                 if response.status == 200:
                     return await response.json()
                 elif response.status == 429:
                     retry_after = int(response.headers.get("Retry-After", "1"))
                     print(f"Rate limit hit. Retrying in {retry_after} seconds...")
+                    await riot_limiter.block(retry_after)
                     await asyncio.sleep(retry_after)
                 elif response.status == 400:
                     # Check for PUUID corruption error
@@ -102,14 +168,13 @@ def is_valid_puuid(puuid):
 async def clear_corrupted_puuid_cache():
     """Clear corrupted PUUID cache entries"""
     async with aiosqlite.connect("riot_bot.db") as conn:
-        async with conn.execute("SELECT riot_id, puuid FROM puuid_cache") as cursor:
-            entries = await cursor.fetchall()
-        
-        corrupted_count = 0
-        for riot_id, puuid in entries:
-            if not is_valid_puuid(puuid):
-                await conn.execute("DELETE FROM puuid_cache WHERE riot_id = ?", (riot_id,))
-                corrupted_count += 1
+        # Same rule as is_valid_puuid, evaluated by SQLite in one pass
+        async with conn.execute('''
+            DELETE FROM puuid_cache
+            WHERE puuid IS NULL OR typeof(puuid) != 'text'
+               OR length(puuid) < 30 OR length(puuid) > 128
+        ''') as cursor:
+            corrupted_count = cursor.rowcount
         
         await conn.commit()
         if corrupted_count > 0:
@@ -133,114 +198,173 @@ async def clear_expired_puuid_cache():
             print(f"Cleared {deleted_count} expired PUUID entries")
         return deleted_count
 
-async def ensure_puuid_table():
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS puuid_cache (
-                riot_id TEXT PRIMARY KEY,
-                puuid TEXT,
-                cached_at INTEGER
-            )
-        ''')
-        await conn.commit()
-
-async def get_puuid_from_db(riot_id):
+@db_timed
+async def get_puuids_from_db(keys):
+    """Look up many cached PUUIDs in one query, dropping invalid or expired rows"""
+    found = {}
+    stale = []
+    now = time.time()
     async with aiosqlite.connect("riot_bot.db") as conn:
-        async with conn.execute(
-            "SELECT puuid, cached_at FROM puuid_cache WHERE riot_id = ?",
-            (riot_id.lower(),)
-        ) as cursor:
-            result = await cursor.fetchone()
-            if result:
-                puuid, cached_at = result
-                # Check if PUUID is valid and not expired
-                if is_valid_puuid(puuid) and (time.time() - cached_at) < PUUID_CACHE_TTL:
-                    return puuid
-                else:
-                    # Remove invalid or expired PUUID
-                    await conn.execute("DELETE FROM puuid_cache WHERE riot_id = ?", (riot_id.lower(),))
-                    await conn.commit()
-            return None
+        for i in range(0, len(keys), 500):  # stay under SQLite's bound parameter limit
+            chunk = keys[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            async with conn.execute(
+                f"SELECT riot_id, puuid, cached_at FROM puuid_cache WHERE riot_id IN ({placeholders})",
+                chunk
+            ) as cursor:
+                for key, puuid, cached_at in await cursor.fetchall():
+                    if is_valid_puuid(puuid) and (now - cached_at) < PUUID_CACHE_TTL:
+                        found[key] = puuid
+                    else:
+                        stale.append((key,))
+        if stale:
+            await conn.executemany("DELETE FROM puuid_cache WHERE riot_id = ?", stale)
+            await conn.commit()
+    return found
+
+# tracked_players keeps its own copy of the PUUID, which outlives the week-long puuid_cache entry
+TRACKED_PUUID_UPDATE = "UPDATE tracked_players SET puuid = ? WHERE normalized_name = ?"
 
 async def save_puuid_to_db(riot_id, puuid):
     # Only save valid PUUIDs
     if not is_valid_puuid(puuid):
         return False
     
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        await conn.execute(
-            "INSERT OR REPLACE INTO puuid_cache (riot_id, puuid, cached_at) VALUES (?, ?, ?)",
-            (riot_id.lower(), puuid, int(time.time()))
-        )
-        await conn.commit()
-        return True
+    write_queue.enqueue(
+        "INSERT OR REPLACE INTO puuid_cache (riot_id, puuid, cached_at) VALUES (?, ?, ?)",
+        (riot_id_key(riot_id), puuid, int(time.time()))
+    )
+    write_queue.enqueue(TRACKED_PUUID_UPDATE, (puuid, riot_id_key(riot_id)))
+    return True
+
+async def save_puuids_to_db(entries):
+    """Save many (riot_id_key, puuid) pairs in one transaction"""
+    now = int(time.time())
+    rows = [(key, puuid, now) for key, puuid in entries if is_valid_puuid(puuid)]
+    if not rows:
+        return
+    for key, puuid, cached_at in rows:
+        write_queue.enqueue("INSERT OR REPLACE INTO puuid_cache (riot_id, puuid, cached_at) VALUES (?, ?, ?)", (key, puuid, cached_at))
+        write_queue.enqueue(TRACKED_PUUID_UPDATE, (puuid, key))
+
+async def cache_puuid(riot_id, puuid):
+    """Seed the caches with a PUUID we already have, e.g. from an account lookup in /add"""
+    key = riot_id_key(riot_id)
+    if not key or not is_valid_puuid(puuid):
+        return
+    puuid_cache[key] = puuid
+    puuid_negative_cache.pop(key, None)
+    await save_puuid_to_db(riot_id, puuid)
+
+async def _lookup_puuid(key):
+    """Resolve one Riot ID through account-v1, sharing the request between concurrent callers"""
+    if key in _pending_puuid_lookups:
+        return await _pending_puuid_lookups[key]
+
+    async def lookup():
+        game_name, tag_line = split_riot_id(key)
+        async with account_lookup_lock:
+            status, account = await fetch_json_with_status(account_url(game_name, tag_line), {"X-Riot-Token": RIOT_API_KEY})
+        if status == 404:
+            puuid_negative_cache[key] = time.time() + PUUID_NEGATIVE_TTL
+            return None
+        puuid = account.get("puuid") if account else None
+        return puuid if is_valid_puuid(puuid) else None
 
-async def get_puuid(riot_id):
-    # Check memory cache first
-    if riot_id in puuid_cache:
-        cached_puuid = puuid_cache[riot_id]
-        if is_valid_puuid(cached_puuid):
-            return cached_puuid
-        else:
-            del puuid_cache[riot_id]
-    # Check database cache
-    db_puuid = await get_puuid_from_db(riot_id)
-    if db_puuid:
-        puuid_cache[riot_id] = db_puuid
-        return db_puuid
-    # Fetch single PUUID using batch system
-    results = await batch_fetch_puuids([riot_id])
-    puuid = results.get(riot_id)
-    if puuid:
-        puuid_cache[riot_id] = puuid
-    return puuid
+    task = asyncio.ensure_future(lookup())
+    _pending_puuid_lookups[key] = task
+    try:
+        return await task
+    finally:
+        _pending_puuid_lookups.pop(key, None)
 
+@traced("puuid")
 async def batch_fetch_puuids(riot_ids):
-    to_fetch = []
+    """Resolve many Riot IDs: memory cache, then one bulk SQLite query, then concurrent account lookups.
+
+    Returns a dict mapping each resolvable input Riot ID to its PUUID.
+    """
     results = {}
-    # Check cache first
+    pending = {}  # cache key -> input Riot IDs that normalize to it
+    now = time.time()
     for riot_id in riot_ids:
-        cached = await get_puuid_from_db(riot_id)
-        if cached:
+        key = riot_id_key(riot_id)
+        if not key:
+            continue
+        cached = puuid_cache.get(key)
+        if cached and is_valid_puuid(cached):
+            record_cache("puuid", True)
             results[riot_id] = cached
+        elif puuid_negative_cache.get(key, 0) > now:
+            record_cache("puuid", True)
         else:
-            to_fetch.append(riot_id)
-    # Fetch missing PUUIDs in chunks
-    chunk_size = 10  # Adjust based on rate limits
-    for i in range(0, len(to_fetch), chunk_size):
-        chunk = to_fetch[i:i + chunk_size]
-        tasks = []
-        for riot_id in chunk:
-            if "#" not in riot_id:
-                continue
-            game_name, tag_line = riot_id.split("#", 1)
-            task = get_account_by_riot_id(game_name, tag_line)
-            tasks.append(task)
-        chunk_results = await asyncio.gather(*tasks, return_exceptions=True)
-        for riot_id, result in zip(chunk, chunk_results):
-            if isinstance(result, Exception) or not result:
+            pending.setdefault(key, []).append(riot_id)
+
+    if pending:
+        for key, puuid in (await get_puuids_from_db(list(pending))).items():
+            record_cache("puuid", True)
+            puuid_cache[key] = puuid
+            for riot_id in pending.pop(key):
+                results[riot_id] = puuid
+
+    if pending:
+        record_cache("puuid", False, len(pending))
+        fetched = await asyncio.gather(*(_lookup_puuid(key) for key in pending), return_exceptions=True)
+        to_save = []
+        for (key, ids), puuid in zip(pending.items(), fetched):
+            if isinstance(puuid, Exception) or not puuid:
                 continue
-            puuid = result.get("puuid")
-            if puuid and is_valid_puuid(puuid):
+            puuid_cache[key] = puuid
+            to_save.append((key, puuid))
+            for riot_id in ids:
                 results[riot_id] = puuid
-                await save_puuid_to_db(riot_id, puuid)
-        await asyncio.sleep(1)  # Rate limit compliance
+        await save_puuids_to_db(to_save)
+
     return results
 
+async def get_puuid(riot_id):
+    """Resolve a Riot ID (GameName#TAG, any casing/spacing) to a PUUID through the shared caches"""
+    key = riot_id_key(riot_id)
+    cached = puuid_cache.get(key)
+    if cached and is_valid_puuid(cached):
+        record_cache("puuid", True)
+        return cached
+    results = await batch_fetch_puuids([riot_id])
+    return results.get(riot_id)
+
 async def prefetch_puuids():
-    """Pre-fetch PUUIDs for all tracked players across all guilds"""
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        async with conn.execute("SELECT DISTINCT summoner_name FROM tracked_players") as cursor:
-            players = await cursor.fetchall()
-            riot_ids = [player[0] for player in players]
-    
-    if not riot_ids:
-        return
+    """Resolve and cache the PUUID of every tracked player.
+
+    Meant to run as a background task: one bulk SQLite query plus concurrent account lookups.
+    Only the PUUID cache is warmed; it lasts a week, whereas rank and match ID entries would
+    expire minutes after startup. Rank snapshots are filled by the rank refresh job instead.
+    """
+    started = time.time()
+    try:
+        async with aiosqlite.connect("riot_bot.db") as conn:
+            async with conn.execute("SELECT summoner_name FROM tracked_players") as cursor:
+                rows = await cursor.fetchall()
+
+        players = {}
+        for (summoner_name,) in rows:
+            key = riot_id_key(summoner_name)
+            if key and key not in players:
+                players[key] = summoner_name
+        if not players:
+            return
+
+        print(f"Prefetch: resolving PUUIDs for {len(players)} tracked players...")
+        puuids = await batch_fetch_puuids(list(players.values()))
+        print(f"Prefetch complete: resolved {len(puuids)}/{len(players)} PUUIDs in {time.time() - started:.1f}s")
+    except Exception as e:
+        print(f"Prefetch failed: {e}")
+
+def account_url(game_name, tag_line):
+    return riot_url("americas", f"/riot/account/v1/accounts/by-riot-id/{quote(game_name)}/{quote(tag_line)}")
 
 async def get_account_by_riot_id(game_name, tag_line):
     headers = {"X-Riot-Token": RIOT_API_KEY}
-    url = f"https://americas.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}"
-    result = await fetch_json(url, headers)
+    result = await fetch_json(account_url(game_name.strip(), tag_line.strip()), headers)
     return result
 
 async def get_summoner_by_puuid(region, puuid):
@@ -250,36 +374,16 @@ async def get_summoner_by_puuid(region, puuid):
         return None
     
     async with aiohttp.ClientSession() as session:
-        url = f"https://{region}.api.riotgames.com/lol/summoner/v4/summoners/by-puuid/{puuid}"
+        url = riot_url(region, f"/lol/summoner/v4/summoners/by-puuid/{puuid}")
         headers = {"X-Riot-Token": RIOT_API_KEY}
         return await fetch_json(url, headers)
 
-_champion_data_cache = None
-
 async def get_champion_data():
-    global _champion_data_cache
-    if _champion_data_cache is not None:
-        return _champion_data_cache
-
-    async with aiohttp.ClientSession() as session:
-        version_url = "https://ddragon.leagueoflegends.com/api/versions.json"
-        version_response = await fetch_json(version_url, {})
-        version = version_response[0] if version_response else "14.24.1"
-
-        champ_data_url = f"https://ddragon.leagueoflegends.com/cdn/{version}/data/en_US/champion.json"
-        champ_data = await fetch_json(champ_data_url, {})
-
-        id_to_name = {}
-        name_to_id = {}
-        if champ_data:
-            for key, val in champ_data["data"].items():
-                id_to_name[int(val["key"])] = val["name"]
-                name_to_id[val["name"].lower()] = int(val["key"])
-
-        _champion_data_cache = (id_to_name, name_to_id)
-        return _champion_data_cache
+    await champion_catalog.ensure_loaded()
+    return champion_catalog.id_to_name, champion_catalog.name_to_id
 
 # Persistent match data cache using SQLite
+@db_timed
 async def get_match_data_local(match_id):
     async with aiosqlite.connect("riot_bot.db") as conn:
         async with conn.execute("SELECT data, cached_at FROM match_data WHERE match_id = ?", (match_id,)) as cursor:
@@ -287,40 +391,32 @@ async def get_match_data_local(match_id):
             if row:
                 data, cached_at = row
                 if time.time() - cached_at < MATCH_DATA_TTL:
-                    return json.loads(data)
+                    with span("json"):
+                        return json.loads(data)
     return None
 
 async def save_match_data_local(match_id, data):
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        await conn.execute(
-            "INSERT OR REPLACE INTO match_data (match_id, data, cached_at) VALUES (?, ?, ?)",
-            (match_id, json.dumps(data), int(time.time()))
-        )
-        await conn.commit()
-
-# Ensure table exists at startup
-async def ensure_match_data_table():
-    async with aiosqlite.connect("riot_bot.db") as conn:
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS match_data (
-                match_id TEXT PRIMARY KEY,
-                data TEXT,
-                cached_at INTEGER
-            )
-        ''')
-        await conn.commit()
+    # Queued rather than committed here; match_cache serves reads until the next flush
+    write_queue.enqueue(
+        "INSERT OR REPLACE INTO match_data (match_id, data, cached_at) VALUES (?, ?, ?)",
+        (match_id, json.dumps(data), int(time.time()))
+    )
 
 # Update get_cached_match_data to use persistent cache
+@traced("match")
 async def get_cached_match_data(session, match_id):
     # 1. Try in-memory cache
     if match_id in match_cache:
+        record_cache("match", True)
         return match_cache[match_id]
     # 2. Try persistent cache
     match_data = await get_match_data_local(match_id)
     if match_data:
+        record_cache("match", True)
         match_cache[match_id] = match_data
         return match_data
     # 3. Fetch from Riot API
+    record_cache("match", False)
     data = await get_match_data(session, match_id)
     if data:
         match_cache[match_id] = data
@@ -328,53 +424,63 @@ async def get_cached_match_data(session, match_id):
     return data
 
 async def get_match_data(session, match_id):
-    url = f"https://americas.api.riotgames.com/lol/match/v5/matches/{match_id}"
+    url = riot_url("americas", f"/lol/match/v5/matches/{match_id}")
     headers = {"X-Riot-Token": RIOT_API_KEY}
     return await fetch_json(url, headers)
 
+@traced("timeline")
 async def get_match_timeline(session, match_id):
-    url = f"https://americas.api.riotgames.com/lol/match/v5/matches/{match_id}/timeline"
+    url = riot_url("americas", f"/lol/match/v5/matches/{match_id}/timeline")
     headers = {"X-Riot-Token": RIOT_API_KEY}
     return await fetch_json(url, headers)
 
-async def get_summoner_rank(region, riot_id):
+@traced("league")
+async def get_league_entries(region, puuid, riot_id=None):
+    """Ranked queue entries for a player, cached briefly since solo and flex lookups share them.
+
+    Fresh responses for a known Riot ID are also recorded as rank snapshots.
+    """
+    now = time.time()
+    key = (region, puuid)
+    if key in league_entries_cache:
+        entries, cached_time = league_entries_cache[key]
+        if now - cached_time < LEAGUE_ENTRIES_TTL:
+            record_cache("league", True)
+            return entries
+
+    record_cache("league", False)
+    rank_url = riot_url(region, f"/lol/league/v4/entries/by-puuid/{puuid}")
+    headers = {"X-Riot-Token": RIOT_API_KEY}
+    entries = await fetch_json(rank_url, headers)
+    if entries is not None:
+        league_entries_cache[key] = (entries, now)
+        if riot_id:
+            await rank_tracker.record_entries(riot_id, entries)
+    return entries
+
+async def get_queue_rank(region, riot_id, queue_type):
     puuid = await get_puuid(riot_id)
     if not puuid:
         return None
-    async with aiohttp.ClientSession() as session:
-        rank_url = f"https://{region}.api.riotgames.com/lol/league/v4/entries/by-puuid/{puuid}"
-        headers = {"X-Riot-Token": RIOT_API_KEY}
-        ranks = await fetch_json(rank_url, headers)
-        if not ranks:
-            return None
-        for queue in ranks:
-            if queue["queueType"] == "RANKED_SOLO_5x5":
-                return {
-                    "tier": queue["tier"],
-                    "rank": queue["rank"],
-                    "lp": queue["leaguePoints"]
-                }
+    ranks = await get_league_entries(region, puuid, riot_id)
+    if not ranks:
+        return None
+    for queue in ranks:
+        if queue["queueType"] == queue_type:
+            return {
+                "tier": queue["tier"],
+                "rank": queue["rank"],
+                "lp": queue["leaguePoints"]
+            }
     return None
 
+async def get_summoner_rank(region, riot_id):
+    return await get_queue_rank(region, riot_id, "RANKED_SOLO_5x5")
+
 async def get_flex_rank(region, riot_id):
-    puuid = await get_puuid(riot_id)
-    if not puuid:
-        return None
-    async with aiohttp.ClientSession() as session:
-        rank_url = f"https://{region}.api.riotgames.com/lol/league/v4/entries/by-puuid/{puuid}"
-        headers = {"X-Riot-Token": RIOT_API_KEY}
-        ranks = await fetch_json(rank_url, headers)
-        if not ranks:
-            return None
-        for queue in ranks:
-            if queue["queueType"] == "RANKED_FLEX_SR":
-                return {
-                    "tier": queue["tier"],
-                    "rank": queue["rank"],
-                    "lp": queue["leaguePoints"]
-                }
-    return None
+    return await get_queue_rank(region, riot_id, "RANKED_FLEX_SR")
 
+@traced("match_ids")
 async def get_cached_match_ids(session, puuid, count):
     now = time.time()
     key = (puuid, count)
@@ -382,11 +488,11 @@ async def get_cached_match_ids(session, puuid, count):
     if key in match_history_cache:
         match_ids, cached_time = match_history_cache[key]
         if now - cached_time < MATCH_HISTORY_TTL:
-            cache_metrics["match_history_cache_hits"] += 1
+            record_cache("match_history", True)
             return match_ids
     
-    cache_metrics["match_history_cache_misses"] += 1
-    url = f"https://americas.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?start=0&count={count}"
+    record_cache("match_history", False)
+    url = riot_url("americas", f"/lol/match/v5/matches/by-puuid/{puuid}/ids?start=0&count={count}")
     headers = {"X-Riot-Token": RIOT_API_KEY}
     match_ids = await fetch_json(url, headers)
     
@@ -405,41 +511,48 @@ async def get_match_history(region, riot_id, count=10):
         if not match_ids:
             return None
 
-        matches = []
-        for match_id in match_ids:
-            match_data = await get_cached_match_data(session, match_id)
-            if not match_data:
-                continue
-
-            # Only include Ranked Solo/Duo games (queueId 420)
-            if match_data["info"].get("queueId") != 420:
-                continue
-
-            # Skip remakes (games that ended very early)
-            if match_data["info"]["gameDuration"] < 180:  # 3 minutes in seconds
-                continue
-
-            # Find the player's data in the match
-            for participant in match_data["info"]["participants"]:
-                if participant["puuid"] == puuid:
-                    matches.append({
-                        "matchId": match_id,
-                        "champion": participant["championName"],
-                        "kills": participant["kills"],
-                        "deaths": participant["deaths"],
-                        "assists": participant["assists"],
-                        "win": participant["win"],
-                        "gameMode": match_data["info"]["gameMode"],
-                        "gameDuration": match_data["info"]["gameDuration"],
-                        "timestamp": match_data["info"]["gameStartTimestamp"]
-                    })
-                    break
+        matches, _ = await get_ranked_matches(session, puuid, match_ids, 0, count)
+        return matches
 
-            # Stop if we've collected enough ranked games
-            if len(matches) >= count:
+async def get_ranked_matches(session, puuid, match_ids, start, count):
+    """Up to count Ranked Solo/Duo games from match_ids[start:], plus the index to continue from.
+
+    Lets a caller page through one list of match IDs, fetching only the games on the new page.
+    """
+    matches = []
+    index = start
+    while index < len(match_ids) and len(matches) < count:
+        match_id = match_ids[index]
+        index += 1
+        match_data = await get_cached_match_data(session, match_id)
+        if not match_data:
+            continue
+
+        # Only include Ranked Solo/Duo games (queueId 420)
+        if match_data["info"].get("queueId") != 420:
+            continue
+
+        # Skip remakes (games that ended very early)
+        if match_data["info"]["gameDuration"] < 180:  # 3 minutes in seconds
+            continue
+
+        # Find the player's data in the match
+        for participant in match_data["info"]["participants"]:
+            if participant["puuid"] == puuid:
+                matches.append({
+                    "matchId": match_id,
+                    "champion": participant["championName"],
+                    "kills": participant["kills"],
+                    "deaths": participant["deaths"],
+                    "assists": participant["assists"],
+                    "win": participant["win"],
+                    "gameMode": match_data["info"]["gameMode"],
+                    "gameDuration": match_data["info"]["gameDuration"],
+                    "timestamp": match_data["info"]["gameStartTimestamp"]
+                })
                 break
 
-        return matches
+    return matches, index
 
 async def get_detailed_match_history(region, riot_id, count=20):
     """Get detailed match history including all stats needed for /stats and /feederscore commands"""
@@ -452,6 +565,9 @@ async def get_detailed_match_history(region, riot_id, count=20):
         if not match_ids:
             return None
 
+        # First blood rows are stored once per match and written together after the loop
+        indexed = await get_indexed_first_blood_matches(puuid, match_ids)
+        first_blood_rows = []
         detailed_matches = []
         for match_id in match_ids:
             match_data = await get_cached_match_data(session, match_id)
@@ -496,20 +612,18 @@ async def get_detailed_match_history(region, riot_id, count=20):
             
             if timeline_data:
                 participant_id = player_data["participantId"]
-                found_first_blood = False
+                first_blood = extract_first_blood(timeline_data)
+                if match_id not in indexed:
+                    first_blood_rows.extend(build_first_blood_rows(match_id, match_data, first_blood))
+
+                if first_blood:
+                    first_blood_kill = first_blood["killerId"] == participant_id
+                    first_blood_assist = not first_blood_kill and participant_id in first_blood["assistIds"]
+                    first_blood_victim = not first_blood_kill and not first_blood_assist and first_blood["victimId"] == participant_id
                 
                 for frame in timeline_data["info"]["frames"]:
                     for event in frame.get("events", []):
                         if event["type"] == "CHAMPION_KILL":
-                            if not found_first_blood:
-                                found_first_blood = True
-                                if event.get("killerId") == participant_id:
-                                    first_blood_kill = True
-                                elif event.get("assistingParticipantIds") and participant_id in event.get("assistingParticipantIds"):
-                                    first_blood_assist = True
-                                elif event.get("victimId") == participant_id:
-                                    first_blood_victim = True
-                            
                             if event.get("victimId") == participant_id:
                                 death_times.append(event["timestamp"] / 1000)
                         
@@ -560,112 +674,287 @@ async def get_detailed_match_history(region, riot_id, count=20):
             if len(detailed_matches) >= count:
                 break
 
+        await save_first_blood_events(first_blood_rows)
         return detailed_matches
 
+def extract_first_blood(timeline_data):
+    """Find the first CHAMPION_KILL in a match timeline"""
+    for frame in timeline_data["info"]["frames"]:
+        for event in frame.get("events", []):
+            if event["type"] == "CHAMPION_KILL":
+                return {
+                    "killerId": event.get("killerId"),
+                    "assistIds": event.get("assistingParticipantIds") or [],
+                    "victimId": event.get("victimId"),
+                    "timestamp": event["timestamp"]
+                }
+    return None
+
+def build_first_blood_rows(match_id, match_data, first_blood):
+    """Build one first_blood_events row per participant of a match"""
+    info = match_data["info"]
+    rows = []
+    for participant in info["participants"]:
+        participant_id = participant["participantId"]
+        kill = assist = victim = False
+        if first_blood:
+            kill = first_blood["killerId"] == participant_id
+            assist = not kill and participant_id in first_blood["assistIds"]
+            victim = not kill and not assist and first_blood["victimId"] == participant_id
+        rows.append((
+            match_id,
+            participant["puuid"],
+            participant_id,
+            participant["championName"],
+            info.get("queueId"),
+            info["gameStartTimestamp"],
+            int(kill),
+            int(assist),
+            int(victim),
+            first_blood["timestamp"] if first_blood else None
+        ))
+    return rows
+
+@db_timed
+async def save_first_blood_events(rows):
+    if not rows:
+        return
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        await conn.executemany('''
+            INSERT OR REPLACE INTO first_blood_events
+            (match_id, puuid, participant_id, champion, queue_id, game_timestamp,
+             first_blood_kill, first_blood_assist, first_blood_victim, first_blood_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        await conn.commit()
+
+@db_timed
+async def get_indexed_first_blood_matches(puuid, match_ids):
+    """Return the subset of match_ids already present in the first blood index"""
+    if not match_ids:
+        return set()
+    placeholders = ",".join("?" * len(match_ids))
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute(
+            f"SELECT match_id FROM first_blood_events WHERE puuid = ? AND match_id IN ({placeholders})",
+            (puuid, *match_ids)
+        ) as cursor:
+            return {row[0] for row in await cursor.fetchall()}
+
+async def index_first_blood(session, match_id):
+    """Ingest a match into the first blood index, downloading the timeline only for ranked games"""
+    match_data = await get_cached_match_data(session, match_id)
+    if not match_data:
+        return False
+
+    first_blood = None
+    if match_data["info"].get("queueId") == 420:
+        timeline_data = await get_match_timeline(session, match_id)
+        if not timeline_data:
+            return False
+        first_blood = extract_first_blood(timeline_data)
+
+    await save_first_blood_events(build_first_blood_rows(match_id, match_data, first_blood))
+    return True
+
+async def get_first_blood_stats(region, riot_id, count=20):
+    """Get first blood outcomes for a player's recent Ranked Solo/Duo games from the first blood index"""
+    async with aiohttp.ClientSession() as session:
+        puuid = await get_puuid(riot_id)
+        if not puuid:
+            return None
+
+        # Ingest any recent matches we haven't seen yet; repeat calls skip straight to the query
+        match_ids = await get_cached_match_ids(session, puuid, min(count * 2, 100))
+        if match_ids:
+            indexed = await get_indexed_first_blood_matches(puuid, match_ids)
+            for match_id in match_ids:
+                if match_id not in indexed:
+                    await index_first_blood(session, match_id)
+
+        async with aiosqlite.connect("riot_bot.db") as conn:
+            async with conn.execute('''
+                SELECT match_id, champion, first_blood_kill, first_blood_assist,
+                       first_blood_victim, first_blood_time, game_timestamp
+                FROM first_blood_events
+                WHERE puuid = ? AND queue_id = 420
+                ORDER BY game_timestamp DESC
+                LIMIT ?
+            ''', (puuid, count)) as cursor:
+                rows = await cursor.fetchall()
+
+        return [
+            {
+                "matchId": match_id,
+                "champion": champion,
+                "firstBloodKill": bool(kill),
+                "firstBloodAssist": bool(assist),
+                "firstBloodVictim": bool(victim),
+                "firstBloodTime": fb_time,
+                "timestamp": game_timestamp
+            }
+            for match_id, champion, kill, assist, victim, fb_time, game_timestamp in rows
+        ]
+
+async def refresh_masteries(region, puuid):
+    """Fetch every champion mastery for a player and replace their cached rows"""
+    mastery_url = riot_url(region, f"/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}")
+    headers = {"X-Riot-Token": RIOT_API_KEY}
+    masteries = await fetch_json(mastery_url, headers)
+    if masteries is None:
+        return None
+
+    rows = [
+        (puuid, m["championId"], m["championLevel"], m["championPoints"], m.get("lastPlayTime", 0))
+        for m in masteries
+    ]
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        await conn.execute("DELETE FROM champion_mastery WHERE puuid = ?", (puuid,))
+        await conn.executemany(
+            "INSERT INTO champion_mastery (puuid, champion_id, champion_level, champion_points, last_play_time) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        await conn.execute(
+            "INSERT OR REPLACE INTO mastery_refresh (puuid, refreshed_at) VALUES (?, ?)",
+            (puuid, int(time.time()))
+        )
+        await conn.commit()
+    return masteries
+
+@traced("mastery")
+async def get_all_masteries(region, puuid):
+    """All champion masteries for a player, highest points first, served from the mastery cache when fresh"""
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute("SELECT refreshed_at FROM mastery_refresh WHERE puuid = ?", (puuid,)) as cursor:
+            row = await cursor.fetchone()
+
+        if row and time.time() - row[0] < MASTERY_CACHE_TTL:
+            record_cache("mastery", True)
+            async with conn.execute('''
+                SELECT champion_id, champion_level, champion_points, last_play_time
+                FROM champion_mastery WHERE puuid = ?
+                ORDER BY champion_points DESC
+            ''', (puuid,)) as cursor:
+                return [
+                    {
+                        "championId": champion_id,
+                        "championLevel": champion_level,
+                        "championPoints": champion_points,
+                        "lastPlayTime": last_play_time
+                    }
+                    for champion_id, champion_level, champion_points, last_play_time in await cursor.fetchall()
+                ]
+
+    record_cache("mastery", False)
+    masteries = await refresh_masteries(region, puuid)
+    if masteries is None:
+        return None
+    return sorted(masteries, key=lambda m: m["championPoints"], reverse=True)
+
+async def refresh_tracked_masteries(region, batch_size=10):
+    """Refresh stale mastery caches for all tracked players in small batches"""
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute("SELECT DISTINCT summoner_name FROM tracked_players") as cursor:
+            riot_ids = [row[0] for row in await cursor.fetchall()]
+    if not riot_ids:
+        return 0
+
+    puuids = list(set((await batch_fetch_puuids(riot_ids)).values()))
+    cutoff = int(time.time()) - MASTERY_CACHE_TTL
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute("SELECT puuid FROM mastery_refresh WHERE refreshed_at >= ?", (cutoff,)) as cursor:
+            fresh = {row[0] for row in await cursor.fetchall()}
+    stale = [puuid for puuid in puuids if puuid not in fresh]
+
+    refreshed = 0
+    for i in range(0, len(stale), batch_size):
+        batch = stale[i:i + batch_size]
+        results = await asyncio.gather(*(refresh_masteries(region, puuid) for puuid in batch), return_exceptions=True)
+        refreshed += sum(1 for result in results if result is not None and not isinstance(result, Exception))
+        await asyncio.sleep(1)  # Rate limit compliance
+    return refreshed
+
+@db_timed
+async def get_mastery_leaderboard(guild_id, champion_id):
+    """Rank a guild's tracked players on one champion straight from the mastery cache"""
+    async with aiosqlite.connect("riot_bot.db") as conn:
+        async with conn.execute('''
+            SELECT t.summoner_name, m.champion_level, m.champion_points
+            FROM tracked_players t
+            JOIN champion_mastery m ON m.puuid = t.puuid AND m.champion_id = ?
+            WHERE t.guild_id = ?
+            ORDER BY m.champion_points DESC
+        ''', (champion_id, guild_id)) as cursor:
+            return await cursor.fetchall()
+
 async def get_specific_champion_mastery(region, riot_id, champion_name):
     """Get mastery data for a specific champion using Riot ID format (GameName#TAG)"""
-    if "#" not in riot_id:
-        print(f"Invalid Riot ID format: {riot_id}")
+    puuid = await get_puuid(riot_id)
+    if not puuid:
+        print(f"Could not find account for {riot_id}")
         return None
     
-    game_name, tag_line = riot_id.split("#", 1)
-    
-    async with aiohttp.ClientSession() as session:
-        # First, get the account to get the PUUID
-        account_data = await get_account_by_riot_id(game_name, tag_line)
-        if not account_data:
-            print(f"Could not find account for {riot_id}")
-            return None
-        
-        puuid = account_data["puuid"]
-        
-        # Get champion data
-        id_to_name, name_to_id = await get_champion_data()
-        champion_id = name_to_id.get(champion_name.lower())
-        if not champion_id:
-            print(f"Could not find champion ID for {champion_name}")
-            return None
-        
-        # Get mastery data for specific champion
-        mastery_url = f"https://{region}.api.riotgames.com/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}/by-champion/{champion_id}"
-        headers = {"X-Riot-Token": RIOT_API_KEY}
-        
-        mastery = await fetch_json(mastery_url, headers)
-        if not mastery:
-            return None
-        
-        return {
-            "championId": mastery["championId"],
-            "championName": champion_name,
-            "championLevel": mastery["championLevel"],
-            "championPoints": mastery["championPoints"],
-            "lastPlayTime": mastery.get("lastPlayTime", 0)
-        }
-
-async def get_champion_mastery(region, riot_id, count=10):
-    """Get top champion masteries for a player using Riot ID format (GameName#TAG)"""
-    if "#" not in riot_id:
-        print(f"Invalid Riot ID format: {riot_id}")
+    # Get champion data
+    await champion_catalog.ensure_loaded()
+    champion_id = champion_catalog.find_id(champion_name)
+    if not champion_id:
+        print(f"Could not find champion ID for {champion_name}")
         return None
+    champion_name = champion_catalog.id_to_name.get(champion_id, champion_name)
     
-    game_name, tag_line = riot_id.split("#", 1)
+    masteries = await get_all_masteries(region, puuid)
+    if not masteries:
+        return None
     
-    async with aiohttp.ClientSession() as session:
-        # First, get the account to get the PUUID
-        account_data = await get_account_by_riot_id(game_name, tag_line)
-        if not account_data:
-            print(f"Could not find account for {riot_id}")
-            return None
-        
-        puuid = account_data["puuid"]
-        
-        # Get top champion masteries
-        mastery_url = f"https://{region}.api.riotgames.com/lol/champion-mastery/v4/champion-masteries/by-puuid/{puuid}/top?count={count}"
-        headers = {"X-Riot-Token": RIOT_API_KEY}
-        
-        masteries = await fetch_json(mastery_url, headers)
-        if not masteries:
-            return None
-        
-        # Get champion data
-        id_to_name, _ = await get_champion_data()
-        
-        # Format mastery data
-        formatted_masteries = []
-        for mastery in masteries:
-            champion_name = id_to_name.get(mastery["championId"], f"Champion {mastery['championId']}")
-            formatted_masteries.append({
+    for mastery in masteries:
+        if mastery["championId"] == champion_id:
+            return {
                 "championId": mastery["championId"],
                 "championName": champion_name,
                 "championLevel": mastery["championLevel"],
                 "championPoints": mastery["championPoints"],
                 "lastPlayTime": mastery.get("lastPlayTime", 0)
-            })
-        
-        return formatted_masteries
+            }
+    return None
 
-async def get_last_played_games(region, riot_id):
-    """Get the last game played for each game mode using Riot ID format (GameName#TAG)"""
-    if "#" not in riot_id:
-        print(f"Invalid Riot ID format: {riot_id}")
+async def get_champion_mastery(region, riot_id, count=10):
+    """Get top champion masteries for a player using Riot ID format (GameName#TAG)"""
+    puuid = await get_puuid(riot_id)
+    if not puuid:
+        print(f"Could not find account for {riot_id}")
         return None
     
-    game_name, tag_line = riot_id.split("#", 1)
+    masteries = await get_all_masteries(region, puuid)
+    if not masteries:
+        return None
     
+    # Get champion data
+    id_to_name, _ = await get_champion_data()
+    
+    # Format mastery data
+    formatted_masteries = []
+    for mastery in masteries[:count]:
+        champion_name = id_to_name.get(mastery["championId"], f"Champion {mastery['championId']}")
+        formatted_masteries.append({
+            "championId": mastery["championId"],
+            "championName": champion_name,
+            "championLevel": mastery["championLevel"],
+            "championPoints": mastery["championPoints"],
+            "lastPlayTime": mastery.get("lastPlayTime", 0)
+        })
+    
+    return formatted_masteries
+
+async def get_last_played_games(region, riot_id):
+    """Get the last game played for each game mode using Riot ID format (GameName#TAG)"""
     async with aiohttp.ClientSession() as session:
-        # First, get the account to get the PUUID
-        account_data = await get_account_by_riot_id(game_name, tag_line)
-        if not account_data:
+        puuid = await get_puuid(riot_id)
+        if not puuid:
             print(f"Could not find account for {riot_id}")
             return None
         
-        puuid = account_data["puuid"]
-        
         # Get match history
-        match_history_url = f"https://americas.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?start=0&count=50"
-        headers = {"X-Riot-Token": RIOT_API_KEY}
-        
-        match_ids = await fetch_json(match_history_url, headers)
+        match_ids = await get_cached_match_ids(session, puuid, 50)
         if not match_ids:
             return None
 
@@ -726,26 +1015,14 @@ async def get_last_played_games(region, riot_id):
 
 async def get_role_summary(region, riot_id, count=50):
     """Get role distribution data for a player using Riot ID format (GameName#TAG)"""
-    if "#" not in riot_id:
-        print(f"Invalid Riot ID format: {riot_id}")
-        return None
-    
-    game_name, tag_line = riot_id.split("#", 1)
-    
     async with aiohttp.ClientSession() as session:
-        # First, get the account to get the PUUID
-        account_data = await get_account_by_riot_id(game_name, tag_line)
-        if not account_data:
+        puuid = await get_puuid(riot_id)
+        if not puuid:
             print(f"Could not find account for {riot_id}")
             return None
         
-        puuid = account_data["puuid"]
-        
         # Get match history
-        match_history_url = f"https://americas.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?start=0&count={min(count * 2, 100)}"
-        headers = {"X-Riot-Token": RIOT_API_KEY}
-        
-        match_ids = await fetch_json(match_history_url, headers)
+        match_ids = await get_cached_match_ids(session, puuid, min(count * 2, 100))
         if not match_ids:
             return None
 
@@ -843,85 +1120,133 @@ async def clear_expired_match_data_cache():
     """Clear expired match data cache entries (older than 2.5 weeks)"""
     async with aiosqlite.connect("riot_bot.db") as conn:
         cutoff_time = int(time.time()) - MATCH_DATA_CACHE_TTL
-        await conn.execute(
+        async with conn.execute(
             "DELETE FROM match_data WHERE cached_at < ?",
             (cutoff_time,)
-        )
+        ) as cursor:
+            deleted_count = cursor.rowcount
         await conn.commit()
+        return deleted_count
 
-async def clear_corrupted_match_data_cache():
+def is_valid_match_data(data):
+    try:
+        parsed = json.loads(data)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(parsed, dict) and "info" in parsed and "metadata" in parsed
+
+async def clear_corrupted_match_data_cache(chunk_size=100):
     """Remove match_data entries where the data column is not valid JSON or missing required fields."""
+    corrupted_ids = []
     async with aiosqlite.connect("riot_bot.db") as conn:
+        # Stream rows in chunks rather than loading the whole cache into memory
         async with conn.execute("SELECT match_id, data FROM match_data") as cursor:
-            rows = await cursor.fetchall()
-        corrupted = 0
-        for match_id, data in rows:
-            try:
-                parsed = json.loads(data)
-                # Optionally, check for required keys
-                if not isinstance(parsed, dict) or "info" not in parsed or "metadata" not in parsed:
-                    raise ValueError("Missing required keys")
-            except Exception:
-                await conn.execute("DELETE FROM match_data WHERE match_id = ?", (match_id,))
-                corrupted += 1
-        await conn.commit()
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                # json.loads holds the GIL, so a thread wouldn't help; small chunks hand the loop
+                # back at every fetchmany instead of parsing the whole cache in one stall
+                corrupted_ids.extend((match_id,) for match_id, data in rows if not is_valid_match_data(data))
+
+        if corrupted_ids:
+            await conn.executemany("DELETE FROM match_data WHERE match_id = ?", corrupted_ids)
+            await conn.commit()
+    corrupted = len(corrupted_ids)
     if corrupted > 0:
         print(f"Cleared {corrupted} corrupted match_data entries")
     return corrupted
 
-async def get_challenge_by_name(platform: str, puuid: str, name_contains: str):
-    """Get challenge data by searching for a challenge name"""
-    # 1) resolve challenge id by name (platform route!)
-    cfg_url = f"https://{platform}.api.riotgames.com/lol/challenges/v1/challenges/config"
-    pdata_url = f"https://{platform}.api.riotgames.com/lol/challenges/v1/player-data/{puuid}"
-    headers = {"X-Riot-Token": RIOT_API_KEY}
+async def get_challenge_name_index(platform):
+    """Map of lowercase en_US challenge names to IDs, built once per platform from the config document"""
+    now = time.time()
+    cached = challenge_config_cache.get(platform)
+    if cached and now - cached[1] < CHALLENGE_CONFIG_TTL:
+        return cached[0]
 
-    cfg = await fetch_json(cfg_url, headers)
-    if not cfg:
-        return None
+    async with challenge_config_lock:
+        cached = challenge_config_cache.get(platform)
+        if cached and now - cached[1] < CHALLENGE_CONFIG_TTL:
+            return cached[0]
 
-    target_id = None
-    # The config API returns a list directly, not an object with "challenges" key
-    for c in cfg:
-        names = (c.get("localizedNames") or {}).get("en_US") or {}
-        if name_contains.lower() in names.get("name","").lower():
-            target_id = c.get("id") or c.get("challengeId")
-            break
-    if not target_id:
+        cfg_url = riot_url(platform, "/lol/challenges/v1/challenges/config")
+        headers = {"X-Riot-Token": RIOT_API_KEY}
+        cfg = await fetch_json(cfg_url, headers)
+        if not cfg:
+            return None
+
+        # The config API returns a list directly, not an object with "challenges" key
+        name_index = {}
+        for c in cfg:
+            names = (c.get("localizedNames") or {}).get("en_US") or {}
+            name = names.get("name", "").lower()
+            if name and name not in name_index:
+                name_index[name] = c.get("id") or c.get("challengeId")
+
+        challenge_config_cache[platform] = (name_index, now)
+        return name_index
+
+async def find_challenge_id(platform, name_contains):
+    name_index = await get_challenge_name_index(platform)
+    if not name_index:
         return None
+    name_contains = name_contains.lower()
+    if name_contains in name_index:
+        return name_index[name_contains]
+    for name, challenge_id in name_index.items():
+        if name_contains in name:
+            return challenge_id
+    return None
+
+@traced("challenges")
+async def get_player_challenges(platform, puuid):
+    """A player's challenge progress keyed by challenge ID, cached briefly so one command fetches it once"""
+    now = time.time()
+    key = (platform, puuid)
+    cached = player_challenges_cache.get(key)
+    if cached and now - cached[1] < PLAYER_CHALLENGES_TTL:
+        return cached[0]
 
+    pdata_url = riot_url(platform, f"/lol/challenges/v1/player-data/{puuid}")
+    headers = {"X-Riot-Token": RIOT_API_KEY}
     pdata = await fetch_json(pdata_url, headers)
     if not pdata:
         return None
 
-    for entry in pdata.get("challenges", []):
-        if entry.get("challengeId") == target_id:
-            return entry  # includes value/level/etc, and sometimes objective ids
-    return None
+    challenges = {entry.get("challengeId"): entry for entry in pdata.get("challenges", [])}
+    player_challenges_cache[key] = (challenges, now)
+    return challenges
+
+async def get_challenge_by_name(platform: str, puuid: str, name_contains: str):
+    """Get challenge data by searching for a challenge name"""
+    target_id = await find_challenge_id(platform, name_contains)
+    if not target_id:
+        return None
+
+    challenges = await get_player_challenges(platform, puuid)
+    if not challenges:
+        return None
+    return challenges.get(target_id)  # includes value/level/etc, and sometimes objective ids
 
 async def get_arena_challenges(region, riot_id):
     """Get Arena challenge data for a player using the challenge API"""
-    if "#" not in riot_id:
-        print(f"Invalid Riot ID format: {riot_id}")
-        return None
-    
-    game_name, tag_line = riot_id.split("#", 1)
-    
     async with aiohttp.ClientSession() as session:
-        # First, get the account to get the PUUID
-        account_data = await get_account_by_riot_id(game_name, tag_line)
-        if not account_data:
+        puuid = await get_puuid(riot_id)
+        if not puuid:
             print(f"Could not find account for {riot_id}")
             return None
         
-        puuid = account_data["puuid"]
+        # Player data is fetched once; both challenge IDs come from the cached config index
+        challenges = await get_player_challenges(region, puuid)
+        if not challenges:
+            return None
         
         # Get Arena God (total firsts)
-        arena_god = await get_challenge_by_name(region, puuid, "Arena God")
+        arena_god = challenges.get(await find_challenge_id(region, "Arena God"))
         total_wins = int(arena_god.get("value", 0)) if arena_god else 0
         
         # Get Adapt to All Situations (unique champs with 1st)
-        adapt = await get_challenge_by_name(region, puuid, "Adapt to All Situations")
+        adapt = challenges.get(await find_challenge_id(region, "Adapt to All Situations"))
         unique_firsts = int(adapt.get("value", 0)) if adapt else 0
         
         # If per-champion objective IDs are exposed, map them to names:
@@ -0,0 +1,20 @@
+def split_riot_id(riot_id):
+    """Split 'GameName#TAG' into a stripped (game_name, tag_line) pair, or None if malformed"""
+    if not riot_id or "#" not in riot_id:
+        return None
+    game_name, tag_line = riot_id.split("#", 1)
+    game_name = " ".join(game_name.split())
+    tag_line = tag_line.strip()
+    if not game_name or not tag_line:
+        return None
+    return game_name, tag_line
+
+def normalize_riot_id(riot_id):
+    """Riot ID with surrounding and repeated whitespace removed, keeping the user's casing"""
+    parts = split_riot_id(riot_id)
+    return f"{parts[0]}#{parts[1]}" if parts else None
+
+def riot_id_key(riot_id):
+    """Case-insensitive cache key for a Riot ID"""
+    normalized = normalize_riot_id(riot_id)
+    return normalized.lower() if normalized else None
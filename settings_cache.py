@@ -0,0 +1,88 @@
+from datetime import datetime
+from db import (load_guild_settings, load_streak_cooldowns, set_tiltcheck_enabled, set_wincheck_enabled,
+                set_notification_channel, update_tiltcheck_cooldown, update_winstreak_cooldown)
+
+NO_COOLDOWN = (None, None, 0)  # (last_match_id, last_alert_time, last_streak_length)
+
+class GuildSettingsCache:
+    """Per-guild alert toggles, notification channels and streak cooldowns held in memory.
+
+    Everything is loaded in one pass at startup; setters write to SQLite first and then
+    update the cached copy, so readers never need a round trip.
+    """
+
+    def __init__(self):
+        self.tiltcheck = {}        # guild_id -> bool
+        self.wincheck = {}         # guild_id -> bool
+        self.channels = {}         # guild_id -> channel_id
+        self.tilt_cooldowns = {}   # (guild_id, summoner_name) -> (match_id, time, streak)
+        self.win_cooldowns = {}
+        self.loaded = False
+
+    async def load(self):
+        self.tiltcheck, self.wincheck, self.channels = await load_guild_settings()
+        self.tilt_cooldowns, self.win_cooldowns = await load_streak_cooldowns()
+        self.loaded = True
+        print(f"Loaded settings for {len(set(self.tiltcheck) | set(self.wincheck) | set(self.channels))} guilds "
+              f"and {len(self.tilt_cooldowns) + len(self.win_cooldowns)} streak cooldowns")
+
+    async def reload_settings(self):
+        """Pick up toggles and channels changed by another process, keeping the cached cooldowns"""
+        self.tiltcheck, self.wincheck, self.channels = await load_guild_settings()
+
+    async def reload_cooldowns(self):
+        """Re-read streak cooldowns, which another process may have written since load()"""
+        self.tilt_cooldowns, self.win_cooldowns = await load_streak_cooldowns()
+
+    def is_tiltcheck_enabled(self, guild_id):
+        return self.tiltcheck.get(guild_id, False)
+
+    def is_wincheck_enabled(self, guild_id):
+        return self.wincheck.get(guild_id, False)
+
+    async def toggle_tiltcheck(self, guild_id):
+        enabled = not self.is_tiltcheck_enabled(guild_id)
+        await set_tiltcheck_enabled(guild_id, enabled)
+        self.tiltcheck[guild_id] = enabled
+        return enabled
+
+    async def toggle_wincheck(self, guild_id):
+        enabled = not self.is_wincheck_enabled(guild_id)
+        await set_wincheck_enabled(guild_id, enabled)
+        self.wincheck[guild_id] = enabled
+        return enabled
+
+    def get_notification_channel(self, guild_id):
+        return self.channels.get(guild_id)
+
+    async def set_notification_channel(self, guild_id, channel_id):
+        if self.channels.get(guild_id) == channel_id:
+            return
+        await set_notification_channel(guild_id, channel_id)
+        self.channels[guild_id] = channel_id
+
+    def get_tiltcheck_cooldown(self, guild_id, summoner_name):
+        return self.tilt_cooldowns.get((guild_id, summoner_name), NO_COOLDOWN)
+
+    def get_winstreak_cooldown(self, guild_id, summoner_name):
+        return self.win_cooldowns.get((guild_id, summoner_name), NO_COOLDOWN)
+
+    async def update_tiltcheck_cooldown(self, guild_id, summoner_name, match_id, streak_length):
+        last_match_id, _, last_streak = self.get_tiltcheck_cooldown(guild_id, summoner_name)
+        if (last_match_id, last_streak) == (match_id, streak_length):
+            return
+        await update_tiltcheck_cooldown(guild_id, summoner_name, match_id, streak_length)
+        self.tilt_cooldowns[(guild_id, summoner_name)] = (match_id, _sqlite_now(), streak_length)
+
+    async def update_winstreak_cooldown(self, guild_id, summoner_name, match_id, streak_length):
+        last_match_id, _, last_streak = self.get_winstreak_cooldown(guild_id, summoner_name)
+        if (last_match_id, last_streak) == (match_id, streak_length):
+            return
+        await update_winstreak_cooldown(guild_id, summoner_name, match_id, streak_length)
+        self.win_cooldowns[(guild_id, summoner_name)] = (match_id, _sqlite_now(), streak_length)
+
+def _sqlite_now():
+    # Same format CURRENT_TIMESTAMP stores, so cached and reloaded values compare equal
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+guild_settings = GuildSettingsCache()
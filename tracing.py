@@ -0,0 +1,181 @@
+import contextvars
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+SLOW_TRACE_SECONDS = 3.0        # log a per-stage summary for invocations slower than this
+SAMPLE_INTERVAL = 0.005         # seconds between stack samples in sampling mode
+PROFILE_DIR = "profiles"
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+class Trace:
+    """Timings for one command invocation, aggregated per stage name.
+
+    Tasks started inside the invocation inherit the trace through contextvars, so
+    concurrent stages (e.g. 20 gathered match fetches) add up to more than wall time.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages = {}  # stage -> [count, total seconds]
+        self.duration = None
+        self.last_lap = self.started
+
+    def add(self, stage, elapsed):
+        totals = self.stages.get(stage)
+        if totals is None:
+            self.stages[stage] = [1, elapsed]
+        else:
+            totals[0] += 1
+            totals[1] += elapsed
+
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.started
+        return self.duration
+
+    def summary(self):
+        parts = []
+        for stage, (count, total) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            parts.append(f"{stage} {total:.2f}s" + (f" ×{count}" if count > 1 else ""))
+        return f"{self.name} took {self.finish():.2f}s: " + (", ".join(parts) or "no traced stages")
+
+class span:
+    """Time a stage of the current trace; does nothing outside a traced invocation"""
+    __slots__ = ("stage", "trace", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.trace = _current_trace.get()
+
+    def __enter__(self):
+        if self.trace is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.trace is not None:
+            self.trace.add(self.stage, time.perf_counter() - self.started)
+
+def traced(stage):
+    """Decorator wrapping an async function in a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(stage):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def lap(stage):
+    """Charge the time since the previous lap (or the start) to stage.
+
+    Lets a long command handler mark its phases without re-indenting them under spans.
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        now = time.perf_counter()
+        trace.add(stage, now - trace.last_lap)
+        trace.last_lap = now
+
+def start_trace(name):
+    trace = Trace(name)
+    _current_trace.set(trace)
+    return trace
+
+def finish_trace(trace, threshold=SLOW_TRACE_SECONDS):
+    """Close a trace and log its stage breakdown if it was slow"""
+    if trace is None:
+        return
+    if trace.finish() >= threshold:
+        print(f"Slow trace: {trace.summary()}")
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer and writes collapsed stacks.
+
+    The output ("frame;frame;frame count" per line) loads directly into speedscope or
+    flamegraph.pl. Unlike cProfile it sees through the event loop to whichever coroutine
+    is actually running.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class Profiler:
+    """Runtime-toggled profiler for the event loop thread ("sample" or "cprofile" mode)"""
+
+    def __init__(self):
+        self.mode = None
+        self.started = None
+        self._profiler = None
+
+    @property
+    def running(self):
+        return self.mode is not None
+
+    def start(self, mode="sample"):
+        if self.running:
+            raise RuntimeError(f"Profiler already running in {self.mode} mode")
+        if mode == "sample":
+            self._profiler = StackSampler(threading.get_ident())
+            self._profiler.start()
+        elif mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            raise ValueError(f"Unknown profiler mode {mode}")
+        self.mode = mode
+        self.started = time.time()
+
+    def stop(self):
+        """Stop profiling and return the path of the dump"""
+        if not self.running:
+            raise RuntimeError("Profiler is not running")
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        if self.mode == "sample":
+            self._profiler.stop()
+            path = os.path.join(PROFILE_DIR, f"profile-{stamp}.folded")
+            self._profiler.dump(path)
+        else:
+            self._profiler.disable()
+            path = os.path.join(PROFILE_DIR, f"profile-{stamp}.prof")
+            self._profiler.dump_stats(path)
+        self.mode = None
+        self._profiler = None
+        return path
+
+profiler = Profiler()
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from itertools import groupby
+import aiosqlite
+from metrics import registry, db_query_seconds
+
+WRITE_BEHIND_MAX_BATCH = 200      # flush as soon as this many writes are waiting
+WRITE_BEHIND_INTERVAL = 2.0       # otherwise flush at least this often (seconds)
+
+class WriteBehindQueue:
+    """Buffers cache and cooldown writes and commits them together in one transaction.
+
+    Callers keep their own in-memory copy of what they wrote, so nothing reads these rows
+    back before the next flush. Writes are applied in the order they were queued; each run of
+    consecutive writes with the same SQL is sent with a single executemany.
+    """
+
+    def __init__(self, db_path="riot_bot.db", max_batch=WRITE_BEHIND_MAX_BATCH, flush_interval=WRITE_BEHIND_INTERVAL):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task = None
+        self._closing = False
+        self.metrics = {
+            "queued": 0,
+            "written": 0,
+            "flushes": 0,
+            "commits": 0,
+            "failed_flushes": 0,
+            "dropped": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+
+    def __len__(self):
+        return len(self._pending)
+
+    def enqueue(self, sql, params):
+        self._pending.append((sql, params))
+        self.metrics["queued"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Write-behind flush failed: {e}")
+
+    async def flush(self):
+        """Commit everything queued so far; returns the number of rows written"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+
+            start = time.perf_counter()
+            try:
+                async with aiosqlite.connect(self.db_path) as conn:
+                    for sql, run in groupby(batch, key=lambda write: write[0]):
+                        await conn.executemany(sql, [params for _, params in run])
+                    await conn.commit()
+            except aiosqlite.OperationalError:
+                # Usually "database is locked"; keep the batch for the next flush
+                self._pending[:0] = batch
+                self.metrics["failed_flushes"] += 1
+                raise
+            except Exception:
+                self.metrics["failed_flushes"] += 1
+                self.metrics["dropped"] += len(batch)
+                raise
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            db_query_seconds.observe(elapsed_ms / 1000, operation="write_behind_flush")
+            write_behind_commits.inc()
+            write_behind_rows.inc(len(batch))
+            self.metrics["written"] += len(batch)
+            self.metrics["flushes"] += 1
+            self.metrics["commits"] += 1
+            self.metrics["last_flush_ms"] = elapsed_ms
+            self.metrics["max_flush_ms"] = max(self.metrics["max_flush_ms"], elapsed_ms)
+            self.metrics["total_flush_ms"] += elapsed_ms
+            return len(batch)
+
+    async def close(self):
+        """Stop the background flusher and write out anything still queued"""
+        self._closing = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+write_queue = WriteBehindQueue()
+
+write_behind_commits = registry.counter("write_behind_commits_total", "Write-behind transactions committed")
+write_behind_rows = registry.counter("write_behind_rows_total", "Rows written by the write-behind queue")
+registry.gauge("write_behind_pending", "Writes waiting for the next flush").set_function(lambda: len(write_queue))